@@ -12,10 +12,12 @@ from slack_sdk import WebClient
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-import slash_commands.settings as settings, utils
-from slash_commands import jokes, hp_density, britishfy, views
-
-from asf_core_data.getters import data_getters
+import slash_commands.settings as settings, utils, data_cache, dispatch, metrics
+import shared_data
+from user_directory import UserDirectory
+from scheduling import BulkScheduler
+from interactions import PendingInteractions
+from slash_commands import jokes, hp_density, britishfy, views, postcodes
 
 # ==== SETUP =====
 
@@ -23,22 +25,126 @@ env_path = Path(".") / ".env"
 load_dotenv(dotenv_path=env_path)
 
 # Initalize web client
-client = WebClient(token=os.environ["SLACK_TOKEN"])
+client = WebClient(token=os.environ["SLACK_TOKEN"], base_url=settings.slack_api_url)
 
-# Initialize your app with your bot token and signing secret
+# Initialize your app with the web client (and its bot token) and signing secret
 app = App(
-    token=os.environ.get("SLACK_TOKEN"),
+    client=client,
     signing_secret=os.environ.get("SIGNING_SECRET"),
 )
 
-# Load data
-hp_data = data_getters.load_data(
-    bucket_name="asf-exploration",
-    data_path="S3",
-    file_path=settings.hp_data_file,
-    usecols=settings.hp_data_columns,
+# Time Slack API calls, and serve and log the latency metrics
+metrics.instrument_client(client)
+metrics.start()
+
+
+@app.middleware
+def record_ack_latency(body, context, next):
+    """Time how long each request takes to be acknowledged,
+    and the Slack API calls of the client Bolt creates for it."""
+
+    metrics.instrument_client(context["client"])
+
+    with metrics.span("ack_seconds", request=metrics.get_request_name(body)):
+        next()
+
+
+# Keep the display names of users in memory
+user_directory = UserDirectory(client)
+user_directory.start_background_refresh()
+
+# Schedule reminders concurrently within Slack's rate limits
+scheduler = BulkScheduler(client)
+
+# Channels to reply to for open pop-up windows, keyed by the views' private_metadata
+pending_interactions = PendingInteractions()
+
+# Load data (from the local cache if available)
+hp_data = data_cache.load_hp_data(refresh_in_background=False)
+
+# Use compact dtypes and precompute property type masks
+hp_data = hp_density.prepare_hp_data(hp_data)
+
+# Build the heat pump search trees once so requests only need to query them
+hp_index = hp_density.HeatPumpIndex(
+    hp_data, grid_cell_size=settings.hp_density_grid_cell_size
+)
+
+# Load postcode coordinates once instead of fetching them for every request
+postcode_resolver = postcodes.get_default_resolver()
+
+# Worker processes attach to one copy of the index in shared memory
+shared_hp_data = (
+    shared_data.SharedHeatPumpData(hp_index, postcode_resolver)
+    if settings.cpu_workers
+    else None
+)
+
+# Run the work of handlers on bounded worker pools, so handlers can ack straight away
+hp_density.init_worker(hp_index, postcode_resolver)
+dispatcher = dispatch.Dispatcher(
+    io_workers=settings.io_workers,
+    cpu_workers=settings.cpu_workers,
+    max_queued=settings.max_queued_tasks,
+    cpu_initializer=shared_data.init_worker,
+    cpu_initargs=shared_hp_data.initargs if shared_hp_data else (),
 )
 
+
+def swap_hp_index(hp_data):
+    """Build the heat pump index for new data and swap it in for new queries.
+    Queries that are already running finish on the old index, which is freed afterwards.
+
+    Args:
+        hp_data (pd.DataFrame): New heat pump data.
+    """
+
+    global shared_hp_data
+
+    hp_index = hp_density.HeatPumpIndex(
+        hp_data, grid_cell_size=settings.hp_density_grid_cell_size
+    )
+    hp_density.init_worker(hp_index, postcode_resolver)
+
+    if shared_hp_data is not None:
+        old_shared_hp_data = shared_hp_data
+        shared_hp_data = shared_data.SharedHeatPumpData(hp_index, postcode_resolver)
+        dispatcher.restart_cpu_workers(shared_hp_data.initargs, wait=True)
+        old_shared_hp_data.unlink()
+
+
+# Check S3 for new heat pump data regularly and swap it in without a restart
+data_cache.start_background_refresh(on_refresh=swap_hp_index)
+
+# Only the workers keep the index, so that old ones can be freed after a swap
+del hp_data, hp_index
+
+
+def run_in_background(channel, task, *args):
+    """Run a task on the worker pool, or tell the user if the bot is too busy.
+
+    Args:
+        channel (str): Channel or user to notify if the task cannot be run.
+        task (callable): Task to run.
+        *args: Arguments for task.
+    """
+
+    try:
+        dispatcher.submit(run_or_apologise, channel, task, *args)
+    except dispatch.DispatcherBusy:
+        client.chat_postMessage(channel=channel, text=settings.busy_text)
+
+
+def run_or_apologise(channel, task, *args):
+    """Run a task, telling the user if one of its steps could not be queued."""
+
+    try:
+        with metrics.span("task_seconds", task=task.__name__):
+            task(*args)
+    except dispatch.DispatcherBusy:
+        client.chat_postMessage(channel=channel, text=settings.busy_text)
+
+
 # ==== REACTIONS =====
 # Listen and react to specific message
 # As of May 2023, this will only work for public channels in the Nesta workspace because of permission restrictions.
@@ -68,8 +174,7 @@ def tell_joke(client, message):
     Note: this will only work in public channels due to permission restrictions."""
 
     channel_id = message["channel"]
-    joke = jokes.get_a_joke(settings.joke_default_topic) + settings.fun_emoji
-    client.chat_postMessage(channel=channel_id, text=joke)
+    run_in_background(channel_id, post_joke, channel_id, settings.joke_default_topic)
 
 
 @app.message(":wave:")
@@ -102,13 +207,25 @@ def tell_me_a_joke(ack, respond, command):
         channel = command["user_id"]
 
     topic = command["text"] if command["text"] != "" else settings.joke_default_topic
+    run_in_background(channel, post_joke, channel, topic)
+
+
+def post_joke(channel, topic):
+    """Post a joke about a topic, or about cats if there are none about the topic.
+
+    Args:
+        channel (str): Channel or user to post to.
+        topic (str): Joke topic.
+    """
+
     joke = jokes.get_a_joke(topic)
 
     if joke is None:
 
         joke_not_found_text = "I don't know any jokes about such obscure topics. :face_with_spiral_eyes: Here is one about cats:\n"
         joke = jokes.get_a_joke("cat")
-        joke = joke_not_found_text + joke + settings.fun_emoji
+        joke = joke_not_found_text + (joke or settings.joke_unavailable_text)
+        joke += settings.fun_emoji
 
     else:
         joke += settings.fun_emoji
@@ -124,12 +241,11 @@ def asana_reminder(ack, respond, command):
     ack()
     thursday = utils.find_date_for_next_weekday(settings.asana_reminder_day)
 
-    channel = command["user_id"]
-    global reminder_sender_channel  # to make it accessible for other function as arguments cannot be passed
-    reminder_sender_channel = channel
+    metadata = pending_interactions.open(channel=command["user_id"])
 
     client.views_open(
-        trigger_id=command["trigger_id"], view=views.prepare_reminder_view(thursday)
+        trigger_id=command["trigger_id"],
+        view=views.prepare_reminder_view(thursday, metadata),
     )
 
 
@@ -144,25 +260,46 @@ def reminder_submission(ack, body, client, view, logger):
     selected_date = vals["date_sel"]["datepicker-action"]["selected_date"]
     selected_time = vals["time_sel"]["timepicker-action"]["selected_time"]
 
+    user = body["user"]["id"]
+    channel = pending_interactions.close(view, {"channel": user})["channel"]
+
+    run_in_background(
+        channel,
+        schedule_reminders,
+        channel,
+        selected_users,
+        selected_text,
+        selected_date,
+        selected_time,
+    )
+
+
+def schedule_reminders(
+    channel, selected_users, selected_text, selected_date, selected_time
+):
+    """Schedule the reminders and confirm to the sender whom they are sent to.
+
+    Args:
+        channel (str): Channel or user to post the confirmation to.
+        selected_users (list): Users to remind.
+        selected_text (str): Reminder text.
+        selected_date (str): Date to send the reminder, e.g. "2023-05-25".
+        selected_time (str): Time to send the reminder, e.g. "11:00".
+    """
+
     # Generate timestamp
     timestamp = utils.get_timestamp(selected_date, selected_time)
 
     # Schedule messages
-    for user in selected_users:
-
-        client.chat_scheduleMessage(
-            channel=user,
-            text=selected_text,
-            post_at=timestamp,
-        )
+    outcomes = scheduler.schedule(selected_users, selected_text, timestamp)
 
     # Create log message
-    recipients = [utils.get_user_name(client, id) for id in selected_users]
-    recipients_text = ", ".join(recipients)
-
-    log_text = f"You have successfully scheduled a project update reminder to be sent out on {selected_date} at {selected_time} to the following people: {recipients_text}."
+    names = user_directory.get_names([outcome["user"] for outcome in outcomes])
+    log_text = utils.get_reminder_log_text(
+        selected_date, selected_time, outcomes, names
+    )
 
-    client.chat_postMessage(channel=reminder_sender_channel, text=log_text)
+    client.chat_postMessage(channel=channel, text=log_text)
 
 
 @app.command("/closeby-hps")
@@ -180,9 +317,19 @@ def get_closeby_hp_count(ack, respond, command):
         channel = command["user_id"]
 
     postcode = postcode.strip().upper()
+    run_in_background(channel, post_closeby_hp_count, channel, postcode)
+
+
+def post_closeby_hp_count(channel, postcode):
+    """Post the number of heat pumps within a 10km radius of a postcode.
 
-    closeby_hp_count = hp_density.get_n_hp_closeby(
-        hp_data, postcode, property_type=None, max_dist=10
+    Args:
+        channel (str): Channel or user to post to.
+        postcode (str): Postcode to search for.
+    """
+
+    closeby_hp_count = dispatcher.run_cpu(
+        hp_density.get_n_hp_closeby_in_worker, postcode, property_type=None, max_dist=10
     )
 
     if closeby_hp_count is None:
@@ -193,6 +340,71 @@ def get_closeby_hp_count(ack, respond, command):
     client.chat_postMessage(channel=channel, text=text)
 
 
+@app.command("/closeby-hps-breakdown")
+def get_closeby_hp_breakdown(ack, respond, command):
+    """Slash command to compute closeby heat pumps by property type within several radii.
+    Command: /closeby-hps-breakdown [postcode]"""
+
+    ack()
+    channel = command["channel_id"]
+
+    # For direct messages, send DM to user instead of posting in channel.
+    if command["channel_name"] == "directmessage":
+        channel = command["user_id"]
+
+    postcode = command["text"].strip().upper()
+    run_in_background(channel, post_closeby_hp_breakdown, channel, postcode)
+
+
+def post_closeby_hp_breakdown(channel, postcode):
+    """Post a table with the number of heat pumps by property type and radius around a postcode.
+
+    Args:
+        channel (str): Channel or user to post to.
+        postcode (str): Postcode to search for.
+    """
+
+    breakdown = dispatcher.run_cpu(
+        hp_density.get_hp_breakdown_in_worker, postcode, radii=settings.breakdown_radii
+    )
+
+    client.chat_postMessage(
+        channel=channel, text=utils.get_breakdown_text(postcode, breakdown)
+    )
+
+
+@app.command("/nearest-hps")
+def get_nearest_hps(ack, respond, command):
+    """Slash command to find the heat pumps closest to a postcode and how far away they are.
+    Command: /nearest-hps [postcode] [number of heat pumps]"""
+
+    ack()
+    channel = command["channel_id"]
+
+    # For direct messages, send DM to user instead of posting in channel.
+    if command["channel_name"] == "directmessage":
+        channel = command["user_id"]
+
+    postcode, k = utils.parse_nearest_command(command["text"])
+    run_in_background(channel, post_nearest_hps, channel, postcode, k)
+
+
+def post_nearest_hps(channel, postcode, k):
+    """Post the distances and property types of the heat pumps closest to a postcode.
+
+    Args:
+        channel (str): Channel or user to post to.
+        postcode (str): Postcode to search for.
+        k (int): Number of heat pumps to find.
+    """
+
+    nearest = dispatcher.run_cpu(hp_density.get_nearest_hps_in_worker, postcode, k=k)
+
+    client.chat_postMessage(
+        channel=channel, text=utils.get_nearest_text(postcode, nearest)
+    )
+
+
 @app.command("/closeby-hps-picker")
 def closeby_hp_selection(ack, respond, command):
     """Slash command to compute closeby heat pumps.
@@ -206,12 +418,11 @@ def closeby_hp_selection(ack, respond, command):
     if command["channel_name"] == "directmessage":
         channel = command["user_id"]
 
-    global hp_selection_channel
-    hp_selection_channel = channel
+    metadata = pending_interactions.open(channel=channel)
 
     client.views_open(
         trigger_id=command["trigger_id"],
-        view=views.closeby_hp_view,
+        view=views.get_closeby_hp_view(metadata),
     )
 
 
@@ -229,8 +440,34 @@ def hp_count_submission(ack, body, client, view, logger):
     if prop_type == "Any":
         prop_type = None
 
-    closeby_hp_count = hp_density.get_n_hp_closeby(
-        hp_data, postcode.strip().upper(), property_type=prop_type, max_dist=int(dist)
+    user = body["user"]["id"]
+    channel = pending_interactions.close(view, {"channel": user})["channel"]
+
+    run_in_background(
+        channel,
+        post_selected_hp_count,
+        channel,
+        postcode,
+        prop_type,
+        dist,
+    )
+
+
+def post_selected_hp_count(channel, postcode, prop_type, dist):
+    """Post the number of heat pumps of a property type within a radius of a postcode.
+
+    Args:
+        channel (str): Channel or user to post to.
+        postcode (str): Postcode to search for.
+        prop_type (str): Property type to filter by, or None for any.
+        dist (str): Search radius in km.
+    """
+
+    closeby_hp_count = dispatcher.run_cpu(
+        hp_density.get_n_hp_closeby_in_worker,
+        postcode.strip().upper(),
+        property_type=prop_type,
+        max_dist=int(dist),
     )
 
     prop_type_string = " in {}".format(prop_type) if prop_type is not None else ""
@@ -241,7 +478,7 @@ def hp_count_submission(ack, body, client, view, logger):
     else:
         text = f"There are {closeby_hp_count} heat pumps{prop_type_string} within a {dist}km radius of postcode {postcode_string.upper()}."
 
-    client.chat_postMessage(channel=hp_selection_channel, text=text)
+    client.chat_postMessage(channel=channel, text=text)
 
 
 @app.command("/britishfy")
@@ -269,7 +506,7 @@ def britishfy_submission(ack, body, client, view, logger):
     my_part = view["state"]["values"]["mypart"]["plain_text_input-action"]["value"]
     user = body["user"]["id"]
 
-    recipient_name = utils.get_first_name(client, who)
+    recipient_name = user_directory.get_first_name(who)
 
     errors = {}
     if other_to_do is not None and len(other_to_do) <= 3:
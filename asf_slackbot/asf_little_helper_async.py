@@ -0,0 +1,446 @@
+# ==== IMPORTS =====
+
+import asyncio
+import os
+
+from pathlib import Path
+from dotenv import load_dotenv
+
+from datetime import datetime
+
+import aiohttp
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+import slash_commands.settings as settings, utils, data_cache, dispatch, metrics
+import shared_data
+from user_directory import AsyncUserDirectory
+from scheduling import AsyncBulkScheduler
+from interactions import PendingInteractions
+from slash_commands import jokes, hp_density, britishfy, views, postcodes
+
+# ==== SETUP =====
+# Same bot as asf_little_helper.py, but all handlers run on one asyncio event loop.
+# Slack API and joke requests share one pooled HTTP session, so many commands
+# can wait on the network at the same time without holding a thread each.
+
+env_path = Path(".") / ".env"
+load_dotenv(dotenv_path=env_path)
+
+
+def create_dispatcher():
+    """Load the heat pump data and set up the worker pools for the density queries.
+    The data is checked for updates regularly and swapped in without a restart.
+
+    Returns:
+        dispatch.Dispatcher: Dispatcher whose workers can answer density queries.
+    """
+
+    hp_data = data_cache.load_hp_data(refresh_in_background=False)
+    hp_data = hp_density.prepare_hp_data(hp_data)
+    hp_index = hp_density.HeatPumpIndex(
+        hp_data, grid_cell_size=settings.hp_density_grid_cell_size
+    )
+    postcode_resolver = postcodes.get_default_resolver()
+
+    hp_density.init_worker(hp_index, postcode_resolver)
+
+    # Worker processes attach to one copy of the index in shared memory
+    shared_hp_data = (
+        shared_data.SharedHeatPumpData(hp_index, postcode_resolver)
+        if settings.cpu_workers
+        else None
+    )
+
+    dispatcher = dispatch.Dispatcher(
+        io_workers=settings.io_workers,
+        cpu_workers=settings.cpu_workers,
+        max_queued=settings.max_queued_tasks,
+        cpu_initializer=shared_data.init_worker,
+        cpu_initargs=shared_hp_data.initargs if shared_hp_data else (),
+    )
+
+    def swap_hp_index(hp_data):
+        # Runs in the refresh thread, so building the index doesn't block the event loop
+        nonlocal shared_hp_data
+
+        hp_index = hp_density.HeatPumpIndex(
+            hp_data, grid_cell_size=settings.hp_density_grid_cell_size
+        )
+        hp_density.init_worker(hp_index, postcode_resolver)
+
+        if shared_hp_data is not None:
+            old_shared_hp_data = shared_hp_data
+            shared_hp_data = shared_data.SharedHeatPumpData(hp_index, postcode_resolver)
+            dispatcher.restart_cpu_workers(shared_hp_data.initargs, wait=True)
+            old_shared_hp_data.unlink()
+
+    data_cache.start_background_refresh(on_refresh=swap_hp_index)
+
+    return dispatcher
+
+
+def create_client(session):
+    """Create the Slack client.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP session shared by all outbound requests.
+
+    Returns:
+        slack_sdk.web.async_client.AsyncWebClient: Slack client.
+    """
+
+    client = AsyncWebClient(
+        token=os.environ["SLACK_TOKEN"],
+        base_url=settings.slack_api_url,
+        session=session,
+    )
+    metrics.instrument_async_client(client)
+
+    return client
+
+
+def create_app(client, session, dispatcher, user_directory):
+    """Create the bot and register its handlers.
+
+    Args:
+        client (slack_sdk.web.async_client.AsyncWebClient): Slack client.
+        session (aiohttp.ClientSession): HTTP session shared by all outbound requests.
+        dispatcher (dispatch.Dispatcher): Worker pools for the density queries.
+        user_directory (user_directory.AsyncUserDirectory): Display names of users.
+
+    Returns:
+        slack_bolt.async_app.AsyncApp: The bot.
+    """
+
+    app = AsyncApp(client=client, signing_secret=os.environ.get("SIGNING_SECRET"))
+    scheduler = AsyncBulkScheduler(client)
+
+    @app.middleware
+    async def record_ack_latency(body, context, next):
+        """Time how long each request takes to be acknowledged,
+        and the Slack API calls of the client Bolt creates for it."""
+
+        metrics.instrument_async_client(context["client"])
+
+        with metrics.span("ack_seconds", request=metrics.get_request_name(body)):
+            await next()
+
+    # Channels to reply to for open pop-up windows, keyed by the views' private_metadata
+    pending_interactions = PendingInteractions()
+
+    async def run_cpu(func, *args, **kwargs):
+        # Wait for a density query on the worker pools without blocking the event loop
+        return await asyncio.wrap_future(
+            dispatcher.submit(dispatcher.run_cpu, func, *args, **kwargs)
+        )
+
+    # ==== REACTIONS =====
+
+    @app.message(r"fridge\sin\sreverse")
+    async def fridge(client, message):
+        """Give an alternative to the 'fridge in reverse' metaphor
+        for heat pumps."""
+
+        await client.chat_postMessage(
+            channel=message["channel"],
+            thread_ts=message["ts"],
+            text="Time to retire this old metaphor. A heat pump is anyway more similar to the <https://medium.com/all-you-can-heat/7-reasons-why-a-heat-pump-is-like-the-atlantic-bluefin-tuna-c2028e43600a|Atlantic Blue Fin Tuna>. :fish:",
+        )
+
+    @app.message("tell me a joke")
+    async def tell_joke(client, message):
+        """Tell a joke."""
+
+        joke = await jokes.get_a_joke_async(settings.joke_default_topic, session)
+        await client.chat_postMessage(
+            channel=message["channel"],
+            text=(joke or settings.joke_unavailable_text) + settings.fun_emoji,
+        )
+
+    @app.message(":wave:")
+    async def say_hello(message, say):
+        """Say hi to someone who waves."""
+
+        await say(f"Hi there, <@{message['user']}>!", thread_ts=message["ts"])
+
+    # ==== SLASH COMMANDS =====
+
+    @app.command("/tell-me-a-joke")
+    async def tell_me_a_joke(ack, client, command):
+        """Slash command to tell a joke. You can also pass a topic.
+        Command: /tell-me-a-joke [topic]
+        """
+
+        await ack()
+        channel = command["channel_id"]
+
+        # For direct messages, send DM to user instead of posting in channel.
+        if command["channel_name"] == "directmessage":
+            channel = command["user_id"]
+
+        topic = command["text"] if command["text"] != "" else settings.joke_default_topic
+        joke = await jokes.get_a_joke_async(topic, session)
+
+        if joke is None:
+
+            joke_not_found_text = "I don't know any jokes about such obscure topics. :face_with_spiral_eyes: Here is one about cats:\n"
+            joke = await jokes.get_a_joke_async("cat", session)
+            joke = joke_not_found_text + (joke or settings.joke_unavailable_text)
+            joke += settings.fun_emoji
+
+        else:
+            joke += settings.fun_emoji
+
+        await client.chat_postMessage(channel=channel, text=joke)
+
+    @app.command("/project-status-reminder")
+    async def asana_reminder(ack, client, command):
+        """Slash command to schedule project status reminder.
+        Command: /project-status-reminder"""
+
+        await ack()
+        thursday = utils.find_date_for_next_weekday(settings.asana_reminder_day)
+        metadata = pending_interactions.open(channel=command["user_id"])
+
+        await client.views_open(
+            trigger_id=command["trigger_id"],
+            view=views.prepare_reminder_view(thursday, metadata),
+        )
+
+    @app.view("send_reminder")
+    async def reminder_submission(ack, body, client, view):
+        await ack()
+
+        vals = view["state"]["values"]
+
+        selected_users = vals["user_sel"]["multi_users_select-action"]["selected_users"]
+        selected_text = vals["text_sel"]["plain_text_input-action"]["value"]
+        selected_date = vals["date_sel"]["datepicker-action"]["selected_date"]
+        selected_time = vals["time_sel"]["timepicker-action"]["selected_time"]
+
+        timestamp = utils.get_timestamp(selected_date, selected_time)
+
+        user = body["user"]["id"]
+        channel = pending_interactions.close(view, {"channel": user})["channel"]
+
+        # Schedule messages concurrently
+        outcomes = await scheduler.schedule(selected_users, selected_text, timestamp)
+
+        names = await user_directory.get_names([outcome["user"] for outcome in outcomes])
+        log_text = utils.get_reminder_log_text(
+            selected_date, selected_time, outcomes, names
+        )
+
+        await client.chat_postMessage(channel=channel, text=log_text)
+
+    @app.command("/closeby-hps")
+    async def get_closeby_hp_count(ack, client, command):
+        """Slash command to compute closeby heat pumps, meaning within a 10km radius.
+        Command: /closeby-hps"""
+
+        await ack()
+
+        channel = command["channel_id"]
+
+        # For direct messages, send DM to user instead of posting in channel.
+        if command["channel_name"] == "directmessage":
+            channel = command["user_id"]
+
+        postcode = command["text"].strip().upper()
+
+        try:
+            closeby_hp_count = await run_cpu(
+                hp_density.get_n_hp_closeby_in_worker,
+                postcode,
+                property_type=None,
+                max_dist=10,
+            )
+        except dispatch.DispatcherBusy:
+            await client.chat_postMessage(channel=channel, text=settings.busy_text)
+            return
+
+        if closeby_hp_count is None:
+            text = "Sorry, we couldn't find the coordinates for this postcode... :face_with_peeking_eye:"
+        else:
+            text = f"There are {closeby_hp_count} heat pumps within a 10km radius of your postcode {postcode}."
+
+        await client.chat_postMessage(channel=channel, text=text)
+
+    @app.command("/closeby-hps-breakdown")
+    async def get_closeby_hp_breakdown(ack, client, command):
+        """Slash command to compute closeby heat pumps by property type within several radii.
+        Command: /closeby-hps-breakdown [postcode]"""
+
+        await ack()
+        channel = command["channel_id"]
+
+        # For direct messages, send DM to user instead of posting in channel.
+        if command["channel_name"] == "directmessage":
+            channel = command["user_id"]
+
+        postcode = command["text"].strip().upper()
+
+        try:
+            breakdown = await run_cpu(
+                hp_density.get_hp_breakdown_in_worker,
+                postcode,
+                radii=settings.breakdown_radii,
+            )
+        except dispatch.DispatcherBusy:
+            await client.chat_postMessage(channel=channel, text=settings.busy_text)
+            return
+
+        await client.chat_postMessage(
+            channel=channel, text=utils.get_breakdown_text(postcode, breakdown)
+        )
+
+    @app.command("/nearest-hps")
+    async def get_nearest_hps(ack, client, command):
+        """Slash command to find the heat pumps closest to a postcode and how far away they are.
+        Command: /nearest-hps [postcode] [number of heat pumps]"""
+
+        await ack()
+        channel = command["channel_id"]
+
+        # For direct messages, send DM to user instead of posting in channel.
+        if command["channel_name"] == "directmessage":
+            channel = command["user_id"]
+
+        postcode, k = utils.parse_nearest_command(command["text"])
+
+        try:
+            nearest = await run_cpu(hp_density.get_nearest_hps_in_worker, postcode, k=k)
+        except dispatch.DispatcherBusy:
+            await client.chat_postMessage(channel=channel, text=settings.busy_text)
+            return
+
+        await client.chat_postMessage(
+            channel=channel, text=utils.get_nearest_text(postcode, nearest)
+        )
+
+    @app.command("/closeby-hps-picker")
+    async def closeby_hp_selection(ack, client, command):
+        """Slash command to compute closeby heat pumps.
+        Pick postcode, property type and radius in pop-up window.
+        Command: /closeby-hps-picker"""
+
+        await ack()
+        channel = command["channel_id"]
+
+        # For direct messages, send DM to user instead of posting in channel.
+        if command["channel_name"] == "directmessage":
+            channel = command["user_id"]
+
+        metadata = pending_interactions.open(channel=channel)
+
+        await client.views_open(
+            trigger_id=command["trigger_id"], view=views.get_closeby_hp_view(metadata)
+        )
+
+    @app.view("closeby-window")
+    async def hp_count_submission(ack, body, client, view):
+        await ack()
+
+        values = view["state"]["values"]
+        postcode = values["postcode"]["plain_text_input-action"]["value"]
+        prop_type = values["proptype"]["radio_buttons-action"]["selected_option"][
+            "text"
+        ]["text"]
+        dist = values["dist"]["plain_text_input-action"]["value"]
+
+        if prop_type == "Any":
+            prop_type = None
+
+        user = body["user"]["id"]
+        channel = pending_interactions.close(view, {"channel": user})["channel"]
+
+        try:
+            closeby_hp_count = await run_cpu(
+                hp_density.get_n_hp_closeby_in_worker,
+                postcode.strip().upper(),
+                property_type=prop_type,
+                max_dist=int(dist),
+            )
+        except dispatch.DispatcherBusy:
+            await client.chat_postMessage(channel=channel, text=settings.busy_text)
+            return
+
+        prop_type_string = " in {}".format(prop_type) if prop_type is not None else ""
+
+        if closeby_hp_count is None:
+            text = "Sorry, we couldn't find the coordinates for this postcode... :face_with_peeking_eye:"
+        else:
+            text = f"There are {closeby_hp_count} heat pumps{prop_type_string} within a {dist}km radius of postcode {postcode.upper()}."
+
+        await client.chat_postMessage(channel=channel, text=text)
+
+    @app.command("/britishfy")
+    async def britishfy_message(ack, client, command):
+        """Slash command generate British-fied message to colleague.
+        Pick tasks, date and recipient in pop-up window.
+        Command: /britishfy"""
+
+        today = datetime.today().strftime("%Y-%m-%d")
+        await ack()
+
+        await client.views_open(
+            trigger_id=command["trigger_id"], view=views.prepare_britishfy_view(today)
+        )
+
+    @app.view("britishfy_view")
+    async def britishfy_submission(ack, body, client, view):
+
+        values = view["state"]["values"]
+        who = values["who"]["users_select-action"]["selected_user"]
+        other_to_do = values["todo"]["plain_text_input-action"]["value"]
+        by_when = values["date"]["datepicker-action"]["selected_date"]
+        my_part = values["mypart"]["plain_text_input-action"]["value"]
+        user = body["user"]["id"]
+
+        if other_to_do is not None and len(other_to_do) <= 3:
+            await ack(
+                response_action="errors",
+                errors={"todo": "The value must be longer than 3 characters"},
+            )
+            return
+
+        await ack()
+
+        recipient_name = await user_directory.get_first_name(who)
+        britishfied = britishfy.britishfy(recipient_name, other_to_do, by_when, my_part)
+
+        # Message the user (not final recipient)
+        await client.chat_postMessage(channel=user, text=britishfied)
+
+    return app
+
+
+# ==== RUN APP =====
+
+
+async def main():
+
+    dispatcher = create_dispatcher()
+    metrics.start()
+
+    async with aiohttp.ClientSession() as session:
+        client = create_client(session)
+        user_directory = AsyncUserDirectory(client)
+        # The event loop only keeps a weak reference to tasks
+        refresh_task = asyncio.create_task(user_directory.refresh_forever())
+
+        app = create_app(client, session, dispatcher, user_directory)
+        handler = AsyncSocketModeHandler(app, os.environ.get("APP_LEVEL_TOKEN"))
+
+        try:
+            await handler.start_async()
+        finally:
+            refresh_task.cancel()
+            await asyncio.gather(refresh_task, return_exceptions=True)
+
+
+# Start socket handler
+if __name__ == "__main__":
+    asyncio.run(main())
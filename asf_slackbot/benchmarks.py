@@ -0,0 +1,590 @@
+# ==== IMPORTS ====
+
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import cycle
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+import shared_data
+import slash_commands.settings as settings
+from slash_commands import distance, hp_density, postcodes, views
+
+# ================
+
+# A few query locations across GB (London, Manchester, Cardiff, Edinburgh, Norwich)
+benchmark_locations = [
+    (51.5072, -0.1276),
+    (53.4808, -2.2426),
+    (51.4816, -3.1791),
+    (55.9533, -3.1883),
+    (52.6309, 1.2974),
+]
+
+
+def time_calls(func, n_repeats=20):
+    """Time repeated calls of a function.
+
+    Args:
+        func (callable): Function without arguments to call.
+        n_repeats (int, optional): Number of calls. Defaults to 20.
+
+    Returns:
+        np.array: Latency per call in milliseconds.
+    """
+
+    latencies = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return np.array(latencies)
+
+
+def print_latencies(name, latencies):
+    """Print summary statistics for latencies in milliseconds.
+
+    Args:
+        name (str): Name of the benchmark.
+        latencies (np.array): Latencies in milliseconds.
+    """
+
+    print(
+        f"{name}: p50 {np.percentile(latencies, 50):.3f}ms, "
+        f"p99 {np.percentile(latencies, 99):.3f}ms ({len(latencies)} calls)"
+    )
+
+
+def benchmark_closeby_lookup(hp_data, n_repeats=20):
+    """Compare the per-request latency of rebuilding the search trees
+    with querying a prebuilt heat pump index.
+
+    Args:
+        hp_data (pd.DataFrame): Heat pump data.
+        n_repeats (int, optional): Number of requests to time. Defaults to 20.
+    """
+
+    locations = cycle(benchmark_locations)
+
+    def rebuild_per_request():
+        lat, lng = next(locations)
+        hp_density.HeatPumpIndex(hp_data).count(lat, lng, max_dist=10)
+
+    print_latencies(
+        "Trees rebuilt per request", time_calls(rebuild_per_request, n_repeats)
+    )
+
+    start = time.perf_counter()
+    hp_index = hp_density.HeatPumpIndex(hp_data)
+    print(f"Index built once in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    def query_prebuilt():
+        lat, lng = next(locations)
+        hp_index.count(lat, lng, max_dist=10)
+
+    print_latencies("Prebuilt index", time_calls(query_prebuilt, n_repeats))
+
+
+def benchmark_memory(hp_data):
+    """Compare the memory used by the heat pump data before and after preparing it.
+
+    Args:
+        hp_data (pd.DataFrame): Heat pump data as loaded.
+    """
+
+    def to_mb(df):
+        return df.memory_usage(deep=True).sum() / 1e6
+
+    start = time.perf_counter()
+    prepared = hp_density.prepare_hp_data(hp_data)
+    duration = time.perf_counter() - start
+
+    print(
+        f"Memory: {to_mb(hp_data):.1f}MB as loaded, {to_mb(prepared):.1f}MB prepared "
+        f"({to_mb(hp_data) / to_mb(prepared):.1f}x smaller, prepared in {duration:.2f}s)"
+    )
+
+    print_latencies(
+        "Property type filter from strings",
+        time_calls(lambda: hp_density.get_property_type_conditions(hp_data)),
+    )
+    print_latencies(
+        "Property type filter from bitmask",
+        time_calls(
+            lambda: hp_density.get_property_type_filter(prepared, "Terraced Houses")
+        ),
+    )
+
+
+def benchmark_density_grid(hp_data, cell_size=1):
+    """Compare radius queries on the density grid with the KD-tree, and report
+    the error of the approximate grid count.
+
+    Args:
+        hp_data (pd.DataFrame): Heat pump data.
+        cell_size (float, optional): Cell width in km. Defaults to 1.
+    """
+
+    hp_index = hp_density.HeatPumpIndex(hp_data, grid_cell_size=cell_size)
+    tree, grid = hp_index.get_tree(), hp_index.grids["Any"]
+
+    for radius in [1, 10, 25, 100]:
+        locations = cycle(
+            [distance.to_cartesian(lat, lng) for lat, lng in benchmark_locations]
+        )
+
+        print_latencies(
+            f"KD-tree, {radius}km",
+            time_calls(
+                lambda: tree.query_ball_point(
+                    next(locations), r=radius, return_length=True
+                ),
+                100,
+            ),
+        )
+        print_latencies(
+            f"Density grid, {radius}km",
+            time_calls(lambda: grid.count(next(locations), radius), 100),
+        )
+        print_latencies(
+            f"Density grid without boundary check, {radius}km",
+            time_calls(lambda: grid.count(next(locations), radius, exact=False), 100),
+        )
+
+        errors = []
+        for lat, lng in benchmark_locations:
+            query_coords = distance.to_cartesian(lat, lng)
+            exact_count = tree.query_ball_point(
+                query_coords, r=radius, return_length=True
+            )
+            assert grid.count(query_coords, radius) == exact_count
+            errors.append(abs(grid.count(query_coords, radius, exact=False) - exact_count))
+
+        print(f"Largest error without boundary check, {radius}km: {max(errors)}")
+
+
+def count_many_single_pass(hp_index, lats, lngs, radii):
+    """Count the heat pumps within several radii of many coordinates with one tree
+    query at the largest radius, splitting the heat pumps found by their distance.
+
+    Args:
+        hp_index (hp_density.HeatPumpIndex): Prebuilt heat pump index.
+        lats (np.array): Latitudes.
+        lngs (np.array): Longitudes.
+        radii (tuple): Great-circle search radii in km.
+
+    Returns:
+        np.array: Number of heat pumps, with one row per location and one column per radius.
+    """
+
+    query_coords = hp_density.to_Cartesian(np.deg2rad(lats), np.deg2rad(lngs)).reshape(-1, 3)
+    thresholds = distance.chord_threshold(np.asarray(radii, dtype=float))
+    tree = hp_index.get_tree()
+
+    neighbours = tree.query_ball_point(query_coords, r=thresholds.max(), workers=-1)
+    lengths = np.array([len(found) for found in neighbours])
+    rows = np.repeat(np.arange(len(neighbours)), lengths)
+    found = np.concatenate([np.asarray(found, dtype=np.intp) for found in neighbours])
+    chords = np.linalg.norm(tree.data[found] - query_coords[rows], axis=1)
+
+    return np.stack(
+        [
+            np.bincount(rows[chords <= threshold], minlength=len(neighbours))
+            for threshold in thresholds
+        ],
+        axis=1,
+    )
+
+
+def benchmark_batch_counts(hp_index, postcode_resolver, n_postcodes=10000):
+    """Measure the throughput of counting nearby heat pumps for many postcodes at once.
+
+    Args:
+        hp_index (hp_density.HeatPumpIndex): Prebuilt heat pump index.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+        n_postcodes (int, optional): Number of random postcodes. Defaults to 10000.
+    """
+
+    rng = np.random.default_rng(0)
+    postcode_sample = rng.choice(postcode_resolver.postcodes, n_postcodes)
+    radii = (1, 5, 10, 25)
+
+    start = time.perf_counter()
+    hp_density.get_n_hp_closeby_many(
+        hp_index, postcode_sample, radii=radii, postcode_resolver=postcode_resolver
+    )
+    duration = time.perf_counter() - start
+
+    print(
+        f"Batch counts for {n_postcodes} postcodes and {len(radii)} radii: "
+        f"{n_postcodes / duration:.0f} postcodes/s"
+    )
+
+    start = time.perf_counter()
+    for postcode in postcode_sample[:1000]:
+        for radius in radii:
+            hp_density.get_n_hp_closeby(
+                hp_index,
+                postcode,
+                max_dist=radius,
+                postcode_resolver=postcode_resolver,
+            )
+    duration = time.perf_counter() - start
+
+    print(f"Looping over get_n_hp_closeby: {1000 / duration:.0f} postcodes/s")
+
+    coordinates = postcode_resolver.get_coordinates_many(postcode_sample).dropna()
+    lats = coordinates["LATITUDE"].to_numpy(dtype=float)
+    lngs = coordinates["LONGITUDE"].to_numpy(dtype=float)
+
+    start = time.perf_counter()
+    counts = hp_index.count_many(lats, lngs, radii=radii)
+    duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single_pass_counts = count_many_single_pass(hp_index, lats, lngs, radii)
+    single_pass_duration = time.perf_counter() - start
+
+    assert (counts == single_pass_counts).all()
+    print(
+        f"Counts for {len(lats)} locations: {duration:.3f}s with one query per radius, "
+        f"{single_pass_duration:.3f}s with one query at the largest radius"
+    )
+
+
+def benchmark_breakdown(hp_index, radii=settings.breakdown_radii, n_repeats=20):
+    """Compare the latency of the radius by property type breakdown with a single
+    count and with one count per radius and property type.
+
+    Args:
+        hp_index (hp_density.HeatPumpIndex): Prebuilt heat pump index.
+        radii (tuple, optional): Search radii in km. Defaults to settings.breakdown_radii.
+        n_repeats (int, optional): Number of requests to time. Defaults to 20.
+    """
+
+    locations = cycle(benchmark_locations)
+
+    def single_count():
+        lat, lng = next(locations)
+        hp_index.count(lat, lng, max_dist=10)
+
+    def count_per_cell():
+        lat, lng = next(locations)
+        for property_type in hp_density.PROPERTY_TYPES:
+            for radius in radii:
+                hp_index.count(lat, lng, property_type=property_type, max_dist=radius)
+
+    def breakdown():
+        lat, lng = next(locations)
+        hp_index.breakdown(lat, lng, radii=radii)
+
+    print_latencies("Single 10km count", time_calls(single_count, n_repeats))
+    print_latencies(
+        f"{len(hp_density.PROPERTY_TYPES) * len(radii)} separate counts",
+        time_calls(count_per_cell, n_repeats),
+    )
+    print_latencies("Breakdown in one pass", time_calls(breakdown, n_repeats))
+
+
+def benchmark_distance_accuracy(hp_data, radii=(1, 10, 25, 100), n_queries=20):
+    """Check the heat pump counts against a brute-force haversine reference, and
+    compare the per-query cost of converting a point with and without a dataframe.
+
+    Args:
+        hp_data (pd.DataFrame): Heat pump data, prepared with hp_density.prepare_hp_data().
+        radii (tuple, optional): Great-circle search radii in km. Defaults to (1, 10, 25, 100).
+        n_queries (int, optional): Number of random query locations. Defaults to 20.
+    """
+
+    hp_index = hp_density.HeatPumpIndex(hp_data)
+    hp_data = hp_data[hp_data["HP_INSTALLED"] & hp_data["LATITUDE"].notna()]
+    hp_lats = hp_data["LATITUDE"].to_numpy(dtype=float)
+    hp_lngs = hp_data["LONGITUDE"].to_numpy(dtype=float)
+    hp_coords = hp_density.extract_Cartesian_coords(hp_data)
+
+    rng = np.random.default_rng(0)
+    n_mismatches = 0
+    n_mismatches_within = 0
+    largest_chord_error = 0
+
+    for lat, lng in zip(rng.uniform(50, 58, n_queries), rng.uniform(-5, 1.5, n_queries)):
+        distances = distance.haversine(lat, lng, hp_lats, hp_lngs)
+
+        for radius in radii:
+            reference = int((distances <= radius).sum())
+            n_mismatches += hp_index.count(lat, lng, max_dist=radius) != reference
+            n_mismatches_within += (
+                distance.is_within(hp_coords, lat, lng, radius).sum() != reference
+            )
+
+            # Error of using the radius itself as the chord threshold
+            chord_count = hp_index.get_tree().query_ball_point(
+                distance.to_cartesian(lat, lng), r=radius, return_length=True
+            )
+            largest_chord_error = max(largest_chord_error, abs(chord_count - reference))
+
+    n_checks = n_queries * len(radii)
+    print(
+        f"Counts differing from the haversine reference: {n_mismatches}/{n_checks} "
+        f"(is_within: {n_mismatches_within}/{n_checks}, radius used as chord: "
+        f"up to {largest_chord_error} heat pumps off)"
+    )
+
+    print_latencies(
+        "Query point via dataframe",
+        time_calls(lambda: hp_density.create_query(lat, lng), 1000),
+    )
+    print_latencies(
+        "Query point without dataframe",
+        time_calls(lambda: distance.to_cartesian(lat, lng), 1000),
+    )
+
+
+def benchmark_nearest(hp_index, postcode_resolver, ks=(1, 10, 100, 1000), n_repeats=20):
+    """Measure the latency of finding the heat pumps closest to a location, and the
+    throughput of finding them for many postcodes at once.
+
+    Args:
+        hp_index (hp_density.HeatPumpIndex): Prebuilt heat pump index.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+        ks (tuple, optional): Numbers of heat pumps to find. Defaults to (1, 10, 100, 1000).
+        n_repeats (int, optional): Number of requests to time. Defaults to 20.
+    """
+
+    locations = cycle(benchmark_locations)
+
+    for k in ks:
+        print_latencies(
+            f"{k} nearest heat pumps",
+            time_calls(lambda: hp_index.nearest(*next(locations), k=k), n_repeats),
+        )
+
+    postcode_sample = np.random.default_rng(0).choice(postcode_resolver.postcodes, 10000)
+
+    start = time.perf_counter()
+    hp_density.get_nearest_hps_many(
+        hp_index, postcode_sample, k=10, postcode_resolver=postcode_resolver
+    )
+    duration = time.perf_counter() - start
+
+    print(f"10 nearest heat pumps for 10000 postcodes: {10000 / duration:.0f} postcodes/s")
+
+
+def get_private_memory_mb():
+    """Get the memory only this process uses, i.e. not shared with other processes.
+
+    Returns:
+        float: Private memory in MB (Linux only).
+    """
+
+    with open("/proc/self/smaps_rollup") as f:
+        fields = dict(line.split(":", 1) for line in f if ":" in line)
+
+    private_kb = sum(
+        int(fields[key].split()[0]) for key in ("Private_Clean", "Private_Dirty")
+    )
+
+    return private_kb / 1024
+
+
+def answer_in_worker(postcode_sample, barrier=None):
+    """Answer queries in a worker process and report its private memory.
+
+    Args:
+        postcode_sample (list): Postcodes to query.
+        barrier (multiprocessing.Barrier, optional): Waited for first, so that
+            every worker of a pool gets one of the tasks. Defaults to None.
+
+    Returns:
+        tuple: Process id, private memory in MB, counts and nearest distances.
+    """
+
+    if barrier is not None:
+        barrier.wait(timeout=600)
+
+    counts = [hp_density.get_n_hp_closeby_in_worker(postcode) for postcode in postcode_sample]
+    nearest = [
+        hp_density.get_nearest_hps_in_worker(postcode, k=5)["DISTANCE_KM"].tolist()
+        for postcode in postcode_sample
+    ]
+
+    return os.getpid(), get_private_memory_mb(), counts, nearest
+
+
+def benchmark_shared_workers(hp_index, postcode_resolver, n_workers=4, n_postcodes=100):
+    """Compare the memory of worker processes that get their own copy of the heat pump
+    index with workers attached to one copy in shared memory, and check that both
+    give the same answers as the parent process.
+
+    Workers are started with the "spawn" method, so a copy is not hidden by fork's
+    copy-on-write pages.
+
+    Args:
+        hp_index (hp_density.HeatPumpIndex): Prebuilt heat pump index.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+        n_workers (int, optional): Number of worker processes. Defaults to 4.
+        n_postcodes (int, optional): Number of random postcodes to query. Defaults to 100.
+    """
+
+    postcode_sample = list(
+        np.random.default_rng(0).choice(postcode_resolver.postcodes, n_postcodes)
+    )
+
+    hp_density.init_worker(hp_index, postcode_resolver)
+    _, _, expected_counts, expected_nearest = answer_in_worker(postcode_sample)
+
+    shared_hp_data = shared_data.SharedHeatPumpData(hp_index, postcode_resolver)
+    print(f"Shared memory block: {shared_hp_data.shared.nbytes / 1024**2:.1f}MB")
+
+    setups = {
+        "Copied": (hp_density.init_worker, (hp_index, postcode_resolver)),
+        "Shared": (shared_data.init_worker, shared_hp_data.initargs),
+    }
+
+    context = multiprocessing.get_context("spawn")
+
+    try:
+        for name, (initializer, initargs) in setups.items():
+            with context.Manager() as manager, ProcessPoolExecutor(
+                n_workers,
+                mp_context=context,
+                initializer=initializer,
+                initargs=initargs,
+            ) as pool:
+                barrier = manager.Barrier(n_workers)
+                futures = [
+                    pool.submit(answer_in_worker, postcode_sample, barrier)
+                    for _ in range(n_workers)
+                ]
+                results = [future.result() for future in futures]
+
+            private_memory = {}
+            for pid, memory, counts, nearest in results:
+                assert counts == expected_counts
+                assert nearest == expected_nearest
+                private_memory[pid] = memory
+
+            print(
+                f"{name} index, {len(private_memory)} workers: "
+                f"{np.mean(list(private_memory.values())):.1f}MB private memory per worker, "
+                f"same answers as the parent process"
+            )
+
+    finally:
+        shared_hp_data.unlink()
+
+
+def benchmark_cold_start(cache_dir=settings.hp_data_cache_dir, n_repeats=5):
+    """Compare loading the heat pump data from S3 with reading the local cache.
+
+    Args:
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+        n_repeats (int, optional): Number of cache reads to time. Defaults to 5.
+    """
+
+    print_latencies("Download from S3", time_calls(data_cache.download_hp_data, 1))
+
+    if data_cache.read_cache(cache_dir) is None:
+        data_cache.write_cache(
+            data_cache.download_hp_data(), data_cache.get_source_etag(), cache_dir
+        )
+
+    print_latencies(
+        "Read local cache",
+        time_calls(lambda: data_cache.read_cache(cache_dir), n_repeats),
+    )
+
+
+def check_cache_round_trip():
+    """Check that a dataframe read back from the local cache has the same values
+    and gives the same prepared heat pump data, including booleans with missing values."""
+
+    df = pd.DataFrame(
+        {
+            "POSTCODE": ["AB1 2CD", "AB1 2CD", "EF3 4GH", None],
+            "PROPERTY_TYPE": ["House", "Flat", "House", "Bungalow"],
+            "BUILT_FORM": ["Detached", None, "Semi-Detached", "Detached"],
+            "HP_INSTALLED": [True, False, np.nan, False],
+            "LATITUDE": [51.5, 51.6, 52.1, 53.0],
+            "LONGITUDE": [-0.1, -0.2, -1.0, -2.0],
+        }
+    )
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data_cache.write_cache(df, "test-etag", cache_dir)
+        cached = data_cache.read_cache(cache_dir)
+
+        pd.testing.assert_frame_equal(
+            cached.astype(object).where(cached.notna(), None),
+            df.astype(object).where(df.notna(), None),
+        )
+        pd.testing.assert_frame_equal(
+            hp_density.prepare_hp_data(cached),
+            hp_density.prepare_hp_data(df),
+            check_categorical=False,
+        )
+
+    print("Local cache round trip gives the same data.")
+
+
+def compile_view_literal(view):
+    """Compile a function that builds a view from a dict literal on every call,
+    as views.prepare_reminder_view and views.prepare_britishfy_view used to.
+
+    Args:
+        view (dict): View to build.
+
+    Returns:
+        callable: Function without arguments returning the view.
+    """
+
+    return eval("lambda: " + repr(view))
+
+
+def benchmark_views(n_repeats=1000):
+    """Compare the cost of preparing pop-up window views from prebuilt views
+    with building them from dict literals on every request.
+
+    Args:
+        n_repeats (int, optional): Number of views to prepare. Defaults to 1000.
+    """
+
+    prepare_views = {
+        "Reminder view": lambda: views.prepare_reminder_view("2023-05-25"),
+        "Britishfy view": lambda: views.prepare_britishfy_view("2023-05-25"),
+    }
+
+    for name, prepare_view in prepare_views.items():
+        build_literal = compile_view_literal(prepare_view())
+        assert build_literal() == prepare_view()
+
+        print_latencies(f"{name} from dict literal", time_calls(build_literal, n_repeats))
+        print_latencies(f"{name} from prebuilt view", time_calls(prepare_view, n_repeats))
+
+
+if __name__ == "__main__":
+
+    check_cache_round_trip()
+    benchmark_views()
+
+    hp_data = data_cache.load_hp_data(refresh_in_background=False)
+
+    benchmark_cold_start()
+    benchmark_memory(data_cache.download_hp_data())
+
+    hp_data = hp_density.prepare_hp_data(hp_data)
+    benchmark_closeby_lookup(hp_data)
+    benchmark_distance_accuracy(hp_data)
+    benchmark_density_grid(hp_data)
+
+    hp_index = hp_density.HeatPumpIndex(hp_data)
+    benchmark_batch_counts(hp_index, postcodes.get_default_resolver())
+    benchmark_breakdown(hp_index)
+    benchmark_nearest(hp_index, postcodes.get_default_resolver())
+    benchmark_shared_workers(hp_index, postcodes.get_default_resolver())
@@ -0,0 +1,99 @@
+# ==== IMPORTS ====
+
+import threading
+import time
+from collections import OrderedDict
+
+# ================
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-memory cache whose entries expire after a while.
+
+    When the cache is full, the least recently used entry is evicted.
+    Hits and misses are counted for monitoring.
+
+    Args:
+        maxsize (int, optional): Maximum number of entries. Defaults to 1000.
+        ttl (float, optional): Seconds after which an entry expires. Defaults to 3600.
+    """
+
+    def __init__(self, maxsize=1000, ttl=3600):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=MISSING):
+        """Get an entry, counting the lookup as a hit or miss.
+
+        Args:
+            key: Key of the entry.
+            default (optional): Returned if there is no valid entry. Defaults to MISSING.
+
+        Returns:
+            Value of the entry, or default.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """Add or replace an entry.
+
+        Args:
+            key: Key of the entry.
+            value: Value of the entry.
+        """
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry and return its value.
+
+        Args:
+            key: Key of the entry.
+            default (optional): Returned if there is no valid entry. Defaults to None.
+
+        Returns:
+            Value of the entry, or default.
+        """
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+        if entry is None or entry[1] < time.monotonic():
+            return default
+
+        return entry[0]
+
+    def stats(self):
+        """Get the number of entries, hits and misses.
+
+        Returns:
+            dict: Cache statistics.
+        """
+
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
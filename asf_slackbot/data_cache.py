@@ -0,0 +1,266 @@
+# ==== IMPORTS ====
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import boto3
+import numpy as np
+import pandas as pd
+
+import slash_commands.settings as settings
+
+from asf_core_data.getters import data_getters
+
+# ================
+
+logger = logging.getLogger(__name__)
+
+current_file = "CURRENT"
+meta_file = "meta.json"
+
+
+def get_source_etag(bucket_name=settings.hp_data_bucket, file_path=settings.hp_data_file):
+    """Get the ETag of the source file on S3, which changes whenever the file does.
+
+    Args:
+        bucket_name (str, optional): S3 bucket. Defaults to settings.hp_data_bucket.
+        file_path (Path or str, optional): S3 key. Defaults to settings.hp_data_file.
+
+    Returns:
+        str: ETag of the S3 object.
+    """
+
+    response = boto3.client("s3").head_object(Bucket=bucket_name, Key=str(file_path))
+
+    return response["ETag"].strip('"')
+
+
+def download_hp_data(bucket_name=settings.hp_data_bucket, file_path=settings.hp_data_file):
+    """Download the heat pump data from S3, keeping only the columns used by the bot.
+
+    Args:
+        bucket_name (str, optional): S3 bucket. Defaults to settings.hp_data_bucket.
+        file_path (Path or str, optional): S3 key. Defaults to settings.hp_data_file.
+
+    Returns:
+        pd.DataFrame: Heat pump data.
+    """
+
+    return data_getters.load_data(
+        bucket_name=bucket_name,
+        data_path="S3",
+        file_path=file_path,
+        usecols=settings.hp_data_columns,
+    )
+
+
+def get_cached_etag(cache_dir=settings.hp_data_cache_dir):
+    """Get the ETag of the source file the current cache was built from.
+
+    Args:
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+
+    Returns:
+        str: ETag, or None if there is no cache yet.
+    """
+
+    try:
+        return (Path(cache_dir) / current_file).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def write_cache(df, etag, cache_dir=settings.hp_data_cache_dir):
+    """Write a dataframe to the cache as one .npy file per column.
+
+    Numeric and boolean columns are stored as they are, booleans with missing
+    values as booleans plus a missing mask, and all other columns as integer
+    codes plus their unique values, so every file can be memory-mapped.
+    The cache only becomes current once it is fully written.
+
+    Args:
+        df (pd.DataFrame): Dataframe to cache.
+        etag (str): ETag of the source file.
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+    """
+
+    cache_dir = Path(cache_dir)
+    version_dir = cache_dir / etag
+    tmp_dir = cache_dir / (etag + ".tmp")
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    column_kinds = {}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+
+        if values.dtype.kind in "biuf":
+            np.save(tmp_dir / f"{i}.npy", values.to_numpy())
+            column_kinds[column] = "array"
+        elif pd.api.types.infer_dtype(values, skipna=True) == "boolean":
+            # Booleans with missing values, e.g. HP_INSTALLED
+            missing = values.isna().to_numpy()
+            np.save(tmp_dir / f"{i}.npy", values.where(~missing, False).to_numpy(dtype=bool))
+            np.save(tmp_dir / f"{i}_missing.npy", missing)
+            column_kinds[column] = "boolean"
+        else:
+            codes, categories = pd.factorize(values)
+            np.save(tmp_dir / f"{i}_codes.npy", codes.astype(np.int32))
+            # Keep the type of the categories, strings are stored without pickling
+            if pd.api.types.infer_dtype(categories) == "string":
+                categories = categories.to_numpy(dtype=str)
+            else:
+                categories = categories.to_numpy(dtype=object)
+            np.save(tmp_dir / f"{i}_categories.npy", categories)
+            column_kinds[column] = "categorical"
+
+    with open(tmp_dir / meta_file, "w") as f:
+        json.dump({"etag": etag, "columns": column_kinds}, f)
+
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+
+    # Point to the new version atomically, then remove older versions
+    tmp_current = cache_dir / (current_file + ".tmp")
+    tmp_current.write_text(etag)
+    os.replace(tmp_current, cache_dir / current_file)
+
+    for path in cache_dir.iterdir():
+        if path.is_dir() and path.name != etag:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def read_cache(cache_dir=settings.hp_data_cache_dir):
+    """Read the current cached dataframe, memory-mapping the column files.
+
+    Args:
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+
+    Returns:
+        pd.DataFrame: Cached dataframe, or None if there is no cache yet.
+    """
+
+    etag = get_cached_etag(cache_dir)
+    if etag is None:
+        return None
+
+    version_dir = Path(cache_dir) / etag
+
+    with open(version_dir / meta_file) as f:
+        meta = json.load(f)
+
+    columns = {}
+    for i, (column, kind) in enumerate(meta["columns"].items()):
+
+        if kind == "array":
+            columns[column] = np.load(version_dir / f"{i}.npy", mmap_mode="r")
+        elif kind == "boolean":
+            columns[column] = pd.arrays.BooleanArray(
+                np.load(version_dir / f"{i}.npy"), np.load(version_dir / f"{i}_missing.npy")
+            )
+        else:
+            codes = np.load(version_dir / f"{i}_codes.npy", mmap_mode="r")
+            # Categories that aren't strings are pickled by write_cache()
+            categories = np.load(version_dir / f"{i}_categories.npy", allow_pickle=True)
+            columns[column] = pd.Categorical.from_codes(codes, categories)
+
+    return pd.DataFrame(columns)
+
+
+def refresh_cache(cache_dir=settings.hp_data_cache_dir, on_refresh=None):
+    """Rebuild the cache if the source file on S3 has changed.
+
+    Args:
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+        on_refresh (callable, optional): Called with the new dataframe after a refresh.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: New heat pump data, or None if the cache was up to date.
+    """
+
+    etag = get_source_etag()
+
+    if etag == get_cached_etag(cache_dir):
+        return None
+
+    write_cache(download_hp_data(), etag, cache_dir)
+
+    # Pass on the memory-mapped cache rather than the downloaded dataframe
+    hp_data = read_cache(cache_dir)
+    logger.info("Heat pump data cache refreshed to version %s", etag)
+
+    if on_refresh is not None:
+        on_refresh(hp_data)
+
+    return hp_data
+
+
+def _refresh_cache_safely(cache_dir, on_refresh):
+    try:
+        refresh_cache(cache_dir, on_refresh)
+    except Exception:
+        logger.exception("Refreshing the heat pump data cache failed")
+
+
+def start_background_refresh(
+    cache_dir=settings.hp_data_cache_dir,
+    on_refresh=None,
+    interval=settings.hp_data_refresh_interval,
+):
+    """Check S3 for a new heat pump data file now and then regularly, in a background thread.
+
+    Args:
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+        on_refresh (callable, optional): Called with the new dataframe after a refresh,
+            e.g. to swap in a new heat pump index. Defaults to None.
+        interval (float, optional): Seconds between checks.
+            Defaults to settings.hp_data_refresh_interval.
+    """
+
+    def refresh():
+        while True:
+            _refresh_cache_safely(cache_dir, on_refresh)
+            time.sleep(interval)
+
+    threading.Thread(target=refresh, name="hp-data-cache-refresh", daemon=True).start()
+
+
+def load_hp_data(
+    cache_dir=settings.hp_data_cache_dir, refresh_in_background=True, on_refresh=None
+):
+    """Load the heat pump data, from the local cache if there is one.
+
+    If the data is served from the cache, the cache is checked against S3 and
+    rebuilt in a background thread, now and then regularly (see
+    start_background_refresh()), so the new data is used on the next start
+    (or passed to on_refresh straight away).
+
+    Args:
+        cache_dir (Path, optional): Cache directory. Defaults to settings.hp_data_cache_dir.
+        refresh_in_background (bool, optional): Whether to check S3 for a newer file.
+            Defaults to True.
+        on_refresh (callable, optional): Called with the new dataframe after a refresh.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: Heat pump data.
+    """
+
+    hp_data = read_cache(cache_dir)
+
+    if hp_data is None:
+        etag = get_source_etag()
+        hp_data = download_hp_data()
+        write_cache(hp_data, etag, cache_dir)
+
+    elif refresh_in_background:
+        start_background_refresh(cache_dir, on_refresh)
+
+    return hp_data
@@ -0,0 +1,148 @@
+# ==== IMPORTS ====
+
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# ================
+
+logger = logging.getLogger(__name__)
+
+
+class DispatcherBusy(Exception):
+    """Raised when a pool already has as many tasks as it is allowed to queue."""
+
+
+class Dispatcher:
+    """Run the work of Slack handlers on bounded worker pools.
+
+    Handlers acknowledge the request straight away and hand the actual work to
+    the dispatcher. Tasks run on a thread pool, as most of the work is waiting
+    for Slack and other HTTP APIs. CPU-bound steps within a task (heat pump
+    density queries) can be sent to a process pool with run_cpu(). Each pool
+    only accepts a limited number of running and waiting tasks; beyond that,
+    DispatcherBusy is raised so the handler can tell the user to try again
+    instead of queueing indefinitely.
+
+    Args:
+        io_workers (int, optional): Number of I/O threads. Defaults to 8.
+        cpu_workers (int, optional): Number of processes for CPU-bound work,
+            or 0 to run it on the calling thread. Defaults to 0.
+        max_queued (int, optional): Number of tasks that can wait per pool
+            on top of the ones running. Defaults to 32.
+        cpu_initializer (callable, optional): Called in every CPU worker on start,
+            e.g. to set up the heat pump index. Defaults to None.
+        cpu_initargs (tuple, optional): Arguments for cpu_initializer. Defaults to ().
+    """
+
+    def __init__(
+        self,
+        io_workers=8,
+        cpu_workers=0,
+        max_queued=32,
+        cpu_initializer=None,
+        cpu_initargs=(),
+    ):
+
+        self.cpu_workers = cpu_workers
+        self.cpu_initializer = cpu_initializer
+        self.pools = {
+            "io": ThreadPoolExecutor(io_workers, thread_name_prefix="dispatch-io"),
+        }
+        self.slots = {"io": threading.BoundedSemaphore(io_workers + max_queued)}
+        self._pools_lock = threading.Lock()
+
+        if cpu_workers > 0:
+            self.pools["cpu"] = ProcessPoolExecutor(
+                cpu_workers, initializer=cpu_initializer, initargs=cpu_initargs
+            )
+            self.slots["cpu"] = threading.BoundedSemaphore(cpu_workers + max_queued)
+
+    def submit(self, func, *args, kind="io", **kwargs):
+        """Submit a task without blocking.
+
+        Args:
+            func (callable): Task to run. Must be picklable for CPU tasks on processes.
+            *args: Arguments for func.
+            kind (str, optional): "io" or "cpu". Defaults to "io".
+            **kwargs: Keyword arguments for func.
+
+        Raises:
+            DispatcherBusy: If the pool has no free slot.
+
+        Returns:
+            concurrent.futures.Future: Future with the result of the task.
+        """
+
+        slots = self.slots[kind]
+        if not slots.acquire(blocking=False):
+            raise DispatcherBusy(f"Too many {kind} tasks queued")
+
+        try:
+            with self._pools_lock:
+                future = self.pools[kind].submit(func, *args, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+
+        future.add_done_callback(lambda _: slots.release())
+        future.add_done_callback(_log_exception)
+
+        return future
+
+    def run_cpu(self, func, *args, **kwargs):
+        """Run a CPU-bound step from within a task and wait for its result.
+
+        Args:
+            func (callable): Function to run. Must be picklable if there is a process pool.
+            *args: Arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Raises:
+            DispatcherBusy: If the process pool has no free slot.
+
+        Returns:
+            Result of func.
+        """
+
+        if "cpu" not in self.pools:
+            return func(*args, **kwargs)
+
+        return self.submit(func, *args, kind="cpu", **kwargs).result()
+
+    def restart_cpu_workers(self, cpu_initargs, wait=False):
+        """Replace the CPU worker processes by new ones, e.g. to give them a new heat pump index.
+        Tasks submitted before finish on the old processes, which then exit.
+
+        Args:
+            cpu_initargs (tuple): New arguments for cpu_initializer.
+            wait (bool, optional): Whether to wait for the old processes to exit. Defaults to False.
+        """
+
+        if "cpu" not in self.pools:
+            return
+
+        new_pool = ProcessPoolExecutor(
+            self.cpu_workers, initializer=self.cpu_initializer, initargs=cpu_initargs
+        )
+
+        with self._pools_lock:
+            old_pool = self.pools["cpu"]
+            self.pools["cpu"] = new_pool
+
+        old_pool.shutdown(wait=wait)
+
+    def shutdown(self, wait=True):
+        """Shut down the worker pools.
+
+        Args:
+            wait (bool, optional): Whether to wait for running tasks. Defaults to True.
+        """
+
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+
+
+def _log_exception(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Dispatched task failed", exc_info=future.exception())
@@ -0,0 +1,62 @@
+# ==== IMPORTS ====
+
+import uuid
+
+import slash_commands.settings as settings
+from cache import TTLCache
+
+# ================
+
+
+class PendingInteractions:
+    """State of open pop-up windows, e.g. the channel to reply to, until they are submitted.
+
+    Each pop-up window gets a random key, which is passed to Slack as the
+    view's private_metadata and comes back with the submission. Handlers can
+    therefore run concurrently without mixing up users.
+
+    Args:
+        maxsize (int, optional): Maximum number of open pop-up windows.
+            Defaults to settings.pending_interactions_maxsize.
+        ttl (float, optional): Seconds after which an open pop-up window is forgotten.
+            Defaults to settings.pending_interactions_ttl.
+    """
+
+    def __init__(
+        self,
+        maxsize=settings.pending_interactions_maxsize,
+        ttl=settings.pending_interactions_ttl,
+    ):
+
+        self.pending = TTLCache(maxsize, ttl)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def open(self, **state):
+        """Remember the state of a new pop-up window.
+
+        Args:
+            **state: State to keep until the submission, e.g. channel="C123".
+
+        Returns:
+            str: Key to pass as the view's private_metadata.
+        """
+
+        key = uuid.uuid4().hex
+        self.pending.set(key, state)
+
+        return key
+
+    def close(self, view, default=None):
+        """Get and forget the state of a submitted pop-up window.
+
+        Args:
+            view (dict): Submitted view.
+            default (dict, optional): Returned if the state is unknown or expired. Defaults to None.
+
+        Returns:
+            dict: State given to open().
+        """
+
+        return self.pending.pop(view.get("private_metadata"), default)
@@ -0,0 +1,691 @@
+# ==== IMPORTS ====
+
+import asyncio
+import importlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from unittest import mock
+
+import aiohttp
+import numpy as np
+import pandas as pd
+from aiohttp import web
+from slack_bolt.request.async_request import AsyncBoltRequest
+
+import slash_commands.settings as settings, data_cache, dispatch, metrics
+from user_directory import AsyncUserDirectory
+from slash_commands import hp_density, postcodes
+
+# ================
+# Load tests for the bot against a local stand-in for the Slack Web API, its
+# socket mode connection and the joke API, which answer after a configurable delay.
+
+# Commands replayed by run_harness() and how often, relative to each other
+DEFAULT_MIX = {
+    "/closeby-hps": 4,
+    "/closeby-hps-picker": 2,
+    "/tell-me-a-joke": 2,
+    "/project-status-reminder": 1,
+    "/britishfy": 1,
+}
+
+
+class StubServer:
+    """Local stand-in for the Slack Web API, a socket mode connection and the
+    icanhazdadjoke search.
+
+    Messages posted by the bot are queued by channel and the views it opens by
+    trigger ID, so that concurrent requests can each wait for their own answer.
+
+    Args:
+        latency (float, optional): Seconds to wait before answering. Defaults to 0.1.
+    """
+
+    def __init__(self, latency=0.1):
+
+        self.latency = latency
+        self.calls = {}
+        self.views = defaultdict(asyncio.Queue)
+        self.messages = defaultdict(asyncio.Queue)
+        self.ack_latencies = defaultdict(list)
+
+        self.socket = None
+        self.connected = asyncio.Event()
+        self.pending_acks = {}
+
+        self.app = web.Application()
+        self.app.router.add_get("/search", self.search_jokes)
+        self.app.router.add_get("/link", self.socket_mode)
+        self.app.router.add_route("*", "/api/{method}", self.slack_api)
+
+    async def start(self):
+        """Start the server on a free local port.
+
+        Returns:
+            str: Base URL of the server.
+        """
+
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+        return self.base_url
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def search_jokes(self, request):
+        await asyncio.sleep(self.latency)
+        term = request.query.get("term", "")
+
+        return web.json_response(
+            {
+                "results": [{"id": term, "joke": f"A joke about {term}."}],
+                "total_jokes": 1,
+            }
+        )
+
+    async def slack_api(self, request):
+        await asyncio.sleep(self.latency)
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if request.content_type == "application/json":
+            payload = json.loads(await request.text() or "{}")
+        else:
+            payload = {**request.query, **await request.post()}
+
+        response = {"ok": True}
+        if method == "auth.test":
+            response.update(
+                {"team_id": "T0", "user_id": "U0", "bot_id": "B0", "url": ""}
+            )
+        elif method == "apps.connections.open":
+            response["url"] = self.base_url.replace("http", "ws", 1) + "/link"
+        elif method == "users.list":
+            response["members"] = []
+            response["response_metadata"] = {"next_cursor": ""}
+        elif method == "users.info":
+            response["user"] = {"profile": {"display_name": "Test User"}}
+        elif method == "views.open":
+            view = payload["view"]
+            if isinstance(view, str):
+                view = json.loads(view)
+            await self.views[payload["trigger_id"]].put(view)
+        elif method == "chat.postMessage":
+            await self.messages[payload["channel"]].put(payload["text"])
+
+        return web.json_response(response)
+
+    async def socket_mode(self, request):
+        # Socket mode connection to the bot, over which requests are sent and acked
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        await socket.send_json({"type": "hello", "num_connections": 1})
+
+        self.socket = socket
+        self.connected.set()
+
+        async for message in socket:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                continue
+
+            ack = message.json()
+            future = self.pending_acks.pop(ack.get("envelope_id"), None)
+            if future is not None and not future.done():
+                future.set_result(ack.get("payload"))
+
+        return socket
+
+    async def send(self, body):
+        """Send a request to the bot over the socket mode connection and wait for its ack.
+
+        Args:
+            body (dict): Request body, e.g. from slash_command_body().
+
+        Returns:
+            dict: Payload of the ack, or None if it has none.
+        """
+
+        await self.connected.wait()
+
+        envelope_id = uuid.uuid4().hex
+        ack = asyncio.get_running_loop().create_future()
+        self.pending_acks[envelope_id] = ack
+
+        start = time.perf_counter()
+        await self.socket.send_json(
+            {
+                "envelope_id": envelope_id,
+                "type": "slash_commands" if "command" in body else "interactive",
+                "payload": body,
+                "accepts_response_payload": True,
+            }
+        )
+        payload = await ack
+        self.ack_latencies[metrics.get_request_name(body)].append(
+            time.perf_counter() - start
+        )
+
+        return payload
+
+
+def slash_command_body(command, text="", channel="C0", user="U1", trigger_id="0.0.0"):
+    """Create the body of a slash command request as sent in socket mode.
+
+    Args:
+        command (str): Command, e.g. "/tell-me-a-joke".
+        text (str, optional): Text after the command. Defaults to "".
+        channel (str, optional): Channel the command is sent in. Defaults to "C0".
+        user (str, optional): User sending the command. Defaults to "U1".
+        trigger_id (str, optional): Trigger for opening a pop-up window. Defaults to "0.0.0".
+
+    Returns:
+        dict: Request body.
+    """
+
+    return {
+        "command": command,
+        "text": text,
+        "channel_id": channel,
+        "channel_name": "general",
+        "user_id": user,
+        "team_id": "T0",
+        "api_app_id": "A0",
+        "trigger_id": trigger_id,
+    }
+
+
+def view_submission_body(view, values, user="U1"):
+    """Create the body of a pop-up window submission as sent in socket mode.
+
+    Args:
+        view (dict): View as opened with views.open.
+        values (dict): Submitted values by block and action.
+        user (str, optional): User submitting the pop-up window. Defaults to "U1".
+
+    Returns:
+        dict: Request body.
+    """
+
+    return {
+        "type": "view_submission",
+        "team": {"id": "T0"},
+        "user": {"id": user},
+        "api_app_id": "A0",
+        "view": {**view, "id": "V0", "state": {"values": values}},
+    }
+
+
+async def run_load_test(n_requests=100, latency=0.1):
+    """Send many /tell-me-a-joke commands at once and time until all jokes are posted.
+
+    Args:
+        n_requests (int, optional): Number of concurrent commands. Defaults to 100.
+        latency (float, optional): Delay of the stub server in seconds. Defaults to 0.1.
+    """
+
+    os.environ.setdefault("SLACK_TOKEN", "xoxb-load-test")
+
+    import asf_little_helper_async
+
+    stub = StubServer(latency)
+    base_url = await stub.start()
+    settings.slack_api_url = base_url + "/api/"
+    settings.joke_api_url = base_url + "/search"
+
+    async with aiohttp.ClientSession() as session:
+        client = asf_little_helper_async.create_client(session)
+        app = asf_little_helper_async.create_app(
+            client, session, dispatcher=None, user_directory=AsyncUserDirectory(client)
+        )
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                app.async_dispatch(
+                    AsyncBoltRequest(
+                        body=slash_command_body("/tell-me-a-joke", "cat"),
+                        mode="socket_mode",
+                    )
+                )
+                for _ in range(n_requests)
+            ]
+        )
+        ack_duration = time.perf_counter() - start
+
+        for _ in range(n_requests):
+            await stub.messages["C0"].get()
+        duration = time.perf_counter() - start
+
+    await stub.stop()
+
+    print(
+        f"{n_requests} concurrent /tell-me-a-joke commands with {latency * 1000:.0f}ms "
+        f"upstream latency: all acked after {ack_duration:.2f}s, all answered after "
+        f"{duration:.2f}s ({n_requests / duration:.0f} requests/s)"
+    )
+
+
+def create_synthetic_data(n_postcodes):
+    """Create heat pump data and postcodes, where postcode P{i} has i + 1 heat pumps
+    and the postcodes are too far apart for their 10km radii to overlap.
+
+    Args:
+        n_postcodes (int): Number of postcodes.
+
+    Returns:
+        tuple: Heat pump data and postcode resolver.
+    """
+
+    coord_df = pd.DataFrame(
+        {
+            "POSTCODE": [f"P{i}" for i in range(n_postcodes)],
+            "LATITUDE": [50 + 0.01 * i for i in range(n_postcodes)],
+            "LONGITUDE": [-5 + 0.5 * i for i in range(n_postcodes)],
+        }
+    )
+    hp_data = coord_df.loc[coord_df.index.repeat(coord_df.index + 1)].assign(
+        PROPERTY_TYPE="House", BUILT_FORM="Detached", HP_INSTALLED=True
+    )
+
+    return hp_data.reset_index(drop=True), postcodes.PostcodeResolver(coord_df)
+
+
+def create_closeby_dispatcher(n_postcodes):
+    """Set up density queries on synthetic data, see create_synthetic_data().
+
+    Args:
+        n_postcodes (int): Number of postcodes.
+
+    Returns:
+        dispatch.Dispatcher: Dispatcher whose workers can answer density queries.
+    """
+
+    hp_data, postcode_resolver = create_synthetic_data(n_postcodes)
+
+    hp_index = hp_density.HeatPumpIndex(hp_density.prepare_hp_data(hp_data))
+    hp_density.init_worker(hp_index, postcode_resolver)
+
+    return dispatch.Dispatcher(io_workers=settings.io_workers)
+
+
+def closeby_picker_values(postcode, property_type="Any", dist=10):
+    """Create the submitted values of a /closeby-hps-picker pop-up window.
+
+    Args:
+        postcode (str): Postcode to search for.
+        property_type (str, optional): Property type option. Defaults to "Any".
+        dist (int, optional): Search radius in km. Defaults to 10.
+
+    Returns:
+        dict: Submitted values by block and action.
+    """
+
+    return {
+        "postcode": {"plain_text_input-action": {"value": postcode}},
+        "proptype": {
+            "radio_buttons-action": {"selected_option": {"text": {"text": property_type}}}
+        },
+        "dist": {"plain_text_input-action": {"value": str(dist)}},
+    }
+
+
+async def run_modal_test(n_flows=50, latency=0.1):
+    """Open many /closeby-hps-picker pop-up windows at once, submit them in random
+    order and check that every answer is posted in the channel its command came from.
+
+    Args:
+        n_flows (int, optional): Number of overlapping pop-up windows. Defaults to 50.
+        latency (float, optional): Delay of the stub server in seconds. Defaults to 0.1.
+    """
+
+    os.environ.setdefault("SLACK_TOKEN", "xoxb-load-test")
+
+    import asf_little_helper_async
+
+    stub = StubServer(latency)
+    base_url = await stub.start()
+    settings.slack_api_url = base_url + "/api/"
+    dispatcher = create_closeby_dispatcher(n_flows)
+
+    async with aiohttp.ClientSession() as session:
+        client = asf_little_helper_async.create_client(session)
+        app = asf_little_helper_async.create_app(
+            client, session, dispatcher, user_directory=AsyncUserDirectory(client)
+        )
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                app.async_dispatch(
+                    AsyncBoltRequest(
+                        body=slash_command_body(
+                            "/closeby-hps-picker",
+                            channel=f"C{i}",
+                            user=f"U{i}",
+                            trigger_id=f"T{i}",
+                        ),
+                        mode="socket_mode",
+                    )
+                )
+                for i in range(n_flows)
+            ]
+        )
+
+        submissions = [
+            view_submission_body(
+                await stub.views[f"T{i}"].get(), closeby_picker_values(f"P{i}"), user=f"U{i}"
+            )
+            for i in range(n_flows)
+        ]
+        random.shuffle(submissions)
+
+        await asyncio.gather(
+            *[
+                app.async_dispatch(AsyncBoltRequest(body=body, mode="socket_mode"))
+                for body in submissions
+            ]
+        )
+
+        async def get_answer(channel):
+            try:
+                return await asyncio.wait_for(stub.messages[channel].get(), timeout=10)
+            except asyncio.TimeoutError:
+                return ""
+
+        answers = await asyncio.gather(*[get_answer(f"C{i}") for i in range(n_flows)])
+        duration = time.perf_counter() - start
+
+    await stub.stop()
+    dispatcher.shutdown()
+
+    wrong = [
+        i
+        for i in range(n_flows)
+        if f"There are {i + 1} heat pumps" not in answers[i]
+    ]
+    assert not wrong, f"Answers missing or in the wrong channel for flows {wrong}"
+
+    print(
+        f"{n_flows} overlapping /closeby-hps-picker pop-up windows: all answered in "
+        f"the right channel after {duration:.2f}s"
+    )
+
+
+
+async def closeby_hps_flow(stub, i, n_postcodes):
+    # /closeby-hps P{j}, answered in the channel
+    await stub.send(
+        slash_command_body("/closeby-hps", f"P{i % n_postcodes}", channel=f"C{i}", user=f"U{i}")
+    )
+
+    return await stub.messages[f"C{i}"].get()
+
+
+async def closeby_hps_picker_flow(stub, i, n_postcodes):
+    # /closeby-hps-picker, then the pop-up window is submitted
+    await stub.send(
+        slash_command_body(
+            "/closeby-hps-picker", channel=f"C{i}", user=f"U{i}", trigger_id=f"T{i}"
+        )
+    )
+    view = await stub.views[f"T{i}"].get()
+    await stub.send(
+        view_submission_body(
+            view, closeby_picker_values(f"P{i % n_postcodes}"), user=f"U{i}"
+        )
+    )
+
+    return await stub.messages[f"C{i}"].get()
+
+
+async def joke_flow(stub, i, n_postcodes):
+    # /tell-me-a-joke about one of a few topics, so that some are cached
+    topic = ["cat", "dog", "heat", "pump", "fridge"][i % 5]
+    await stub.send(
+        slash_command_body("/tell-me-a-joke", topic, channel=f"C{i}", user=f"U{i}")
+    )
+
+    return await stub.messages[f"C{i}"].get()
+
+
+async def reminder_flow(stub, i, n_postcodes):
+    # /project-status-reminder for two users, confirmed to the sender
+    await stub.send(
+        slash_command_body(
+            "/project-status-reminder", channel=f"C{i}", user=f"U{i}", trigger_id=f"T{i}"
+        )
+    )
+    view = await stub.views[f"T{i}"].get()
+    values = {
+        "user_sel": {"multi_users_select-action": {"selected_users": ["U0", f"U{i}"]}},
+        "text_sel": {"plain_text_input-action": {"value": "Please update your project."}},
+        "date_sel": {"datepicker-action": {"selected_date": "2030-01-03"}},
+        "time_sel": {"timepicker-action": {"selected_time": "11:00"}},
+    }
+    await stub.send(view_submission_body(view, values, user=f"U{i}"))
+
+    return await stub.messages[f"U{i}"].get()
+
+
+async def britishfy_flow(stub, i, n_postcodes):
+    # /britishfy, with the message sent back to the sender
+    await stub.send(
+        slash_command_body("/britishfy", channel=f"C{i}", user=f"U{i}", trigger_id=f"T{i}")
+    )
+    view = await stub.views[f"T{i}"].get()
+    values = {
+        "who": {"users_select-action": {"selected_user": "U0"}},
+        "todo": {"plain_text_input-action": {"value": "review the report"}},
+        "date": {"datepicker-action": {"selected_date": "2030-01-03"}},
+        "mypart": {"plain_text_input-action": {"value": "send you the data"}},
+    }
+    await stub.send(view_submission_body(view, values, user=f"U{i}"))
+
+    return await stub.messages[f"U{i}"].get()
+
+
+# Steps of each command as a user goes through them, returning the bot's answer
+FLOWS = {
+    "/closeby-hps": closeby_hps_flow,
+    "/closeby-hps-picker": closeby_hps_picker_flow,
+    "/tell-me-a-joke": joke_flow,
+    "/project-status-reminder": reminder_flow,
+    "/britishfy": britishfy_flow,
+}
+
+
+@contextmanager
+def use_local_data(hp_data, postcode_resolver):
+    """Let the bot use the given heat pump data and postcodes instead of loading them from S3.
+
+    Args:
+        hp_data (pd.DataFrame): Heat pump data.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+    """
+
+    with mock.patch.object(
+        data_cache, "load_hp_data", return_value=hp_data
+    ), mock.patch.object(data_cache, "start_background_refresh"), mock.patch.object(
+        postcodes, "get_default_resolver", return_value=postcode_resolver
+    ):
+        yield
+
+
+async def start_sync_bot(hp_data, postcode_resolver):
+    """Start asf_little_helper.py in socket mode against the stub server.
+
+    The bot sets itself up on import, so it can only be started once per process.
+
+    Args:
+        hp_data (pd.DataFrame): Heat pump data.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+
+    Returns:
+        callable: Coroutine function that stops the bot.
+    """
+
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+    # The bot calls the Slack API while it is set up, which is answered on this event loop
+    with use_local_data(hp_data, postcode_resolver):
+        bot = await asyncio.to_thread(importlib.import_module, "asf_little_helper")
+
+    handler = SocketModeHandler(bot.app, "xapp-load-test")
+    await asyncio.to_thread(handler.connect)
+
+    async def stop():
+        await asyncio.to_thread(handler.close)
+        bot.dispatcher.shutdown(wait=False)
+
+    return stop
+
+
+async def start_async_bot(session, hp_data, postcode_resolver):
+    """Start asf_little_helper_async.py in socket mode against the stub server.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP session of the bot.
+        hp_data (pd.DataFrame): Heat pump data.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+
+    Returns:
+        callable: Coroutine function that stops the bot.
+    """
+
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+    import asf_little_helper_async
+
+    with use_local_data(hp_data, postcode_resolver):
+        dispatcher = asf_little_helper_async.create_dispatcher()
+
+    client = asf_little_helper_async.create_client(session)
+    app = asf_little_helper_async.create_app(
+        client, session, dispatcher, user_directory=AsyncUserDirectory(client)
+    )
+
+    handler = AsyncSocketModeHandler(app, "xapp-load-test")
+    await handler.connect_async()
+
+    async def stop():
+        await handler.close_async()
+        dispatcher.shutdown(wait=False)
+
+    return stop
+
+
+def print_latencies(name, latencies):
+    """Print the count and percentiles of latencies in seconds.
+
+    Args:
+        name (str): Name of the request or command.
+        latencies (list): Latencies in seconds.
+    """
+
+    p50, p99 = np.percentile(latencies, (50, 99)) * 1000
+    print(f"  {name}: {len(latencies)} requests, p50 {p50:.1f}ms, p99 {p99:.1f}ms")
+
+
+async def run_harness(
+    bot="sync",
+    mix=DEFAULT_MIX,
+    n_requests=200,
+    concurrency=20,
+    latency=0.05,
+    n_postcodes=50,
+    timeout=30,
+    seed=0,
+):
+    """Replay a mix of commands against the bot over socket mode, with a local
+    stand-in for Slack and the joke API, and report the throughput and latencies.
+
+    Every command is played through to the bot's answer, including the pop-up
+    windows it opens. Up to concurrency commands are in progress at once.
+
+    Args:
+        bot (str, optional): "sync" for asf_little_helper.py or "async" for
+            asf_little_helper_async.py. Defaults to "sync".
+        mix (dict, optional): Relative frequency of each command in FLOWS.
+            Defaults to DEFAULT_MIX.
+        n_requests (int, optional): Number of commands to send. Defaults to 200.
+        concurrency (int, optional): Commands in progress at once. Defaults to 20.
+        latency (float, optional): Delay of the stub server in seconds. Defaults to 0.05.
+        n_postcodes (int, optional): Number of postcodes of the synthetic data. Defaults to 50.
+        timeout (float, optional): Seconds to wait for each answer. Defaults to 30.
+        seed (int, optional): Seed of the random order of the commands. Defaults to 0.
+
+    Returns:
+        dict: Requests per second, answers saying the bot was busy, and the latencies
+            in seconds until each command was answered and each request acked.
+    """
+
+    os.environ.setdefault("SLACK_TOKEN", "xoxb-load-test")
+
+    stub = StubServer(latency)
+    base_url = await stub.start()
+    settings.slack_api_url = base_url + "/api/"
+    settings.joke_api_url = base_url + "/search"
+
+    hp_data, postcode_resolver = create_synthetic_data(n_postcodes)
+    commands = random.Random(seed).choices(list(mix), weights=list(mix.values()), k=n_requests)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    answer_latencies = defaultdict(list)
+
+    async def play(i, command):
+        async with semaphore:
+            start = time.perf_counter()
+            answer = await asyncio.wait_for(FLOWS[command](stub, i, n_postcodes), timeout)
+            answer_latencies[command].append(time.perf_counter() - start)
+
+            return answer == settings.busy_text
+
+    async with aiohttp.ClientSession() as session:
+        if bot == "sync":
+            stop = await start_sync_bot(hp_data, postcode_resolver)
+        else:
+            stop = await start_async_bot(session, hp_data, postcode_resolver)
+
+        start = time.perf_counter()
+        busy = await asyncio.gather(*[play(i, command) for i, command in enumerate(commands)])
+        duration = time.perf_counter() - start
+
+        await stop()
+
+    await stub.stop()
+
+    print(
+        f"{bot} bot, {n_requests} commands, {concurrency} at once, {latency * 1000:.0f}ms "
+        f"upstream latency: {n_requests / duration:.1f} requests/s, "
+        f"{sum(busy)} answered busy"
+    )
+    print(" Until answered:")
+    for command, latencies in answer_latencies.items():
+        print_latencies(command, latencies)
+    print(" Until acked:")
+    for name, latencies in stub.ack_latencies.items():
+        print_latencies(name, latencies)
+
+    return {
+        "requests_per_second": n_requests / duration,
+        "n_busy": sum(busy),
+        "answer_latencies": dict(answer_latencies),
+        "ack_latencies": dict(stub.ack_latencies),
+    }
+
+
+if __name__ == "__main__":
+    asyncio.run(run_load_test())
+    asyncio.run(run_modal_test())
+    asyncio.run(run_harness("async"))
+    asyncio.run(run_harness("sync"))
@@ -0,0 +1,397 @@
+# ==== IMPORTS ====
+
+import bisect
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import slash_commands.settings as settings
+
+# ================
+# Latency histograms for the bot's hot paths. Spans are recorded per process,
+# so with cpu_workers > 0 the steps run in worker processes are not included.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Thread-safe latency histogram with Prometheus-style cumulative buckets.
+
+    The most recent observations are also kept to compute percentiles.
+
+    Args:
+        buckets (tuple, optional): Upper bounds of the buckets in seconds. Defaults to DEFAULT_BUCKETS.
+        n_recent (int, optional): Number of recent observations kept. Defaults to 1000.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, n_recent=1000):
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=n_recent)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Add an observation.
+
+        Args:
+            seconds (float): Duration in seconds.
+        """
+
+        i = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+            self.recent.append(seconds)
+
+    def percentiles(self, q=(50, 99)):
+        """Get percentiles of the recent observations.
+
+        Args:
+            q (tuple, optional): Percentiles to compute. Defaults to (50, 99).
+
+        Returns:
+            np.array: Percentiles in seconds.
+        """
+
+        with self._lock:
+            recent = np.array(self.recent)
+
+        return np.percentile(recent, q) if len(recent) else np.full(len(q), np.nan)
+
+
+class Metrics:
+    """Collection of latency histograms, one per name and set of labels."""
+
+    def __init__(self):
+
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def get_histogram(self, name, **labels):
+        """Get the histogram for a name and labels, creating it if needed.
+
+        Args:
+            name (str): Metric name, e.g. "bot_request_seconds".
+            **labels: Label values, e.g. command="/closeby-hps".
+
+        Returns:
+            Histogram: Histogram.
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+
+            return self.histograms[key]
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration.
+
+        Args:
+            name (str): Metric name.
+            seconds (float): Duration in seconds.
+            **labels: Label values.
+        """
+
+        self.get_histogram(name, **labels).observe(seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block.
+
+        Args:
+            name (str): Metric name.
+            **labels: Label values.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render_prometheus(self):
+        """Render all histograms in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics page.
+        """
+
+        lines = []
+        seen_names = set()
+
+        with self._lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+
+        for (name, labels), histogram in histograms:
+            if name not in seen_names:
+                lines.append(f"# TYPE {name} histogram")
+                seen_names.add(name)
+
+            label_text = "".join(f'{key}="{value}",' for key, value in labels)
+            cumulative = np.cumsum(histogram.counts)
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+
+            for bound, count in zip(bounds, cumulative):
+                lines.append(f'{name}_bucket{{{label_text}le="{bound}"}} {count}')
+
+            label_text = label_text.rstrip(",")
+            lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Summarise the count, p50 and p99 of every histogram.
+
+        Returns:
+            str: One line per histogram.
+        """
+
+        lines = []
+
+        with self._lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+
+        for (name, labels), histogram in histograms:
+            p50, p99 = histogram.percentiles() * 1000
+            label_text = ",".join(f"{key}={value}" for key, value in labels)
+            lines.append(
+                f"{name}{{{label_text}}}: {histogram.count} calls, "
+                f"p50 {p50:.1f}ms, p99 {p99:.1f}ms"
+            )
+
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Profile every n-th call of a function with cProfile and collect the stats.
+
+    Args:
+        every (int, optional): Profile one in this many calls, or 0 to switch off.
+            Defaults to settings.profile_sample_every.
+    """
+
+    def __init__(self, every=settings.profile_sample_every):
+
+        self.every = every
+        self.n_calls = 0
+        self.stats = None
+        self._lock = threading.Lock()
+
+    def profile(self, func):
+        """Decorate a function so that a sample of its calls is profiled.
+
+        Args:
+            func (callable): Function to profile.
+
+        Returns:
+            callable: Wrapped function.
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+
+            if not self.every:
+                return func(*args, **kwargs)
+
+            with self._lock:
+                self.n_calls += 1
+                sampled = self.n_calls % self.every == 0
+
+            if not sampled:
+                return func(*args, **kwargs)
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another call is already being profiled (Python 3.12+ allows only one)
+                return func(*args, **kwargs)
+
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profiler.disable()
+
+            with self._lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profiler)
+                else:
+                    self.stats.add(profiler)
+
+            return result
+
+        return wrapper
+
+    def report(self, n_lines=15):
+        """Get the functions with the most cumulative time in the profiled calls.
+
+        Args:
+            n_lines (int, optional): Number of functions to list. Defaults to 15.
+
+        Returns:
+            str: Profile report, or None if nothing was profiled yet.
+        """
+
+        with self._lock:
+            if self.stats is None:
+                return None
+
+            output = io.StringIO()
+            self.stats.stream = output
+            self.stats.sort_stats("cumulative").print_stats(n_lines)
+
+        return output.getvalue()
+
+
+# Shared by the whole bot
+registry = Metrics()
+profiler = SamplingProfiler()
+span = registry.span
+
+
+def instrument_client(client):
+    """Time every Slack API call of a client, by API method.
+
+    Args:
+        client (slack_sdk.WebClient): Slack client.
+    """
+
+    api_call = client.api_call
+
+    @functools.wraps(api_call)
+    def timed_api_call(api_method, *args, **kwargs):
+        with span("slack_api_seconds", method=api_method):
+            return api_call(api_method, *args, **kwargs)
+
+    client.api_call = timed_api_call
+
+
+def instrument_async_client(client):
+    """Time every Slack API call of an asyncio client, by API method.
+
+    Args:
+        client (slack_sdk.web.async_client.AsyncWebClient): Slack client.
+    """
+
+    api_call = client.api_call
+
+    @functools.wraps(api_call)
+    async def timed_api_call(api_method, *args, **kwargs):
+        with span("slack_api_seconds", method=api_method):
+            return await api_call(api_method, *args, **kwargs)
+
+    client.api_call = timed_api_call
+
+
+def get_request_name(body):
+    """Name a Slack request by its command, pop-up window or event type.
+
+    Args:
+        body (dict): Request body.
+
+    Returns:
+        str: Request name, e.g. "/closeby-hps" or "view:closeby-window".
+    """
+
+    if "command" in body:
+        return body["command"]
+    if body.get("type") == "view_submission":
+        return "view:" + body["view"]["callback_id"]
+    if "event" in body:
+        return "event:" + body["event"]["type"]
+
+    return body.get("type", "unknown")
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the metrics page at /metrics."""
+
+    def do_GET(self):
+
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        page = registry.render_prometheus().encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise be printed to stderr
+        pass
+
+
+def start_http_server(port=settings.metrics_port):
+    """Serve the metrics at http://localhost:{port}/metrics in a background thread.
+
+    Args:
+        port (int, optional): Port to listen on. Defaults to settings.metrics_port.
+
+    Returns:
+        http.server.ThreadingHTTPServer: Server.
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+    return server
+
+
+def start_log_summary(interval=settings.metrics_log_interval):
+    """Log the latency summary, and the profile if enabled, regularly in a background thread.
+
+    Args:
+        interval (float, optional): Seconds between summaries.
+            Defaults to settings.metrics_log_interval.
+    """
+
+    def log_summary():
+        while True:
+            time.sleep(interval)
+            logger.info("Latencies:\n%s", registry.summary())
+
+            report = profiler.report()
+            if report is not None:
+                logger.info("Profile of sampled calls:\n%s", report)
+
+    threading.Thread(target=log_summary, name="metrics-log", daemon=True).start()
+
+
+def start(port=settings.metrics_port, interval=settings.metrics_log_interval):
+    """Start the metrics endpoint and the log summary, if they are enabled.
+
+    Args:
+        port (int, optional): Port of the metrics endpoint, or None to switch it off.
+            Defaults to settings.metrics_port.
+        interval (float, optional): Seconds between log summaries, or None to switch them off.
+            Defaults to settings.metrics_log_interval.
+    """
+
+    if port is not None:
+        start_http_server(port)
+    if interval is not None:
+        start_log_summary(interval)
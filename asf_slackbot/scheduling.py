@@ -0,0 +1,268 @@
+# ==== IMPORTS ====
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from slack_sdk.errors import SlackApiError
+
+import slash_commands.settings as settings
+
+# ================
+
+
+class TokenBucket:
+    """Rate limiter allowing bursts of calls, refilled at a steady rate.
+
+    Args:
+        rate (float): Calls per second in the long run.
+        capacity (int): Number of calls that can be made at once.
+    """
+
+    def __init__(self, rate, capacity):
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token if there is one.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until the next one.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Wait until a token is available and take it."""
+
+        while (wait := self.take()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait until a token is available and take it, without blocking the event loop."""
+
+        while (wait := self.take()) > 0:
+            await asyncio.sleep(wait)
+
+
+def get_retry_delay(error, attempt):
+    """Get how long to wait before retrying a rate limited call.
+
+    Args:
+        error (slack_sdk.errors.SlackApiError): Error of the call.
+        attempt (int): Number of the failed attempt, starting at 1.
+
+    Returns:
+        float: Seconds to wait, or None if the call should not be retried.
+    """
+
+    if error.response.status_code != 429:
+        return None
+
+    # Header names can be lower case, depending on the client
+    for name, value in error.response.headers.items():
+        if name.lower() == "retry-after":
+            return float(value[0] if isinstance(value, list) else value)
+
+    return float(2**attempt)
+
+
+def get_outcome(user, attempts, error=None):
+    """Describe the outcome of scheduling a message for a user.
+
+    Args:
+        user (str): User ID.
+        attempts (int): Number of calls made.
+        error (slack_sdk.errors.SlackApiError, optional): Error of the last call. Defaults to None.
+
+    Returns:
+        dict: User, whether it worked, the Slack error if not and the number of attempts.
+    """
+
+    return {
+        "user": user,
+        "ok": error is None,
+        "error": None if error is None else error.response.get("error", str(error)),
+        "attempts": attempts,
+    }
+
+
+class BaseBulkScheduler:
+    """Token bucket and retry policy shared by the sync and async bulk schedulers,
+    which add the Slack calls.
+
+    Args:
+        client (slack_sdk.WebClient or AsyncWebClient): Slack client.
+        rate_per_minute (float, optional): Calls per minute in the long run.
+            Defaults to settings.schedule_rate_per_minute.
+        burst (int, optional): Calls that can be made at once. Defaults to settings.schedule_burst.
+        max_retries (int, optional): Retries per user after rate limiting. Defaults to 3.
+    """
+
+    def __init__(
+        self,
+        client,
+        rate_per_minute=settings.schedule_rate_per_minute,
+        burst=settings.schedule_burst,
+        max_retries=3,
+    ):
+
+        self.client = client
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+        self.max_retries = max_retries
+
+    def get_retry_delay(self, error, attempt):
+        """Get how long to wait before retrying a failed call.
+
+        Args:
+            error (slack_sdk.errors.SlackApiError): Error of the call.
+            attempt (int): Number of the failed attempt, starting at 1.
+
+        Returns:
+            float: Seconds to wait, or None if the call should not be retried.
+        """
+
+        if attempt > self.max_retries:
+            return None
+
+        return get_retry_delay(error, attempt)
+
+
+class BulkScheduler(BaseBulkScheduler):
+    """Schedule the same message for many users concurrently within Slack's rate limits.
+
+    Calls are spread over a thread pool and throttled by a token bucket.
+    Rate limited calls are retried after the delay Slack asks for.
+
+    Args:
+        client (slack_sdk.WebClient): Slack client.
+        rate_per_minute (float, optional): Calls per minute in the long run.
+            Defaults to settings.schedule_rate_per_minute.
+        burst (int, optional): Calls that can be made at once. Defaults to settings.schedule_burst.
+        max_workers (int, optional): Number of concurrent calls. Defaults to 16.
+        max_retries (int, optional): Retries per user after rate limiting. Defaults to 3.
+    """
+
+    def __init__(
+        self,
+        client,
+        rate_per_minute=settings.schedule_rate_per_minute,
+        burst=settings.schedule_burst,
+        max_workers=16,
+        max_retries=3,
+    ):
+
+        super().__init__(client, rate_per_minute, burst, max_retries)
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="scheduler")
+
+    def schedule_one(self, user, text, post_at):
+        """Schedule a message for one user, retrying if rate limited.
+
+        Args:
+            user (str): User ID.
+            text (str): Message text.
+            post_at (int): Unix timestamp to send the message at.
+
+        Returns:
+            dict: Outcome, see get_outcome().
+        """
+
+        for attempt in range(1, self.max_retries + 2):
+            self.bucket.acquire()
+
+            try:
+                self.client.chat_scheduleMessage(channel=user, text=text, post_at=post_at)
+                return get_outcome(user, attempt)
+
+            except SlackApiError as error:
+                delay = self.get_retry_delay(error, attempt)
+                if delay is None:
+                    return get_outcome(user, attempt, error)
+                time.sleep(delay)
+
+    def schedule(self, users, text, post_at):
+        """Schedule a message for many users.
+
+        Args:
+            users (list): User IDs.
+            text (str): Message text.
+            post_at (int): Unix timestamp to send the message at.
+
+        Returns:
+            list: Outcome per user, in the same order.
+        """
+
+        return list(
+            self.pool.map(lambda user: self.schedule_one(user, text, post_at), users)
+        )
+
+
+class AsyncBulkScheduler(BaseBulkScheduler):
+    """Bulk scheduler for the asyncio version of the bot, see BulkScheduler.
+
+    Args:
+        client (slack_sdk.web.async_client.AsyncWebClient): Slack client.
+        rate_per_minute (float, optional): Calls per minute in the long run.
+            Defaults to settings.schedule_rate_per_minute.
+        burst (int, optional): Calls that can be made at once. Defaults to settings.schedule_burst.
+        max_retries (int, optional): Retries per user after rate limiting. Defaults to 3.
+    """
+
+    async def schedule_one(self, user, text, post_at):
+        """Schedule a message for one user, retrying if rate limited.
+
+        Args:
+            user (str): User ID.
+            text (str): Message text.
+            post_at (int): Unix timestamp to send the message at.
+
+        Returns:
+            dict: Outcome, see get_outcome().
+        """
+
+        for attempt in range(1, self.max_retries + 2):
+            await self.bucket.acquire_async()
+
+            try:
+                await self.client.chat_scheduleMessage(
+                    channel=user, text=text, post_at=post_at
+                )
+                return get_outcome(user, attempt)
+
+            except SlackApiError as error:
+                delay = self.get_retry_delay(error, attempt)
+                if delay is None:
+                    return get_outcome(user, attempt, error)
+                await asyncio.sleep(delay)
+
+    async def schedule(self, users, text, post_at):
+        """Schedule a message for many users.
+
+        Args:
+            users (list): User IDs.
+            text (str): Message text.
+            post_at (int): Unix timestamp to send the message at.
+
+        Returns:
+            list: Outcome per user, in the same order.
+        """
+
+        return await asyncio.gather(
+            *[self.schedule_one(user, text, post_at) for user in users]
+        )
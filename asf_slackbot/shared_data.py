@@ -0,0 +1,167 @@
+# ==== IMPORTS ====
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from slash_commands import hp_density
+from slash_commands.postcodes import SortedPostcodeResolver
+
+# ================
+# Heat pump index and postcode lookup in shared memory, so that the worker
+# processes of the bot attach to one copy instead of each unpickling their own.
+
+# Shared memory attached by this (worker) process, kept open while it is used
+_attached = {}
+
+
+class SharedArrays:
+    """Named numpy arrays in one block of shared memory.
+
+    The process creating the block owns it and unlinks it when it is no longer
+    needed. Its worker processes attach to it by its handle and get read-only
+    views of the arrays, without copying them.
+
+    Args:
+        shm (multiprocessing.shared_memory.SharedMemory): Shared memory block.
+        layout (dict): Offset, dtype and shape of each array in the block.
+    """
+
+    def __init__(self, shm, layout):
+
+        self.shm = shm
+        self.layout = layout
+        self.arrays = {}
+
+        for name, (offset, dtype, shape) in layout.items():
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @property
+    def handle(self):
+        """Picklable reference to the block, to pass to other processes."""
+
+        return self.shm.name, self.layout
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    @classmethod
+    def create(cls, arrays):
+        """Copy arrays into a new block of shared memory.
+
+        Args:
+            arrays (dict): Arrays by name.
+
+        Returns:
+            SharedArrays: Shared arrays.
+        """
+
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            # Align every array to 64 bytes
+            offset = -(-size // 64) * 64
+            layout[name] = (offset, array.dtype.str, array.shape)
+            size = offset + array.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+        for name, (offset, dtype, shape) in layout.items():
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = arrays[name]
+
+        return cls(shm, layout)
+
+    @classmethod
+    def attach(cls, handle):
+        """Attach to a block of shared memory created by another process.
+
+        Args:
+            handle (tuple): Handle of the shared arrays.
+
+        Returns:
+            SharedArrays: Shared arrays.
+        """
+
+        name, layout = handle
+
+        # Worker processes share the resource tracker of the process that
+        # created the block, so attaching doesn't register it a second time.
+        # Unregistering it here would make the tracker forget it for everyone.
+        shm = shared_memory.SharedMemory(name=name)
+
+        return cls(shm, layout)
+
+    def unlink(self):
+        """Free the block once all processes have closed it. Called by the creating process."""
+
+        self.arrays = {}
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedHeatPumpData:
+    """Heat pump index and postcode lookup in shared memory, for the worker processes.
+
+    Pass init_worker and initargs to the process pool, e.g. as cpu_initializer
+    and cpu_initargs of dispatch.Dispatcher.
+
+    Args:
+        hp_index (hp_density.HeatPumpIndex): Prebuilt heat pump index.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+    """
+
+    def __init__(self, hp_index, postcode_resolver):
+
+        resolver = SortedPostcodeResolver.from_resolver(postcode_resolver)
+        arrays = {f"hp_index/{name}": array for name, array in hp_index.to_arrays().items()}
+        arrays.update(
+            {f"postcodes/{name}": array for name, array in resolver.to_arrays().items()}
+        )
+
+        self.shared = SharedArrays.create(arrays)
+        self.initargs = (self.shared.handle,)
+
+    def unlink(self):
+        """Free the shared memory once all workers using it have exited."""
+
+        self.shared.unlink()
+
+
+def load_shared(handle):
+    """Attach to shared heat pump data and build the index and postcode lookup on it.
+
+    Args:
+        handle (tuple): Handle of the shared arrays of SharedHeatPumpData.
+
+    Returns:
+        tuple: Heat pump index and postcode lookup.
+    """
+
+    shared = SharedArrays.attach(handle)
+    _attached[handle[0]] = shared
+
+    def get_arrays(prefix):
+        return {
+            name[len(prefix) :]: array
+            for name, array in shared.arrays.items()
+            if name.startswith(prefix)
+        }
+
+    hp_index = hp_density.HeatPumpIndex.from_arrays(get_arrays("hp_index/"))
+    postcode_resolver = SortedPostcodeResolver(**get_arrays("postcodes/"))
+
+    return hp_index, postcode_resolver
+
+
+def init_worker(handle):
+    """Set up a worker process with the shared heat pump data, see hp_density.init_worker().
+
+    Args:
+        handle (tuple): Handle of the shared arrays of SharedHeatPumpData.
+    """
+
+    hp_density.init_worker(*load_shared(handle))
@@ -0,0 +1,231 @@
+# ==== IMPORTS ====
+
+import numpy as np
+
+# ================
+
+
+class DensityGrid:
+    """Heat pump counts aggregated on a fixed grid for fast radius queries.
+
+    The Cartesian coordinates of the heat pumps are projected onto a plane
+    touching the Earth at the centre of the data and counted per grid cell.
+    A radius query sums whole cells that are certainly inside the radius using
+    row-wise cumulative counts, and only checks the points in cells crossing
+    the boundary of the radius.
+
+    Projecting onto the plane can only shorten distances, and by at most a
+    factor cos(theta), where theta is the largest angle between the centre and
+    any point involved. Cells are therefore only counted as a whole if they lie
+    within radius * cos(theta) on the plane, so the exact count matches the
+    count of the KD-tree in hp_density.HeatPumpIndex.
+
+    Args:
+        hp_coords (np.array): Cartesian coordinates of the heat pumps,
+            as returned by hp_density.extract_Cartesian_coords().
+        cell_size (float, optional): Width of a grid cell in km. Defaults to 1.
+    """
+
+    def __init__(self, hp_coords, cell_size=1):
+
+        hp_coords = np.asarray(hp_coords, dtype=float).reshape(-1, 3)
+        self.cell_size = cell_size
+
+        # Plane touching the sphere at the centre of the data
+        centre = hp_coords.mean(axis=0) if len(hp_coords) > 0 else np.array([1, 0, 0])
+        self.radius_earth = (
+            np.linalg.norm(hp_coords[0]) if len(hp_coords) > 0 else 6367
+        )
+        self.up = centre / np.linalg.norm(centre)
+        east = np.cross([0, 0, 1], self.up)
+        east = east / np.linalg.norm(east)
+        north = np.cross(self.up, east)
+        self.basis = np.array([east, north]).T
+
+        self.cos_theta = (
+            (hp_coords @ self.up).min() / self.radius_earth
+            if len(hp_coords) > 0
+            else 1
+        )
+
+        plane_coords = hp_coords @ self.basis
+        self.origin = (
+            plane_coords.min(axis=0) if len(hp_coords) > 0 else np.zeros(2)
+        )
+        cells = np.floor((plane_coords - self.origin) / cell_size).astype(np.int64)
+        self.n_rows = int(cells[:, 1].max()) + 1 if len(hp_coords) > 0 else 1
+        self.n_cols = int(cells[:, 0].max()) + 1 if len(hp_coords) > 0 else 1
+
+        # Sort the points by cell, so each run of cells in a row is a run of points
+        cell_ids = cells[:, 1] * self.n_cols + cells[:, 0]
+        order = np.argsort(cell_ids, kind="stable")
+        self.points = hp_coords[order]
+
+        counts = np.bincount(cell_ids, minlength=self.n_rows * self.n_cols)
+        self.cell_start = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.cell_start[1:])
+
+        counts = counts.reshape(self.n_rows, self.n_cols)
+        self.row_cumsum = np.zeros((self.n_rows, self.n_cols + 1), dtype=np.int32)
+        np.cumsum(counts, axis=1, out=self.row_cumsum[:, 1:])
+
+    def to_arrays(self):
+        """Get the arrays of the grid, e.g. to put them in shared memory.
+
+        Returns:
+            dict: Arrays by name.
+        """
+
+        return {
+            "points": self.points,
+            "cell_start": self.cell_start,
+            "row_cumsum": self.row_cumsum,
+            "frame": np.concatenate([self.up, self.basis.ravel(), self.origin]),
+            "params": np.array(
+                [self.cell_size, self.radius_earth, self.cos_theta, self.n_rows, self.n_cols],
+                dtype=float,
+            ),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Create a grid from the arrays of to_arrays(), without copying them.
+
+        Args:
+            arrays (dict): Arrays by name.
+
+        Returns:
+            DensityGrid: Density grid.
+        """
+
+        grid = cls.__new__(cls)
+        grid.points = arrays["points"]
+        grid.cell_start = arrays["cell_start"]
+        grid.row_cumsum = arrays["row_cumsum"]
+
+        frame = arrays["frame"]
+        grid.up, grid.basis, grid.origin = frame[:3], frame[3:9].reshape(3, 2), frame[9:]
+
+        cell_size, radius_earth, cos_theta, n_rows, n_cols = arrays["params"]
+        grid.cell_size, grid.radius_earth, grid.cos_theta = cell_size, radius_earth, cos_theta
+        grid.n_rows, grid.n_cols = int(n_rows), int(n_cols)
+
+        return grid
+
+    def _get_cell_ranges(self, query_coords, radius):
+        """Get the grid cells fully and partly within the radius, row by row.
+
+        Args:
+            query_coords (np.array): Cartesian coordinates of the query point.
+            radius (float): Search radius in km.
+
+        Returns:
+            tuple: Rows, first and last column (exclusive) of the cells fully inside
+                the radius, and first and last column (exclusive) of all candidate cells.
+        """
+
+        cos_theta = min(self.cos_theta, query_coords @ self.up / self.radius_earth)
+        inner_radius = radius * max(cos_theta, 0)
+
+        qx, qy = (query_coords @ self.basis - self.origin) / self.cell_size
+        radius, inner_radius = radius / self.cell_size, inner_radius / self.cell_size
+
+        rows = np.arange(
+            max(int(np.floor(qy - radius)), 0),
+            min(int(np.floor(qy + radius)) + 1, self.n_rows),
+        )
+
+        # Smallest and largest distance between the query and each row
+        dy_min = np.maximum(np.maximum(rows - qy, qy - rows - 1), 0)
+        dy_max = np.maximum(np.abs(rows - qy), np.abs(rows + 1 - qy))
+
+        half_width = np.sqrt(np.maximum(radius**2 - dy_min**2, 0))
+        first_col = np.clip(np.floor(qx - half_width), 0, self.n_cols)
+        last_col = np.clip(np.floor(qx + half_width) + 1, 0, self.n_cols)
+
+        inner_half_width = np.sqrt(np.maximum(inner_radius**2 - dy_max**2, 0))
+        inner_first_col = np.clip(np.ceil(qx - inner_half_width), 0, self.n_cols)
+        inner_last_col = np.clip(np.floor(qx + inner_half_width), 0, self.n_cols)
+        inner_last_col = np.where(
+            dy_max <= inner_radius,
+            np.maximum(inner_last_col, inner_first_col),
+            inner_first_col,
+        )
+
+        return (
+            rows,
+            inner_first_col.astype(np.int64),
+            inner_last_col.astype(np.int64),
+            first_col.astype(np.int64),
+            last_col.astype(np.int64),
+        )
+
+    def count_range(self, query_coords, radius):
+        """Get a lower and upper bound for the number of heat pumps within a radius,
+        using only the precomputed cell counts.
+
+        Args:
+            query_coords (np.array): Cartesian coordinates of the query point.
+            radius (float): Search radius in km.
+
+        Returns:
+            tuple: Lower and upper bound.
+        """
+
+        rows, inner_first, inner_last, first, last = self._get_cell_ranges(
+            query_coords, radius
+        )
+
+        lower = (
+            self.row_cumsum[rows, inner_last] - self.row_cumsum[rows, inner_first]
+        ).sum()
+        upper = (self.row_cumsum[rows, last] - self.row_cumsum[rows, first]).sum()
+
+        return int(lower), int(upper)
+
+    def count(self, query_coords, radius, exact=True):
+        """Count the heat pumps within a radius of the given point.
+
+        Args:
+            query_coords (np.array): Cartesian coordinates of the query point.
+            radius (float): Search radius in km.
+            exact (bool, optional): Whether to check the points in the cells crossing
+                the boundary. If False, the middle of count_range() is returned, which
+                is off by at most half the difference between its bounds. Defaults to True.
+
+        Returns:
+            int: Number of heat pumps within the radius.
+        """
+
+        rows, inner_first, inner_last, first, last = self._get_cell_ranges(
+            query_coords, radius
+        )
+
+        inner_count = (
+            self.row_cumsum[rows, inner_last] - self.row_cumsum[rows, inner_first]
+        ).sum()
+
+        if not exact:
+            upper = (self.row_cumsum[rows, last] - self.row_cumsum[rows, first]).sum()
+            return int(round((inner_count + upper) / 2))
+
+        # Points in the cells left and right of the fully covered cells
+        row_offsets = rows * self.n_cols
+        starts = self.cell_start[
+            np.concatenate([row_offsets + first, row_offsets + inner_last])
+        ]
+        ends = self.cell_start[
+            np.concatenate([row_offsets + inner_first, row_offsets + last])
+        ]
+
+        lengths = ends - starts
+        point_ids = np.arange(lengths.sum()) + np.repeat(
+            starts - np.cumsum(lengths) + lengths, lengths
+        )
+
+        differences = self.points[point_ids] - query_coords
+        boundary_count = (
+            np.einsum("ij,ij->i", differences, differences) <= radius**2
+        ).sum()
+
+        return int(inner_count + boundary_count)
@@ -0,0 +1,134 @@
+# ==== IMPORTS ====
+
+import math
+
+import numpy as np
+
+# ================
+# Heat pumps are indexed by their Cartesian coordinates on a sphere, where a
+# search tree measures straight-line (chord) distances. A great-circle radius
+# d corresponds exactly to the chord 2R * sin(d / 2R), so converting the radius
+# once gives the same result as comparing great-circle distances.
+
+EARTH_RADIUS = 6367  # radius of the Earth in kilometers
+
+
+def to_cartesian(lat, lng):
+    """Convert a single latitude/longitude point to Cartesian coordinates.
+
+    Args:
+        lat (float): Latitude in degrees.
+        lng (float): Longitude in degrees.
+
+    Returns:
+        np.array: Cartesian coordinates (x, y, z) in km.
+    """
+
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+
+    return np.array(
+        (
+            EARTH_RADIUS * cos_lat * math.cos(lng),
+            EARTH_RADIUS * cos_lat * math.sin(lng),
+            EARTH_RADIUS * math.sin(lat),
+        )
+    )
+
+
+def to_lat_lng(points):
+    """Convert Cartesian coordinates back to latitude and longitude.
+
+    Args:
+        points (np.array): Cartesian coordinates with shape (n, 3).
+
+    Returns:
+        tuple: Latitudes and longitudes in degrees.
+    """
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    lats = np.degrees(np.arcsin(np.clip(points[:, 2] / EARTH_RADIUS, -1, 1)))
+    lngs = np.degrees(np.arctan2(points[:, 1], points[:, 0]))
+
+    return lats, lngs
+
+
+def chord_threshold(radius):
+    """Get the straight-line distance that corresponds to a great-circle radius.
+
+    Args:
+        radius (float or np.array): Great-circle radius in km.
+
+    Returns:
+        float or np.array: Chord length in km.
+    """
+
+    return 2 * EARTH_RADIUS * np.sin(np.minimum(radius, np.pi * EARTH_RADIUS) / (2 * EARTH_RADIUS))
+
+
+def chord_to_great_circle(chord):
+    """Get the great-circle distance that corresponds to a straight-line distance.
+
+    Args:
+        chord (float or np.array): Chord length in km.
+
+    Returns:
+        float or np.array: Great-circle distance in km.
+    """
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(chord / (2 * EARTH_RADIUS), 1))
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Get the great-circle distance between points with the haversine formula.
+
+    Args:
+        lat1 (float or np.array): Latitudes of the first points in degrees.
+        lng1 (float or np.array): Longitudes of the first points in degrees.
+        lat2 (float or np.array): Latitudes of the second points in degrees.
+        lng2 (float or np.array): Longitudes of the second points in degrees.
+
+    Returns:
+        float or np.array: Distances in km.
+    """
+
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def is_within(points, lat, lng, radius, tolerance=1e-6):
+    """Check which points are within a great-circle radius of a location.
+
+    Points are compared by chord length. Points within tolerance of the edge,
+    where rounding could tip the chord comparison either way, are checked
+    again with the haversine formula.
+
+    Args:
+        points (np.array): Cartesian coordinates with shape (n, 3).
+        lat (float): Latitude of the location in degrees.
+        lng (float): Longitude of the location in degrees.
+        radius (float): Great-circle radius in km.
+        tolerance (float, optional): Width in km of the edge band. Defaults to 1e-6.
+
+    Returns:
+        np.array: Boolean mask of the points within the radius.
+    """
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    chords = np.linalg.norm(points - to_cartesian(lat, lng), axis=1)
+    threshold = chord_threshold(radius)
+
+    within = chords <= threshold
+    on_edge = np.abs(chords - threshold) <= tolerance
+
+    if on_edge.any():
+        edge_lats, edge_lngs = to_lat_lng(points[on_edge])
+        within[on_edge] = haversine(lat, lng, edge_lats, edge_lngs) <= radius
+
+    return within
@@ -2,10 +2,12 @@
 
 import numpy as np
 import pandas as pd
-import re
 from scipy import spatial
 
-from asf_core_data.getters.supplementary_data.geospatial import coordinates
+import metrics
+from slash_commands import distance
+from slash_commands.density_grid import DensityGrid
+from slash_commands.postcodes import get_default_resolver
 
 # ================
 
@@ -21,7 +23,7 @@ def to_Cartesian(lat, lng):
         np.array: Converted cartesian coordinates (x,y,z).
     """
 
-    R = 6367  # radius of the Earth in kilometers
+    R = distance.EARTH_RADIUS
 
     x = R * np.cos(lat) * np.cos(lng)
     y = R * np.cos(lat) * np.sin(lng)
@@ -39,7 +41,7 @@ def extract_Cartesian_coords(df):
         coords (numpy.ndarray): Cartesian coordinates.
     """
 
-    coords = df[["LATITUDE", "LONGITUDE"]].to_numpy()
+    coords = df[["LATITUDE", "LONGITUDE"]].to_numpy(dtype=float)
 
     coords = np.deg2rad(coords)
     coords = to_Cartesian(coords[:, 0], coords[:, 1])
@@ -49,6 +51,7 @@ def extract_Cartesian_coords(df):
 
 def create_query(lat, lng):
     """Create a query df with given latitude and longitude.
+    For a single point, distance.to_cartesian() is faster as it needs no dataframe.
 
     Args:
         lat (float): Latitude.
@@ -64,49 +67,41 @@ def create_query(lat, lng):
     return non_hp_coords
 
 
-def get_n_hp_closeby(df, postcode, property_type=None, max_dist=10):
-    """Get the number of closeby heat pumps given the postcode, property type and radius.
+# Heat pump index and postcode lookup of this (worker) process, see init_worker()
+_worker_state = {}
 
-    Args:
-        df (pd.DataFrame): Dataframe including information about heat pumps and postcode.
-        postcode (str): Postcode to search for.
-        property_type (str, optional): Property type to filter by. Defaults to None.
-        max_dist (int, optional): Maximum distance in km to postcode / search radius. Defaults to 10.
+# Property type buckets offered by the heat pump density commands
+PROPERTY_TYPES = [
+    "Flats",
+    "Semi-detached Houses",
+    "Detached Houses",
+    "Terraced Houses",
+    "Any",
+]
 
-    Returns:
-        int: Number of closeby heat pumps given filter and radius.
-    """
+TERRACED_BUILT_FORMS = [
+    "Enclosed Mid-Terrace",
+    "Enclosed End-Terrace",
+    "End-Terrace",
+    "Mid-Terrace",
+]
 
-    postcode = postcode.upper()
-    postcode = re.sub(" ", "", postcode)
-    df = df[~df["LATITUDE"].isna()]
 
-    coord = coordinates.get_postcode_coordinates(data_path="S3")
+def get_property_type_conditions(df):
+    """Get the filter conditions for each property type bucket.
 
-    coord["POSTCODE"] = coord["POSTCODE"].str.replace(" ", "")
-    df["POSTCODE"] = df["POSTCODE"].str.replace(" ", "")
+    Args:
+        df (pd.DataFrame): Dataframe including PROPERTY_TYPE and BUILT_FORM column.
 
-    try:
-        lat, long = (
-            coord.loc[coord["POSTCODE"] == postcode]["LATITUDE"].values[0],
-            coord.loc[coord["POSTCODE"] == postcode]["LONGITUDE"].values[0],
-        )
-    except IndexError:
-        return None
+    Returns:
+        dict: Boolean masks by property type (None is the same as "Any").
+    """
 
-    # Filter conditions
     no_cond = ~df["LATITUDE"].isna()  # will always be true
     flat = df["PROPERTY_TYPE"] == "Flat"
 
-    terraced = [
-        "Enclosed Mid-Terrace",
-        "Enclosed End-Terrace",
-        "End-Terrace",
-        "Mid-Terrace",
-    ]
-
     terraced_house = (df["PROPERTY_TYPE"] == "House") & (
-        df["BUILT_FORM"].isin(terraced)
+        df["BUILT_FORM"].isin(TERRACED_BUILT_FORMS)
     )
 
     detached_house = (df["PROPERTY_TYPE"] == "House") & (df["BUILT_FORM"] == "Detached")
@@ -124,20 +119,613 @@ def get_n_hp_closeby(df, postcode, property_type=None, max_dist=10):
         None: no_cond,
     }
 
-    # Filter by property type
-    conds = cond_dict[property_type]
-    hp_samples = df.loc[df["HP_INSTALLED"] & conds]
+    return cond_dict
+
+
+# Bit for each property type bucket in the PROPERTY_MASK column ("Any" matches all)
+PROPERTY_TYPE_BITS = {
+    "Flats": 1,
+    "Semi-detached Houses": 2,
+    "Detached Houses": 4,
+    "Terraced Houses": 8,
+}
+
+# Name of the property type for each PROPERTY_MASK value
+PROPERTY_TYPE_NAMES = np.array(
+    [
+        next((name for name, bit in PROPERTY_TYPE_BITS.items() if mask & bit), "Other")
+        for mask in range(16)
+    ],
+    dtype=object,
+)
+
+
+def prepare_hp_data(df):
+    """Convert the heat pump data to compact dtypes and precompute property type masks.
+
+    String columns become categoricals, coordinates become float32 and a uint8
+    PROPERTY_MASK column holds one bit per property type bucket, so filtering by
+    property type is a single integer AND instead of string comparisons.
+
+    Args:
+        df (pd.DataFrame): Dataframe including information about heat pumps.
+
+    Returns:
+        pd.DataFrame: Heat pump data with compact dtypes and PROPERTY_MASK column.
+    """
+
+    df = df.copy()
+
+    for column in ["POSTCODE", "PROPERTY_TYPE", "BUILT_FORM"]:
+        df[column] = df[column].astype("category")
+
+    df["HP_INSTALLED"] = df["HP_INSTALLED"].fillna(False).astype(bool)
+    df["LATITUDE"] = df["LATITUDE"].astype(np.float32)
+    df["LONGITUDE"] = df["LONGITUDE"].astype(np.float32)
+
+    cond_dict = get_property_type_conditions(df)
+
+    property_mask = np.zeros(len(df), dtype=np.uint8)
+    for property_type, bit in PROPERTY_TYPE_BITS.items():
+        property_mask[cond_dict[property_type].to_numpy()] |= bit
+
+    df["PROPERTY_MASK"] = property_mask
+
+    return df
+
+
+def get_property_type_filter(df, property_type=None):
+    """Get the filter for a property type from the precomputed PROPERTY_MASK column.
+
+    Args:
+        df (pd.DataFrame): Heat pump data prepared with prepare_hp_data().
+        property_type (str, optional): Property type to filter by. Defaults to None.
+
+    Returns:
+        np.array: Boolean filter.
+    """
+
+    if property_type in [None, "Any"]:
+        return np.ones(len(df), dtype=bool)
+
+    return (df["PROPERTY_MASK"].to_numpy() & PROPERTY_TYPE_BITS[property_type]) != 0
+
+
+class HeatPumpIndex:
+    """Spatial index over all heat pumps, with one KD-tree per property type.
+
+    Building the trees is the expensive part, so the index is meant to be
+    created once at startup and then queried for every request. Optionally, a
+    density grid per property type is built as well, which answers radius
+    queries faster than the trees with the same result.
+
+    Args:
+        df (pd.DataFrame): Dataframe including information about heat pumps,
+            ideally already prepared with prepare_hp_data().
+        grid_cell_size (float, optional): Cell width in km of the density grids.
+            Defaults to None, in which case no grids are built.
+    """
+
+    def __init__(self, df, grid_cell_size=None):
+
+        if "PROPERTY_MASK" not in df.columns:
+            df = prepare_hp_data(df)
+
+        df = df[~df["LATITUDE"].isna()]
+        hp_installed = df["HP_INSTALLED"].to_numpy()
+
+        property_masks = df["PROPERTY_MASK"].to_numpy()
+
+        self.trees = {}
+        self.masks = {}
+        self.grids = {}
+        for property_type in PROPERTY_TYPES:
+            conds = get_property_type_filter(df, property_type)
+            hp_samples = df.loc[hp_installed & conds]
+            hp_coords = extract_Cartesian_coords(hp_samples).reshape(-1, 3)
+            self.trees[property_type] = spatial.KDTree(hp_coords)
+
+            # Property type bits of the heat pumps, in tree order
+            self.masks[property_type] = property_masks[hp_installed & conds]
+
+            if grid_cell_size is not None:
+                self.grids[property_type] = DensityGrid(hp_coords, grid_cell_size)
 
-    # Convert to Cartesian
-    hp_coords = extract_Cartesian_coords(hp_samples)
-    query_coords = create_query(lat, long)
+    def to_arrays(self):
+        """Get the arrays of the index, e.g. to put them in shared memory.
 
-    # Build search trees
-    hp_tree = spatial.KDTree(hp_coords)
-    query_tree = spatial.KDTree(query_coords)
+        Returns:
+            dict: Arrays by name, e.g. "Flats/coords".
+        """
+
+        arrays = {}
+        for property_type, tree in self.trees.items():
+            arrays[f"{property_type}/coords"] = tree.data
+            arrays[f"{property_type}/masks"] = self.masks[property_type]
+
+        for property_type, grid in self.grids.items():
+            for name, array in grid.to_arrays().items():
+                arrays[f"{property_type}/grid/{name}"] = array
+
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Create an index from the arrays of to_arrays().
+
+        The coordinates, masks and grids are used without copying them. The
+        trees are rebuilt on top of the coordinates, which takes a moment but
+        only adds the tree structure itself.
+
+        Args:
+            arrays (dict): Arrays by name.
+
+        Returns:
+            HeatPumpIndex: Heat pump index.
+        """
+
+        hp_index = cls.__new__(cls)
+        hp_index.trees = {}
+        hp_index.masks = {}
+        hp_index.grids = {}
+
+        for property_type in PROPERTY_TYPES:
+            hp_index.trees[property_type] = spatial.KDTree(
+                arrays[f"{property_type}/coords"], copy_data=False
+            )
+            hp_index.masks[property_type] = arrays[f"{property_type}/masks"]
+
+            prefix = f"{property_type}/grid/"
+            grid_arrays = {
+                name[len(prefix) :]: array
+                for name, array in arrays.items()
+                if name.startswith(prefix)
+            }
+            if grid_arrays:
+                hp_index.grids[property_type] = DensityGrid.from_arrays(grid_arrays)
+
+        return hp_index
+
+    def get_tree(self, property_type=None):
+        """Get the search tree for the given property type.
+
+        Args:
+            property_type (str, optional): Property type to filter by. Defaults to None.
+
+        Returns:
+            scipy.spatial.KDTree: Search tree with the matching heat pumps.
+        """
+
+        return self.trees["Any" if property_type is None else property_type]
+
+    def count(self, lat, lng, property_type=None, max_dist=10):
+        """Count the heat pumps within a radius of the given coordinates.
+
+        Args:
+            lat (float): Latitude.
+            lng (float): Longitude.
+            property_type (str, optional): Property type to filter by. Defaults to None.
+            max_dist (int, optional): Great-circle search radius in km. Defaults to 10.
+
+        Returns:
+            int: Number of heat pumps within the radius.
+        """
+
+        query_coords = distance.to_cartesian(lat, lng)
+        threshold = distance.chord_threshold(max_dist)
+
+        if self.grids:
+            grid = self.grids["Any" if property_type is None else property_type]
+            return grid.count(query_coords, threshold)
+
+        return int(
+            self.get_tree(property_type).query_ball_point(
+                query_coords, r=threshold, return_length=True
+            )
+        )
+
+    def count_many(self, lats, lngs, property_type=None, radii=(10,)):
+        """Count the heat pumps within one or more radii of many coordinates at once.
+
+        The tree is queried once per radius, only counting the heat pumps in C.
+        A single query at the largest radius would have to return the index of
+        every heat pump within it, e.g. 31M for 5,000 locations within 25km, which
+        takes about 9 times longer than counting for four radii separately
+        (see benchmarks.benchmark_batch_counts).
+
+        Args:
+            lats (np.array): Latitudes.
+            lngs (np.array): Longitudes.
+            property_type (str, optional): Property type to filter by. Defaults to None.
+            radii (tuple, optional): Great-circle search radii in km. Defaults to (10,).
+
+        Returns:
+            np.array: Number of heat pumps, with one row per location and one column per radius.
+        """
+
+        query_coords = to_Cartesian(
+            np.deg2rad(np.asarray(lats, dtype=float)),
+            np.deg2rad(np.asarray(lngs, dtype=float)),
+        ).reshape(-1, 3)
+        tree = self.get_tree(property_type)
+
+        counts = np.zeros((len(query_coords), len(radii)), dtype=np.int64)
+        for j, radius in enumerate(radii):
+            counts[:, j] = tree.query_ball_point(
+                query_coords,
+                r=distance.chord_threshold(radius),
+                return_length=True,
+                workers=-1,
+            )
+
+        return counts
+
+    def breakdown(self, lat, lng, radii=(1, 5, 10, 25)):
+        """Count the heat pumps within several radii of the given coordinates, by property type.
+
+        All heat pumps within the largest radius are found in one query. Their
+        distances are sorted once, so the count within each radius is a prefix
+        of the sorted heat pumps, split by their property type bits.
+
+        Args:
+            lat (float): Latitude.
+            lng (float): Longitude.
+            radii (tuple, optional): Great-circle search radii in km. Defaults to (1, 5, 10, 25).
+
+        Returns:
+            np.array: Number of heat pumps, with one row per property type
+                (in the order of PROPERTY_TYPES) and one column per radius.
+        """
+
+        query_coords = distance.to_cartesian(lat, lng)
+        thresholds = distance.chord_threshold(np.asarray(radii, dtype=float))
+        tree = self.get_tree("Any")
+
+        neighbours = np.asarray(
+            tree.query_ball_point(query_coords, r=thresholds.max()), dtype=np.intp
+        )
+        chords = np.linalg.norm(tree.data[neighbours] - query_coords, axis=1)
+        order = np.argsort(chords)
+        n_within = np.searchsorted(chords[order], thresholds, side="right")
+
+        bits = np.array(
+            [PROPERTY_TYPE_BITS.get(property_type, 0) for property_type in PROPERTY_TYPES],
+            dtype=np.uint8,
+        )
+        masks = self.masks["Any"][neighbours[order]]
+        is_type = (masks[:, None] & bits) != 0
+        is_type[:, bits == 0] = True
+
+        # Cumulative counts per property type, with a leading zero for empty radii
+        cumulative = np.vstack(
+            [np.zeros(len(bits), dtype=np.int64), np.cumsum(is_type, axis=0)]
+        )
+
+        return cumulative[n_within].T
+
+    def nearest(self, lat, lng, k=10, property_type=None):
+        """Find the heat pumps closest to the given coordinates.
+
+        Args:
+            lat (float): Latitude.
+            lng (float): Longitude.
+            k (int, optional): Number of heat pumps to find. Defaults to 10.
+            property_type (str, optional): Property type to filter by. Defaults to None.
+
+        Returns:
+            tuple: Great-circle distances in km (ascending) and property type bits
+                of the closest heat pumps. Fewer than k if there aren't enough heat pumps.
+        """
+
+        property_type = "Any" if property_type is None else property_type
+        tree = self.get_tree(property_type)
+
+        chords, ids = tree.query(distance.to_cartesian(lat, lng), k=k)
+        chords, ids = np.atleast_1d(chords), np.atleast_1d(ids)
+        found = ids < tree.n
+
+        return (
+            distance.chord_to_great_circle(chords[found]),
+            self.masks[property_type][ids[found]],
+        )
+
+    def nearest_many(self, lats, lngs, k=10, property_type=None):
+        """Find the heat pumps closest to many coordinates at once.
+
+        Args:
+            lats (np.array): Latitudes.
+            lngs (np.array): Longitudes.
+            k (int, optional): Number of heat pumps to find per location. Defaults to 10.
+            property_type (str, optional): Property type to filter by. Defaults to None.
+
+        Returns:
+            tuple: Great-circle distances in km and property type bits, both with one row
+                per location and k columns. Missing heat pumps have distance inf.
+        """
+
+        property_type = "Any" if property_type is None else property_type
+        tree = self.get_tree(property_type)
+
+        query_coords = to_Cartesian(
+            np.deg2rad(np.asarray(lats, dtype=float)),
+            np.deg2rad(np.asarray(lngs, dtype=float)),
+        ).reshape(-1, 3)
+
+        chords, ids = tree.query(query_coords, k=k, workers=-1)
+        chords, ids = chords.reshape(len(query_coords), k), ids.reshape(len(query_coords), k)
+
+        # Masks are padded with 0 for missing heat pumps, whose ids equal tree.n
+        masks = np.append(self.masks[property_type], np.uint8(0))
+
+        return distance.chord_to_great_circle(chords), masks[ids]
+
+
+@metrics.profiler.profile
+def get_n_hp_closeby(
+    hp_index, postcode, property_type=None, max_dist=10, postcode_resolver=None
+):
+    """Get the number of closeby heat pumps given the postcode, property type and radius.
+
+    Args:
+        hp_index (HeatPumpIndex or pd.DataFrame): Prebuilt heat pump index. A dataframe
+            including information about heat pumps is also accepted, but then the index
+            is rebuilt on every call.
+        postcode (str): Postcode to search for.
+        property_type (str, optional): Property type to filter by. Defaults to None.
+        max_dist (int, optional): Maximum distance in km to postcode / search radius. Defaults to 10.
+        postcode_resolver (postcodes.PostcodeResolver, optional): Postcode lookup.
+            Defaults to None, in which case the shared resolver is used.
+
+    Returns:
+        int: Number of closeby heat pumps given filter and radius.
+    """
 
-    # Extract matches
-    match_indices = hp_tree.query_ball_tree(query_tree, r=max_dist)
+    if isinstance(hp_index, pd.DataFrame):
+        hp_index = HeatPumpIndex(hp_index)
 
-    # Count matches
-    return np.array([[len(x) for x in match_indices if len(x) > 0]])[0].sum()
+    if postcode_resolver is None:
+        postcode_resolver = get_default_resolver()
+
+    with metrics.span("closeby_step_seconds", step="postcode_lookup"):
+        coords = postcode_resolver.get_coordinates(postcode)
+
+    if coords is None:
+        return None
+
+    lat, long = coords
+
+    with metrics.span("closeby_step_seconds", step="index_query"):
+        return hp_index.count(
+            lat, long, property_type=property_type, max_dist=max_dist
+        )
+
+
+def get_n_hp_closeby_many(
+    hp_index, postcodes, property_type=None, radii=(10,), postcode_resolver=None
+):
+    """Get the number of closeby heat pumps for many postcodes and radii at once.
+
+    Args:
+        hp_index (HeatPumpIndex): Prebuilt heat pump index.
+        postcodes (list or pd.Series): Postcodes to search for.
+        property_type (str, optional): Property type to filter by. Defaults to None.
+        radii (tuple, optional): Search radii in km. Defaults to (10,).
+        postcode_resolver (postcodes.PostcodeResolver, optional): Postcode lookup.
+            Defaults to None, in which case the shared resolver is used.
+
+    Returns:
+        pd.DataFrame: One row per postcode with its coordinates and a column
+            n_hp_within_<radius>km per radius (missing for unknown postcodes).
+    """
+
+    if postcode_resolver is None:
+        postcode_resolver = get_default_resolver()
+
+    result = postcode_resolver.get_coordinates_many(postcodes)
+    found = result["LATITUDE"].notna().to_numpy()
+
+    counts = hp_index.count_many(
+        result.loc[found, "LATITUDE"],
+        result.loc[found, "LONGITUDE"],
+        property_type=property_type,
+        radii=radii,
+    )
+
+    for j, radius in enumerate(radii):
+        column = pd.array(np.full(len(result), pd.NA), dtype="Int64")
+        column[found] = counts[:, j]
+        result[f"n_hp_within_{radius}km"] = column
+
+    return result
+
+
+def get_nearest_hps(
+    hp_index, postcode, k=10, property_type=None, postcode_resolver=None
+):
+    """Get the distances and property types of the heat pumps closest to a postcode.
+
+    Args:
+        hp_index (HeatPumpIndex): Prebuilt heat pump index.
+        postcode (str): Postcode to search for.
+        k (int, optional): Number of heat pumps to find. Defaults to 10.
+        property_type (str, optional): Property type to filter by. Defaults to None.
+        postcode_resolver (postcodes.PostcodeResolver, optional): Postcode lookup.
+            Defaults to None, in which case the shared resolver is used.
+
+    Returns:
+        pd.DataFrame: One row per heat pump, closest first, with DISTANCE_KM and
+            PROPERTY_TYPE columns, or None if the postcode is unknown.
+    """
+
+    if postcode_resolver is None:
+        postcode_resolver = get_default_resolver()
+
+    with metrics.span("closeby_step_seconds", step="postcode_lookup"):
+        coords = postcode_resolver.get_coordinates(postcode)
+
+    if coords is None:
+        return None
+
+    lat, long = coords
+
+    with metrics.span("closeby_step_seconds", step="nearest"):
+        distances, masks = hp_index.nearest(lat, long, k=k, property_type=property_type)
+
+    return pd.DataFrame(
+        {"DISTANCE_KM": distances, "PROPERTY_TYPE": PROPERTY_TYPE_NAMES[masks]},
+        index=pd.RangeIndex(1, len(distances) + 1, name="RANK"),
+    )
+
+
+def get_nearest_hps_many(
+    hp_index, postcodes, k=10, property_type=None, postcode_resolver=None
+):
+    """Get the distances and property types of the heat pumps closest to many postcodes.
+
+    Args:
+        hp_index (HeatPumpIndex): Prebuilt heat pump index.
+        postcodes (list or pd.Series): Postcodes to search for.
+        k (int, optional): Number of heat pumps to find per postcode. Defaults to 10.
+        property_type (str, optional): Property type to filter by. Defaults to None.
+        postcode_resolver (postcodes.PostcodeResolver, optional): Postcode lookup.
+            Defaults to None, in which case the shared resolver is used.
+
+    Returns:
+        pd.DataFrame: One row per postcode and heat pump, with POSTCODE, RANK,
+            DISTANCE_KM and PROPERTY_TYPE columns. Unknown postcodes have no rows.
+    """
+
+    if postcode_resolver is None:
+        postcode_resolver = get_default_resolver()
+
+    coords = postcode_resolver.get_coordinates_many(postcodes)
+    coords = coords[coords["LATITUDE"].notna()]
+
+    distances, masks = hp_index.nearest_many(
+        coords["LATITUDE"], coords["LONGITUDE"], k=k, property_type=property_type
+    )
+    found = np.isfinite(distances).ravel()
+
+    return pd.DataFrame(
+        {
+            "POSTCODE": np.repeat(coords["POSTCODE"].to_numpy(), k)[found],
+            "RANK": np.tile(np.arange(1, k + 1), len(coords))[found],
+            "DISTANCE_KM": distances.ravel()[found],
+            "PROPERTY_TYPE": PROPERTY_TYPE_NAMES[masks.ravel()[found]],
+        }
+    )
+
+
+def get_hp_breakdown(hp_index, postcode, radii=(1, 5, 10, 25), postcode_resolver=None):
+    """Get the number of closeby heat pumps by property type and radius for a postcode.
+
+    Args:
+        hp_index (HeatPumpIndex): Prebuilt heat pump index.
+        postcode (str): Postcode to search for.
+        radii (tuple, optional): Search radii in km. Defaults to (1, 5, 10, 25).
+        postcode_resolver (postcodes.PostcodeResolver, optional): Postcode lookup.
+            Defaults to None, in which case the shared resolver is used.
+
+    Returns:
+        pd.DataFrame: Number of heat pumps with one row per property type and one
+            column per radius, or None if the postcode is unknown.
+    """
+
+    if postcode_resolver is None:
+        postcode_resolver = get_default_resolver()
+
+    with metrics.span("closeby_step_seconds", step="postcode_lookup"):
+        coords = postcode_resolver.get_coordinates(postcode)
+
+    if coords is None:
+        return None
+
+    lat, long = coords
+
+    with metrics.span("closeby_step_seconds", step="breakdown"):
+        counts = hp_index.breakdown(lat, long, radii=radii)
+
+    return pd.DataFrame(
+        counts, index=PROPERTY_TYPES, columns=[f"{radius}km" for radius in radii]
+    )
+
+
+def init_worker(hp_index, postcode_resolver):
+    """Set the heat pump index and postcode lookup used by get_n_hp_closeby_in_worker().
+    Used to initialise the worker processes of the bot, and to swap in a new index
+    after the heat pump data has changed.
+
+    Both are replaced in one assignment, so a query uses either the old or the
+    new snapshot. Queries that are already running finish on the old one, which
+    is freed once they are done.
+
+    Args:
+        hp_index (HeatPumpIndex): Prebuilt heat pump index.
+        postcode_resolver (postcodes.PostcodeResolver): Postcode lookup.
+    """
+
+    _worker_state["snapshot"] = (hp_index, postcode_resolver)
+
+
+def get_n_hp_closeby_in_worker(postcode, property_type=None, max_dist=10):
+    """Get the number of closeby heat pumps using the index set up by init_worker().
+
+    Args:
+        postcode (str): Postcode to search for.
+        property_type (str, optional): Property type to filter by. Defaults to None.
+        max_dist (int, optional): Search radius in km. Defaults to 10.
+
+    Returns:
+        int: Number of closeby heat pumps given filter and radius.
+    """
+
+    hp_index, postcode_resolver = _worker_state["snapshot"]
+
+    return get_n_hp_closeby(
+        hp_index,
+        postcode,
+        property_type=property_type,
+        max_dist=max_dist,
+        postcode_resolver=postcode_resolver,
+    )
+
+
+def get_hp_breakdown_in_worker(postcode, radii=(1, 5, 10, 25)):
+    """Get the heat pump breakdown for a postcode using the index set up by init_worker().
+
+    Args:
+        postcode (str): Postcode to search for.
+        radii (tuple, optional): Search radii in km. Defaults to (1, 5, 10, 25).
+
+    Returns:
+        pd.DataFrame: Number of heat pumps by property type and radius, or None.
+    """
+
+    hp_index, postcode_resolver = _worker_state["snapshot"]
+
+    return get_hp_breakdown(
+        hp_index, postcode, radii=radii, postcode_resolver=postcode_resolver
+    )
+
+
+def get_nearest_hps_in_worker(postcode, k=10, property_type=None):
+    """Get the heat pumps closest to a postcode using the index set up by init_worker().
+
+    Args:
+        postcode (str): Postcode to search for.
+        k (int, optional): Number of heat pumps to find. Defaults to 10.
+        property_type (str, optional): Property type to filter by. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Distances and property types of the closest heat pumps, or None.
+    """
+
+    hp_index, postcode_resolver = _worker_state["snapshot"]
+
+    return get_nearest_hps(
+        hp_index,
+        postcode,
+        k=k,
+        property_type=property_type,
+        postcode_resolver=postcode_resolver,
+    )
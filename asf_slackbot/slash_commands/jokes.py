@@ -1,30 +1,284 @@
 # ==== IMPORTS ====
 
-import requests
+import asyncio
+import json
+import logging
+import re
+import threading
 from random import choice
 
+import aiohttp
+import requests
+
+import metrics
+import slash_commands.settings as settings
+from cache import TTLCache, MISSING
+
 # ================
 
-def get_a_joke(term):
+logger = logging.getLogger(__name__)
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_terms(text):
+    """Split a text into lower case words.
+
+    Args:
+        text (str): Text, e.g. a joke or a search term.
+
+    Returns:
+        list: Words.
+    """
+
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+class JokeStore:
+    """Jokes kept in memory, so that repeated topics don't need the joke API.
+
+    Search results are cached per term. All jokes seen so far, plus those of an
+    optional offline corpus, are indexed by the words they contain, which is
+    used to answer when the joke API is slow or unreachable.
+
+    Args:
+        maxsize (int, optional): Maximum number of cached terms.
+            Defaults to settings.joke_cache_maxsize.
+        ttl (float, optional): Seconds after which a term is searched again.
+            Defaults to settings.joke_cache_ttl.
+    """
+
+    def __init__(
+        self, maxsize=settings.joke_cache_maxsize, ttl=settings.joke_cache_ttl
+    ):
+
+        self.results = TTLCache(maxsize, ttl)
+        self.jokes = {}
+        self.index = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.jokes)
+
+    @classmethod
+    def from_corpus(cls, path, **kwargs):
+        """Create a joke store with an offline corpus.
+
+        Args:
+            path (pathlib.Path): JSON file with a list of jokes as returned by the
+                joke API, i.e. dicts with "id" and "joke".
+            **kwargs: Passed on to JokeStore.
+
+        Returns:
+            JokeStore: Joke store.
+        """
+
+        store = cls(**kwargs)
+
+        with open(path) as f:
+            store.add_jokes(json.load(f))
+
+        return store
+
+    def add_jokes(self, results):
+        """Add jokes to the index.
+
+        Args:
+            results (list): Jokes as returned by the joke API, i.e. dicts with "id" and "joke".
+        """
+
+        with self._lock:
+            for result in results:
+                if result["id"] in self.jokes:
+                    continue
+
+                self.jokes[result["id"]] = result["joke"]
+                for term in set(get_terms(result["joke"])):
+                    self.index.setdefault(term, set()).add(result["id"])
+
+    def add_results(self, term, results):
+        """Cache the search results for a term and add the jokes to the index.
+
+        Args:
+            term (str): Search term.
+            results (list): Jokes as returned by the joke API.
+        """
+
+        self.results.set(term.lower(), [result["joke"] for result in results])
+        self.add_jokes(results)
+
+    def get_cached(self, term):
+        """Get the cached search results for a term.
+
+        Args:
+            term (str): Search term.
+
+        Returns:
+            list: Jokes, or MISSING if the term hasn't been searched recently.
+        """
+
+        return self.results.get(term.lower())
+
+    def search(self, term):
+        """Search the indexed jokes for all words of a term.
+
+        Args:
+            term (str): Search term.
+
+        Returns:
+            list: Jokes containing all words of the term.
+        """
+
+        with self._lock:
+            postings = [self.index.get(word, set()) for word in get_terms(term)]
+            ids = set.intersection(*postings) if postings else set(self.jokes)
+
+            return [self.jokes[id] for id in sorted(ids)]
+
+
+def get_default_store():
+    """Get the shared joke store, loading the offline corpus on first use if there is one.
+
+    Returns:
+        JokeStore: Joke store.
+    """
+
+    global _default_store
+
+    with _default_store_lock:
+        if _default_store is None:
+            path = settings.joke_corpus_path
+
+            if path is not None and path.exists():
+                _default_store = JokeStore.from_corpus(path)
+            else:
+                _default_store = JokeStore()
+
+    return _default_store
+
+
+def get_a_joke(term, store=None):
     """Get a dad joke.
 
     Args:
         term (str): Joke will contain this term.
+        store (JokeStore, optional): Jokes kept in memory. Defaults to get_default_store().
+
+    Returns:
+        joke (str): Joke including given term.
+    """
+
+    store = get_default_store() if store is None else store
+    jokes = store.get_cached(term)
+
+    if jokes is MISSING:
+        try:
+            with metrics.span("joke_fetch_seconds"):
+                response = requests.get(
+                    settings.joke_api_url,
+                    headers={"Accept": "application/json"},
+                    params={"term": term},
+                    timeout=settings.joke_api_timeout,
+                )
+                response.raise_for_status()
+                results = response.json()["results"]
+
+        except (requests.RequestException, ValueError, KeyError, TypeError):
+            logger.warning("Joke API unavailable, searching jokes offline for %r", term)
+            jokes = store.search(term)
+
+        else:
+            store.add_results(term, results)
+            return choose_joke(results)
+
+    return choice(jokes) if jokes else None
+
+
+async def get_a_joke_async(term, session, store=None):
+    """Get a dad joke without blocking the event loop.
+
+    Args:
+        term (str): Joke will contain this term.
+        session (aiohttp.ClientSession): Shared HTTP session.
+        store (JokeStore, optional): Jokes kept in memory. Defaults to get_default_store().
 
     Returns:
         joke (str): Joke including given term.
     """
 
-    response_json = requests.get(
-        "https://icanhazdadjoke.com/search",
-        headers={"Accept": "application/json"},
-        params={"term": term},
-    ).json()
+    store = get_default_store() if store is None else store
+    jokes = store.get_cached(term)
 
-    results = response_json["results"]
-    total_jokes = response_json["total_jokes"]
+    if jokes is MISSING:
+        try:
+            with metrics.span("joke_fetch_seconds"):
+                async with session.get(
+                    settings.joke_api_url,
+                    headers={"Accept": "application/json"},
+                    params={"term": term},
+                    timeout=aiohttp.ClientTimeout(total=settings.joke_api_timeout),
+                ) as response:
+                    response.raise_for_status()
+                    results = (await response.json())["results"]
 
-    if total_jokes >= 1:
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError):
+            logger.warning("Joke API unavailable, searching jokes offline for %r", term)
+            jokes = store.search(term)
+
+        else:
+            store.add_results(term, results)
+            return choose_joke(results)
+
+    return choice(jokes) if jokes else None
+
+
+def choose_joke(results):
+    """Choose a random joke from the results of a joke search.
+
+    Args:
+        results (list): Jokes as returned by the icanhazdadjoke search.
+
+    Returns:
+        joke (str): Random joke, or None if there are no results.
+    """
+
+    if len(results) >= 1:
         return choice(results)["joke"]
     else:
         return None
+
+
+def download_corpus(path=settings.joke_corpus_path, page_size=30):
+    """Download all jokes from the joke API for offline use.
+
+    Args:
+        path (pathlib.Path, optional): JSON file to write. Defaults to settings.joke_corpus_path.
+        page_size (int, optional): Jokes per request. Defaults to 30, the API maximum.
+    """
+
+    results = []
+    page = 1
+
+    while True:
+        response_json = requests.get(
+            settings.joke_api_url,
+            headers={"Accept": "application/json"},
+            params={"page": page, "limit": page_size},
+            timeout=settings.joke_api_timeout,
+        ).json()
+        results += response_json["results"]
+
+        if page >= response_json["total_pages"]:
+            break
+        page += 1
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump([{"id": r["id"], "joke": r["joke"]} for r in results], f)
+
+    print(f"Saved {len(results)} jokes to {path}")
+
+
+if __name__ == "__main__":
+    download_corpus()
@@ -0,0 +1,229 @@
+# ==== IMPORTS ====
+
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from asf_core_data.getters.supplementary_data.geospatial import coordinates
+
+# ================
+
+_default_resolver = None
+_default_resolver_lock = threading.Lock()
+
+
+def normalise_postcode(postcode):
+    """Normalise a postcode by removing whitespace and making it upper case.
+
+    Args:
+        postcode (str): Postcode, e.g. "ec1a 1bb".
+
+    Returns:
+        str: Normalised postcode, e.g. "EC1A1BB".
+    """
+
+    return re.sub(r"\s", "", postcode).upper()
+
+
+class PostcodeResolver:
+    """In-memory lookup from postcode to latitude and longitude.
+
+    Postcodes are normalised once when the table is loaded and mapped to a row
+    in compact float32 coordinate arrays by a pandas index, so each lookup is a
+    single hash table access.
+
+    Args:
+        coord_df (pd.DataFrame): Dataframe including POSTCODE, LATITUDE and LONGITUDE column.
+    """
+
+    def __init__(self, coord_df):
+
+        postcodes = coord_df["POSTCODE"].str.replace(r"\s", "", regex=True).str.upper()
+
+        # Keep the first entry for duplicated postcodes
+        is_first = ~postcodes.duplicated().to_numpy()
+
+        self.latitudes = coord_df["LATITUDE"].to_numpy(dtype=np.float32)[is_first]
+        self.longitudes = coord_df["LONGITUDE"].to_numpy(dtype=np.float32)[is_first]
+        self.postcodes = pd.Index(postcodes.to_numpy()[is_first])
+
+    @classmethod
+    def from_s3(cls):
+        """Load the UK postcode coordinates from S3 and build the resolver.
+
+        Returns:
+            PostcodeResolver: Postcode resolver.
+        """
+
+        return cls(coordinates.get_postcode_coordinates(data_path="S3"))
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    def get_coordinates(self, postcode):
+        """Get latitude and longitude for a postcode.
+
+        Args:
+            postcode (str): Postcode, in any case and with or without spaces.
+
+        Returns:
+            tuple: Latitude and longitude, or None if the postcode is unknown.
+        """
+
+        try:
+            i = self.postcodes.get_loc(normalise_postcode(postcode))
+        except KeyError:
+            return None
+
+        return float(self.latitudes[i]), float(self.longitudes[i])
+
+    def get_coordinates_many(self, postcodes):
+        """Get latitudes and longitudes for many postcodes in one vectorised lookup.
+
+        Args:
+            postcodes (list or pd.Series): Postcodes, in any case and with or without spaces.
+
+        Returns:
+            pd.DataFrame: POSTCODE, LATITUDE and LONGITUDE column, with missing
+                coordinates for unknown postcodes.
+        """
+
+        postcodes = pd.Series(postcodes, dtype=object).reset_index(drop=True)
+        normalised = postcodes.str.replace(r"\s", "", regex=True).str.upper()
+
+        rows = self.postcodes.get_indexer(normalised)
+        found = rows >= 0
+
+        latitudes = np.full(len(rows), np.nan, dtype=np.float32)
+        longitudes = np.full(len(rows), np.nan, dtype=np.float32)
+        latitudes[found] = self.latitudes[rows[found]]
+        longitudes[found] = self.longitudes[rows[found]]
+
+        return pd.DataFrame(
+            {"POSTCODE": postcodes, "LATITUDE": latitudes, "LONGITUDE": longitudes}
+        )
+
+
+class SortedPostcodeResolver(PostcodeResolver):
+    """Postcode lookup that only consists of arrays, so it can live in shared memory.
+
+    Postcodes are kept sorted as fixed-width bytes and found by binary search,
+    instead of in a dict that every process would need its own copy of.
+
+    Args:
+        postcodes (np.array): Sorted normalised postcodes as bytes, e.g. b"EC1A1BB".
+        latitudes (np.array): Latitude of each postcode.
+        longitudes (np.array): Longitude of each postcode.
+    """
+
+    def __init__(self, postcodes, latitudes, longitudes):
+
+        self.postcodes = postcodes
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+
+    @classmethod
+    def from_resolver(cls, resolver):
+        """Create a sorted postcode lookup from a postcode resolver.
+
+        Args:
+            resolver (PostcodeResolver): Postcode resolver.
+
+        Returns:
+            SortedPostcodeResolver: Postcode lookup.
+        """
+
+        postcodes = np.array(resolver.postcodes, dtype=bytes)
+        order = np.argsort(postcodes)
+
+        return cls(
+            postcodes[order], resolver.latitudes[order], resolver.longitudes[order]
+        )
+
+    def to_arrays(self):
+        """Get the arrays of the lookup, e.g. to put them in shared memory.
+
+        Returns:
+            dict: Arrays by name.
+        """
+
+        return {
+            "postcodes": self.postcodes,
+            "latitudes": self.latitudes,
+            "longitudes": self.longitudes,
+        }
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    def _find(self, postcodes):
+        # Rows of normalised postcodes, or -1 for unknown ones
+        keys = np.array(postcodes, dtype=bytes)
+        rows = np.searchsorted(self.postcodes, keys)
+        rows[rows == len(self.postcodes)] = 0
+
+        found = self.postcodes[rows] == keys
+        found &= np.char.str_len(keys) <= self.postcodes.itemsize
+
+        return np.where(found, rows, -1)
+
+    def get_coordinates(self, postcode):
+        """Get latitude and longitude for a postcode.
+
+        Args:
+            postcode (str): Postcode, in any case and with or without spaces.
+
+        Returns:
+            tuple: Latitude and longitude, or None if the postcode is unknown.
+        """
+
+        i = self._find([normalise_postcode(postcode).encode(errors="replace")])[0]
+
+        if i < 0:
+            return None
+
+        return float(self.latitudes[i]), float(self.longitudes[i])
+
+    def get_coordinates_many(self, postcodes):
+        """Get latitude and longitude for many postcodes at once.
+
+        Args:
+            postcodes (list or pd.Series): Postcodes, in any case and with or without spaces.
+
+        Returns:
+            pd.DataFrame: POSTCODE, LATITUDE and LONGITUDE column, with missing
+                coordinates for unknown postcodes.
+        """
+
+        postcodes = pd.Series(postcodes, dtype=object).reset_index(drop=True)
+        normalised = postcodes.str.replace(r"\s", "", regex=True).str.upper()
+
+        rows = self._find(normalised.str.encode("ascii", errors="replace").to_numpy())
+        found = rows >= 0
+
+        latitudes = np.full(len(rows), np.nan, dtype=np.float32)
+        longitudes = np.full(len(rows), np.nan, dtype=np.float32)
+        latitudes[found] = self.latitudes[rows[found]]
+        longitudes[found] = self.longitudes[rows[found]]
+
+        return pd.DataFrame(
+            {"POSTCODE": postcodes, "LATITUDE": latitudes, "LONGITUDE": longitudes}
+        )
+
+
+def get_default_resolver():
+    """Get the shared postcode resolver, loading it from S3 on first use.
+
+    Returns:
+        PostcodeResolver: Postcode resolver.
+    """
+
+    global _default_resolver
+
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = PostcodeResolver.from_s3()
+
+    return _default_resolver
@@ -8,6 +8,13 @@ asana_reminder_text = f"Hello! :wave:\nThis a gentle reminder to complete your p
 
 asana_preview_text = "Hello! This is a gentle reminder to complete your project status update on Asana..."
 
+# Rate limit for scheduling reminders (chat.scheduleMessage, Slack tier 3: about
+# 50 calls per minute). Up to schedule_burst reminders are scheduled at once and
+# the rest at the steady rate, e.g. 100 users take about a minute. A burst above
+# the per-minute rate would be faster but go over the limit and get 429 retries.
+schedule_rate_per_minute = 50
+schedule_burst = 50
+
 asana_reminder_day = "Thursday"
 asana_reminder_time = "11:00"
 
@@ -25,9 +32,61 @@ default_members = ["U0155LT0YJF",   # Davinia
                    "U04UW4AEB7X"    # Sarah Davies 
 ]
 
+# Display names of users are kept in memory and refreshed regularly
+user_directory_maxsize = 5000
+user_directory_ttl = 24 * 60 * 60
+user_directory_refresh_interval = 60 * 60
+
+# State of open pop-up windows is forgotten if they aren't submitted in time
+pending_interactions_maxsize = 1000
+pending_interactions_ttl = 60 * 60
+
+# Latency metrics: served at http://localhost:{metrics_port}/metrics if set, and
+# summarised in the log every metrics_log_interval seconds. Set profile_sample_every
+# to e.g. 100 to profile one in 100 heat pump density queries with cProfile.
+metrics_port = None
+metrics_log_interval = 15 * 60
+profile_sample_every = 0
+
+joke_api_url = "https://icanhazdadjoke.com/search"
 joke_default_topic = "work"
+
+# Joke search results are kept in memory; the offline corpus (created with
+# `python -m slash_commands.jokes`) is used when the joke API is unavailable
+joke_api_timeout = 2
+joke_cache_maxsize = 500
+joke_cache_ttl = 6 * 60 * 60
+joke_corpus_path = Path('.cache/jokes.json')
 fun_emoji = " :rolling_on_the_floor_laughing:"
+joke_unavailable_text = "Sorry, I can't think of any jokes right now."
+
+slack_api_url = "https://www.slack.com/api/"
 
+hp_data_bucket = "asf-exploration"
 hp_data_file = Path('asf_slackbot/epc_mcs_hp_only.csv')
 hp_data_columns = ['POSTCODE','BUILT_FORM', 'PROPERTY_TYPE',
-       'HP_INSTALLED', 'LATITUDE','LONGITUDE']
\ No newline at end of file
+       'HP_INSTALLED', 'LATITUDE','LONGITUDE']
+
+# Local copy of the heat pump data, reused across restarts
+hp_data_cache_dir = Path('.cache/hp_data')
+# Seconds between checks for a new heat pump data file on S3
+hp_data_refresh_interval = 60 * 60
+
+# Cell width in km of the precomputed heat pump density grids, e.g. 1.
+# Grids answer large radius queries in constant time, but the KD-trees
+# are already faster for small radii, so they are off by default.
+hp_density_grid_cell_size = None
+
+# Radii in km of the /closeby-hps-breakdown table
+breakdown_radii = (1, 5, 10, 25)
+
+# Number of heat pumps found by /nearest-hps, by default and at most
+nearest_default_k = 10
+nearest_max_k = 1000
+
+# Worker pools for the work of handlers. CPU workers are processes for the
+# heat pump density queries (0 to run them on the I/O threads).
+io_workers = 8
+cpu_workers = 0
+max_queued_tasks = 32
+busy_text = "Sorry, I'm a bit overwhelmed right now. :sweat_smile: Please try again in a minute."
@@ -4,10 +4,89 @@ import slash_commands.settings as settings
 
 # ================
 
-closeby_hp_view = {
+# Views are built once. Each request gets a new top-level dict, with new
+# copies of the blocks holding per-request values, while the other blocks
+# are shared between requests and read-only.
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Prebuilt views are shared between requests and can't be changed")
+
+
+class FrozenDict(dict):
+    """Dict that can't be changed, for the parts of views shared between requests."""
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class FrozenList(list):
+    """List that can't be changed, for the parts of views shared between requests."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+
+def freeze(value):
+    """Make a view, or any part of it, read-only.
+
+    Args:
+        value: View, or a value in it.
+
+    Returns:
+        Read-only copy of the value.
+    """
+
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+
+    return value
+
+
+def get_block_index(view, block_id):
+    """Get the position of a block in a view.
+
+    Args:
+        view (dict): View.
+        block_id (str): Block identifier.
+
+    Returns:
+        int: Index of the block in view["blocks"].
+    """
+
+    return [block.get("block_id") for block in view["blocks"]].index(block_id)
+
+
+def with_element_values(view, element_values, **view_values):
+    """Copy a view with new values for some block elements and top-level fields.
+
+    Only the top-level dict, the blocks list and the changed blocks are copied,
+    the rest is shared with the prebuilt view.
+
+    Args:
+        view (dict): Prebuilt view.
+        element_values (dict): Values by element field, by block index.
+        **view_values: Values of top-level fields of the view.
+
+    Returns:
+        dict: Full view for pop-up window.
+    """
+
+    blocks = list(view["blocks"])
+    for index, values in element_values.items():
+        block = blocks[index]
+        blocks[index] = {**block, "element": {**block["element"], **values}}
+
+    return {**view, **view_values, "blocks": blocks}
+
+
+closeby_hp_view = freeze({
             "type": "modal",
             # View identifier
             "callback_id": "closeby-window",
+            "private_metadata": "",
             "title": {"type": "plain_text", "text": "Heat pump density"},
             "submit": {"type": "plain_text", "text": "Submit"},
             "blocks": [
@@ -99,22 +178,13 @@ closeby_hp_view = {
                     },
                 },
             ],
-        }
-
-def prepare_reminder_view(date):
-    """Prepare the reminder view for the pop-up window.
+        })
 
-    Args:
-        date (datetime.date or str): Default date, usually next Thursday.
-
-    Returns:
-        str: Full view for pop-up window.
-    """
-
-    reminder_view =   {
+reminder_view = freeze({
             "type": "modal",
             # View identifier
             "callback_id": "send_reminder",
+            "private_metadata": "",
             "title": {"type": "plain_text", "text": "Project Status Reminder"},
             "submit": {"type": "plain_text", "text": "Submit"},
             "blocks": [
@@ -172,7 +242,7 @@ def prepare_reminder_view(date):
                     "block_id": "date_sel",
                     "element": {
                         "type": "datepicker",
-                        "initial_date": str(date),
+                        "initial_date": "",
                         "placeholder": {
                             "type": "plain_text",
                             "text": "Select a date",
@@ -206,22 +276,9 @@ def prepare_reminder_view(date):
                     },
                 },
             ],
-        }
-
-    return reminder_view
+        })
 
-
-def prepare_britishfy_view(today):
-    """Prepare the britishfy view for the pop-up window.
-
-    Args:
-        today (datetime.date or str): Today's date.
-
-    Returns:
-        str: Full view for pop-up window.
-    """
-
-    britishfy_view={
+britishfy_view = freeze({
             "type": "modal",
             # View identifier
             "callback_id": "britishfy_view",
@@ -269,7 +326,7 @@ def prepare_britishfy_view(today):
                     "block_id": "date",
                     "element": {
                         "type": "datepicker",
-                        "initial_date": str(today),
+                        "initial_date": "",
                         "placeholder": {
                             "type": "plain_text",
                             "text": "Select a date",
@@ -294,7 +351,58 @@ def prepare_britishfy_view(today):
                     },
                 },
             ],
-        }
+        })
+
+
+reminder_users_block = get_block_index(reminder_view, "user_sel")
+reminder_date_block = get_block_index(reminder_view, "date_sel")
+britishfy_date_block = get_block_index(britishfy_view, "date")
+
+
+def get_closeby_hp_view(metadata=""):
+    """Prepare the heat pump density view for the pop-up window.
+
+    Args:
+        metadata (str, optional): Private metadata, returned with the submission. Defaults to "".
+
+    Returns:
+        dict: Full view for pop-up window.
+    """
+
+    return {**closeby_hp_view, "private_metadata": metadata}
+
+
+def prepare_reminder_view(date, metadata=""):
+    """Prepare the reminder view for the pop-up window.
+
+    Args:
+        date (datetime.date or str): Default date, usually next Thursday.
+        metadata (str, optional): Private metadata, returned with the submission. Defaults to "".
+
+    Returns:
+        dict: Full view for pop-up window.
+    """
 
+    return with_element_values(
+        reminder_view,
+        {
+            reminder_users_block: {"initial_users": list(settings.default_members)},
+            reminder_date_block: {"initial_date": str(date)},
+        },
+        private_metadata=metadata,
+    )
+
+
+def prepare_britishfy_view(today):
+    """Prepare the britishfy view for the pop-up window.
+
+    Args:
+        today (datetime.date or str): Today's date.
+
+    Returns:
+        dict: Full view for pop-up window.
+    """
 
-    return britishfy_view
\ No newline at end of file
+    return with_element_values(
+        britishfy_view, {britishfy_date_block: {"initial_date": str(today)}}
+    )
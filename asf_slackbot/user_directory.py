@@ -0,0 +1,311 @@
+# ==== IMPORTS ====
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import slash_commands.settings as settings
+from cache import TTLCache, MISSING
+
+# ================
+
+logger = logging.getLogger(__name__)
+
+
+def get_display_name(user):
+    """Get the display name from a Slack user object.
+
+    Args:
+        user (dict): User as returned by users.info or users.list.
+
+    Returns:
+        str: Display name.
+    """
+
+    return user["profile"]["display_name"]
+
+
+class BaseUserDirectory:
+    """Display names of the workspace users kept in memory, shared by the sync and
+    async user directories, which add the Slack calls.
+
+    Args:
+        client (slack_sdk.WebClient or AsyncWebClient): Slack client.
+        maxsize (int, optional): Maximum number of users kept.
+            Defaults to settings.user_directory_maxsize.
+        ttl (float, optional): Seconds after which a name is looked up again.
+            Defaults to settings.user_directory_ttl.
+    """
+
+    def __init__(
+        self,
+        client,
+        maxsize=settings.user_directory_maxsize,
+        ttl=settings.user_directory_ttl,
+    ):
+
+        self.client = client
+        self.names = TTLCache(maxsize, ttl)
+
+    def stats(self):
+        """Get the number of users in the directory and its hits and misses.
+
+        Returns:
+            dict: Directory statistics.
+        """
+
+        return self.names.stats()
+
+    def add_users(self, users):
+        """Remember the display names of users.
+
+        Args:
+            users (list): Users as returned by users.list.
+        """
+
+        for user in users:
+            self.names.set(user["id"], get_display_name(user))
+
+    def add_user(self, id, user):
+        """Remember the display name of a user.
+
+        Args:
+            id (str): User ID.
+            user (dict): User as returned by users.info.
+
+        Returns:
+            str: Display name.
+        """
+
+        name = get_display_name(user)
+        self.names.set(id, name)
+
+        return name
+
+    def get_cached_names(self, ids):
+        """Get the display names of several users from memory.
+
+        Args:
+            ids (list): User IDs.
+
+        Returns:
+            tuple: Display names, or MISSING for users to look up, and the distinct
+                IDs of these users.
+        """
+
+        names = [self.names.get(id) for id in ids]
+        missing = [id for id, name in zip(ids, names) if name is MISSING]
+
+        return names, list(dict.fromkeys(missing))
+
+    @staticmethod
+    def fill_in_names(ids, names, fetched):
+        """Fill in the names that were looked up.
+
+        Args:
+            ids (list): User IDs.
+            names (list): Display names, or MISSING, as returned by get_cached_names().
+            fetched (dict): Display names looked up, by user ID.
+
+        Returns:
+            list: Display names, in the same order as the IDs.
+        """
+
+        return [
+            fetched[id] if name is MISSING else name for id, name in zip(ids, names)
+        ]
+
+
+class UserDirectory(BaseUserDirectory):
+    """Display names of the workspace users, served from memory.
+
+    The directory is filled with one paginated users.list call and refreshed in
+    the background. Users missing from it are looked up with users.info,
+    concurrently if there are several.
+
+    Args:
+        client (slack_sdk.WebClient): Slack client.
+        maxsize (int, optional): Maximum number of users kept.
+            Defaults to settings.user_directory_maxsize.
+        ttl (float, optional): Seconds after which a name is looked up again.
+            Defaults to settings.user_directory_ttl.
+        max_workers (int, optional): Number of concurrent users.info calls. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        client,
+        maxsize=settings.user_directory_maxsize,
+        ttl=settings.user_directory_ttl,
+        max_workers=8,
+    ):
+
+        super().__init__(client, maxsize, ttl)
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="user-lookup")
+
+    def warm(self):
+        """Fill the directory with all users, page by page."""
+
+        for page in self.client.users_list(limit=200):
+            self.add_users(page["members"])
+
+    def start_background_refresh(
+        self, interval=settings.user_directory_refresh_interval
+    ):
+        """Fill the directory now and then refresh it regularly, in a background thread.
+
+        Args:
+            interval (float, optional): Seconds between refreshes.
+                Defaults to settings.user_directory_refresh_interval.
+        """
+
+        def refresh():
+            while True:
+                try:
+                    self.warm()
+                    logger.info("User directory refreshed: %s", self.stats())
+                except Exception:
+                    logger.exception("Refreshing the user directory failed")
+                time.sleep(interval)
+
+        threading.Thread(target=refresh, name="user-directory", daemon=True).start()
+
+    def fetch_name(self, id):
+        """Look up a user's display name with users.info and remember it.
+
+        Args:
+            id (str): User ID.
+
+        Returns:
+            str: Display name.
+        """
+
+        return self.add_user(id, self.client.users_info(user=id)["user"])
+
+    def get_names(self, ids):
+        """Get the display names of several users.
+
+        Args:
+            ids (list): User IDs.
+
+        Returns:
+            list: Display names, in the same order.
+        """
+
+        names, missing = self.get_cached_names(ids)
+        fetched = dict(zip(missing, self.pool.map(self.fetch_name, missing)))
+
+        return self.fill_in_names(ids, names, fetched)
+
+    def get_name(self, id):
+        """Get the display name of a user.
+
+        Args:
+            id (str): User ID.
+
+        Returns:
+            str: Display name.
+        """
+
+        return self.get_names([id])[0]
+
+    def get_first_name(self, id):
+        """Get the first name of a user, i.e. the first word of their display name.
+
+        Args:
+            id (str): User ID.
+
+        Returns:
+            str: First name.
+        """
+
+        return self.get_name(id).split(" ")[0]
+
+
+class AsyncUserDirectory(BaseUserDirectory):
+    """User directory for the asyncio version of the bot, see UserDirectory.
+
+    Args:
+        client (slack_sdk.web.async_client.AsyncWebClient): Slack client.
+        maxsize (int, optional): Maximum number of users kept.
+            Defaults to settings.user_directory_maxsize.
+        ttl (float, optional): Seconds after which a name is looked up again.
+            Defaults to settings.user_directory_ttl.
+    """
+
+    async def warm(self):
+        """Fill the directory with all users, page by page."""
+
+        async for page in await self.client.users_list(limit=200):
+            self.add_users(page["members"])
+
+    async def refresh_forever(self, interval=settings.user_directory_refresh_interval):
+        """Fill the directory now and then refresh it regularly. Run it as a task.
+
+        Args:
+            interval (float, optional): Seconds between refreshes.
+                Defaults to settings.user_directory_refresh_interval.
+        """
+
+        while True:
+            try:
+                await self.warm()
+                logger.info("User directory refreshed: %s", self.stats())
+            except Exception:
+                logger.exception("Refreshing the user directory failed")
+            await asyncio.sleep(interval)
+
+    async def fetch_name(self, id):
+        """Look up a user's display name with users.info and remember it.
+
+        Args:
+            id (str): User ID.
+
+        Returns:
+            str: Display name.
+        """
+
+        response = await self.client.users_info(user=id)
+
+        return self.add_user(id, response["user"])
+
+    async def get_names(self, ids):
+        """Get the display names of several users.
+
+        Args:
+            ids (list): User IDs.
+
+        Returns:
+            list: Display names, in the same order.
+        """
+
+        names, missing = self.get_cached_names(ids)
+        fetched_names = await asyncio.gather(*[self.fetch_name(id) for id in missing])
+
+        return self.fill_in_names(ids, names, dict(zip(missing, fetched_names)))
+
+    async def get_name(self, id):
+        """Get the display name of a user.
+
+        Args:
+            id (str): User ID.
+
+        Returns:
+            str: Display name.
+        """
+
+        return (await self.get_names([id]))[0]
+
+    async def get_first_name(self, id):
+        """Get the first name of a user, i.e. the first word of their display name.
+
+        Args:
+            id (str): User ID.
+
+        Returns:
+            str: First name.
+        """
+
+        return (await self.get_name(id)).split(" ")[0]
@@ -2,6 +2,8 @@ import datetime
 from datetime import date
 from datetime import datetime as dt
 
+import slash_commands.settings as settings
+
 def find_date_for_next_weekday(weekday):
 
     today = date.today()
@@ -35,6 +37,104 @@ def get_timestamp(selected_date, selected_time):
     return int(scheduled_datetime.timestamp())
 
 
+def get_reminder_log_text(selected_date, selected_time, outcomes, names):
+    """Create the confirmation for the sender of a reminder.
+
+    Args:
+        selected_date (str): Date the reminder is sent, e.g. "2023-05-25".
+        selected_time (str): Time the reminder is sent, e.g. "11:00".
+        outcomes (list): Outcome of scheduling per recipient, see scheduling.get_outcome().
+        names (list): Display names of the recipients, in the same order.
+
+    Returns:
+        str: Confirmation text.
+    """
+
+    recipients = [name for outcome, name in zip(outcomes, names) if outcome["ok"]]
+    failures = [
+        f"{name} ({outcome['error']})"
+        for outcome, name in zip(outcomes, names)
+        if not outcome["ok"]
+    ]
+
+    log_text = f"You have successfully scheduled a project update reminder to be sent out on {selected_date} at {selected_time} to the following people: {', '.join(recipients)}."
+
+    if failures:
+        log_text += f"\nThe reminder could not be scheduled for: {', '.join(failures)}."
+
+    return log_text
+
+
+def get_breakdown_text(postcode, breakdown):
+    """Create the message with the heat pump breakdown for a postcode.
+
+    Args:
+        postcode (str): Postcode searched for.
+        breakdown (pd.DataFrame): Number of heat pumps by property type (rows) and radius (columns),
+            or None if the postcode is unknown.
+
+    Returns:
+        str: Message text, with the breakdown as a table.
+    """
+
+    if breakdown is None:
+        return "Sorry, we couldn't find the coordinates for this postcode... :face_with_peeking_eye:"
+
+    return f"Heat pumps close to postcode {postcode}:\n```\n{breakdown.to_string()}\n```"
+
+
+def parse_nearest_command(text):
+    """Get the postcode and number of heat pumps from the text of a /nearest-hps command.
+
+    Args:
+        text (str): Command text, e.g. "SW1A 1AA 20". The number is optional.
+
+    Returns:
+        tuple: Postcode and number of heat pumps, between 1 and settings.nearest_max_k.
+    """
+
+    words = text.strip().upper().split()
+    k = settings.nearest_default_k
+
+    if len(words) > 1 and words[-1].isdigit():
+        k = min(max(int(words.pop()), 1), settings.nearest_max_k)
+
+    return " ".join(words), k
+
+
+def get_nearest_text(postcode, nearest, n_listed=10):
+    """Create the message with the heat pumps closest to a postcode.
+
+    Args:
+        postcode (str): Postcode searched for.
+        nearest (pd.DataFrame): Distances and property types of the closest heat pumps,
+            or None if the postcode is unknown.
+        n_listed (int, optional): Number of heat pumps listed one by one. Defaults to 10.
+
+    Returns:
+        str: Message text.
+    """
+
+    if nearest is None:
+        return "Sorry, we couldn't find the coordinates for this postcode... :face_with_peeking_eye:"
+
+    if len(nearest) == 0:
+        return f"There are no heat pumps close to postcode {postcode}."
+
+    text = (
+        f"The {len(nearest)} heat pumps closest to postcode {postcode} are "
+        f"{nearest['DISTANCE_KM'].iloc[0]:.1f}km to {nearest['DISTANCE_KM'].iloc[-1]:.1f}km away:\n"
+        f"```\n{nearest.head(n_listed).to_string(float_format='{:.2f}'.format)}\n```"
+    )
+
+    if len(nearest) > n_listed:
+        counts = nearest["PROPERTY_TYPE"].value_counts()
+        counts_text = ", ".join(f"{name}: {count}" for name, count in counts.items())
+        text += f"\nAll {len(nearest)} by property type: {counts_text}."
+
+    return text
+
+
 def get_first_name(client, id):
 
     user_name = get_user_name(client, id)
@@ -48,4 +148,5 @@ def get_user_name(client, id):
     )
 
     user_name = userinfo['user']['profile']['display_name']
-    return user_name
\ No newline at end of file
+    return user_name
+
@@ -0,0 +1,513 @@
+"""
+Script to time the processing of RECC complaints data and check that
+the faster implementations give the same results as the row by row ones.
+"""
+
+import os
+import re
+import tempfile
+import time
+import numpy as np
+import openpyxl
+import pandas as pd
+import config
+import getters
+from nltk import word_tokenize
+from nltk.stem import PorterStemmer
+from nltk.stem import WordNetLemmatizer
+from processing_recc_data import (
+    changes_to_categories,
+    create_dummy_variables_and_total,
+    deal_with_fit,
+    merges_expression_variations,
+    normalise_expressions,
+    process_recc_dataframe,
+    process_tokens,
+    snake_case_columns,
+)
+
+variants_same_expression = config.variants_same_expression
+
+
+def time_call(func, *args, **kwargs):
+    """
+    Calls a function and times it.
+
+    Args:
+        func: function to call
+        args, kwargs: arguments to call it with
+    Returns:
+        The result and the duration in seconds.
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def synthetic_complaints(
+    n_complaints: int, seed: int = 0, n_made_up_words: int = 20000
+) -> pd.Series:
+    """
+    Creates complaint texts from common and made up words, with a few variants of
+    expressions in any case, for when the RECC data is not available locally.
+
+    Args:
+        n_complaints: number of complaints
+        seed: random seed
+        n_made_up_words: number of made up words to add to the vocabulary
+    Returns:
+        Complaint texts.
+    """
+    rng = np.random.default_rng(seed)
+    words = (
+        "the consumer said that the installer did not complete the work and the unit "
+        "was noisy when it was running in winter so they cannot get a refund of the deposits"
+    ).split()
+    letters = list("abcdefghijklmnopqrstuvwxyz")
+    words += [
+        "".join(rng.choice(letters, rng.integers(3, 9)))
+        + rng.choice(["", "s", "ed", "ing", "ly"])
+        for _ in range(n_made_up_words)
+    ]
+    expressions = list(variants_same_expression.keys()) + [
+        "FiT",
+        "Feed-in Tariff (FiT)",
+        "Feed-In Tariff (Feed-in tariff)",
+        "Air Source Heat Pump",
+        "does not fit",
+    ]
+
+    # word frequencies fall with their rank, and 2% of phrases are expressions
+    word_probabilities = 1 / np.arange(1, len(words) + 1)
+    probabilities = np.concatenate(
+        [
+            0.98 * word_probabilities / word_probabilities.sum(),
+            np.full(len(expressions), 0.02 / len(expressions)),
+        ]
+    )
+    phrases = np.array(words + expressions, dtype=object)
+
+    lengths = rng.integers(10, 100, n_complaints)
+    ends = np.cumsum(lengths)
+    flat = phrases[rng.choice(len(phrases), ends[-1], p=probabilities)].tolist()
+
+    return pd.Series([" ".join(flat[e - l : e]) for l, e in zip(lengths, ends)])
+
+
+def get_complaints() -> pd.Series:
+    """
+    Gets the RECC complaint texts if the raw data is available locally,
+    and synthetic ones otherwise.
+
+    Returns:
+        Complaint texts.
+    """
+    if os.path.exists(
+        config.inputs_local_path + config.raw_recc_data_filename_parquet
+    ):
+        data = getters.get_raw_recc_data()
+        snake_case_columns(data)
+        return data["complaint_summary"].dropna().reset_index(drop=True)
+
+    print("Raw RECC data not found locally, using synthetic complaints.\n")
+    return synthetic_complaints(10000)
+
+
+def benchmark_expression_normaliser(complaints: pd.Series, n_extra_variants: int = 500):
+    """
+    Compares normalise_expressions() with the row by row processing and checks
+    that they give the same result, with the variants in config.py and with
+    many more made up variants.
+
+    Args:
+        complaints: complaint texts
+        n_extra_variants: number of made up variants to add
+    """
+    reference, reference_duration = time_call(
+        lambda: complaints.apply(deal_with_fit)
+        .str.lower()
+        .apply(merges_expression_variations)
+    )
+    normalised, duration = time_call(normalise_expressions, complaints)
+
+    assert (normalised.to_numpy() == reference.to_numpy()).all()
+
+    print(
+        "Merging {} variants in {} complaints: {:.3f}s row by row, {:.3f}s on all texts at once, same output.".format(
+            len(variants_same_expression), len(complaints), reference_duration, duration
+        )
+    )
+
+    many_variants = dict(variants_same_expression)
+    for i in range(n_extra_variants):
+        many_variants["made up heat pump expression number {}".format(i)] = "mhpe"
+
+    def merge_many_variants(text: str) -> str:
+        for expression in many_variants.keys():
+            text = text.replace(expression, many_variants[expression])
+        return text
+
+    _, reference_duration = time_call(
+        lambda: complaints.apply(deal_with_fit).str.lower().apply(merge_many_variants)
+    )
+    _, duration = time_call(normalise_expressions, complaints, many_variants)
+
+    print(
+        "Merging {} variants: {:.3f}s row by row, {:.3f}s on all texts at once.\n".format(
+            len(many_variants), reference_duration, duration
+        )
+    )
+
+
+def check_expression_normaliser(n_texts: int = 20000, seed: int = 0):
+    """
+    Checks that normalise_expressions() gives the same result as the row by row
+    processing on texts made of pieces of the variants in config.py, where
+    variants overlap, repeat and are completed by replacements.
+
+    Args:
+        n_texts: number of texts
+        seed: random seed
+    """
+    rng = np.random.default_rng(seed)
+    pieces = [" ", "(", ")", "FiT", "fit", " (fit)", "-"]
+    for variant in variants_same_expression.keys():
+        words = variant.split(" ")
+        pieces += [variant, variant.upper(), " ".join(words[: len(words) // 2 + 1])]
+        pieces += variants_same_expression[variant].split(" ")
+
+    texts = pd.Series(
+        [
+            "".join(rng.choice(pieces, rng.integers(1, 12)))
+            for _ in range(n_texts)
+        ]
+    )
+
+    reference = texts.apply(deal_with_fit).str.lower().apply(merges_expression_variations)
+    normalised = normalise_expressions(texts)
+
+    mismatches = (normalised.to_numpy() != reference.to_numpy()).sum()
+    assert mismatches == 0, "{} texts differ, e.g. {!r}".format(
+        mismatches, texts[normalised.to_numpy() != reference.to_numpy()].iloc[0]
+    )
+
+    print(
+        "Merging variants in {} made up texts: same output as row by row.\n".format(
+            n_texts
+        )
+    )
+
+
+def process_tokens_row_by_row(texts: pd.Series) -> pd.DataFrame:
+    """
+    Tokenises, stems and lemmatises texts one by one, with a new stemmer and
+    lemmatiser for each text, as processing_recc_data.py used to.
+
+    Args:
+        texts: processed complaint texts
+    Returns:
+        A dataframe with the tokens, stems and lemmas of each text.
+    """
+    acronyms = config.domain_acronyms_list
+    tokens = texts.apply(lambda x: word_tokenize(re.sub("[^A-Za-z0-9]+", " ", x)))
+
+    def stemming(words):
+        porter = PorterStemmer()
+        return " ".join([porter.stem(w) if w not in acronyms else w for w in words])
+
+    def lemmatising(words):
+        lemmatizer = WordNetLemmatizer()
+        return " ".join(
+            [lemmatizer.lemmatize(w) if w not in acronyms else w for w in words]
+        )
+
+    return pd.DataFrame(
+        {
+            "tokens": tokens,
+            "stems": tokens.apply(stemming),
+            "lemmas": tokens.apply(lemmatising),
+        }
+    )
+
+
+def benchmark_token_pipeline(
+    complaints: pd.Series, n_synthetic_complaints: int = 1000000
+):
+    """
+    Compares process_tokens() with the row by row processing on complaints, checks
+    that they give the same result, and measures the throughput of process_tokens()
+    on a large synthetic corpus.
+
+    Args:
+        complaints: complaint texts
+        n_synthetic_complaints: number of complaints in the synthetic corpus
+    """
+    texts = normalise_expressions(complaints)
+
+    reference, reference_duration = time_call(process_tokens_row_by_row, texts)
+    tokens, duration = time_call(process_tokens, texts)
+
+    for column in ["tokens", "stems", "lemmas"]:
+        assert tokens[column].tolist() == reference[column].tolist()
+
+    print(
+        "Tokens, stems and lemmas of {} complaints: {:.0f} rows/s row by row, {:.0f} rows/s in batches, same output.".format(
+            len(texts), len(texts) / reference_duration, len(texts) / duration
+        )
+    )
+
+    texts = normalise_expressions(synthetic_complaints(n_synthetic_complaints))
+    _, duration = time_call(process_tokens, texts)
+
+    print(
+        "Tokens, stems and lemmas of {} synthetic complaints: {:.0f} rows/s in batches.\n".format(
+            len(texts), len(texts) / duration
+        )
+    )
+
+
+def synthetic_raw_data(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Creates raw RECC data with synthetic complaints, dates, technologies and categories.
+
+    Args:
+        n_rows: number of rows
+        seed: random seed
+    Returns:
+        Dataframe with the columns of the raw RECC data that are processed.
+    """
+    rng = np.random.default_rng(seed)
+    technologies = ["Air Source Heat Pump", "Solar PV", "Biomass", "Battery Storage"]
+    categories = list(config.categories_short_names.keys())
+
+    def pick_values(values: list, n: int) -> list:
+        return [
+            "; ".join(rng.choice(values, rng.integers(1, 3), replace=False)) + "; "
+            for _ in range(n)
+        ]
+
+    data_categories = pick_values(categories, n_rows)
+    for i in rng.choice(n_rows, n_rows // 20, replace=False):
+        data_categories[i] = None
+
+    dates = pd.to_datetime("2015-01-01") + pd.to_timedelta(
+        rng.integers(0, 2500, n_rows), unit="D"
+    )
+
+    return pd.DataFrame(
+        {
+            "Date Received": dates.strftime("%Y-%m-%d"),
+            "Complaint Summary": synthetic_complaints(n_rows, seed),
+            "Technologies": pick_values(technologies, n_rows),
+            "Categories": data_categories,
+        }
+    )
+
+
+def benchmark_parallel_processing(
+    data: pd.DataFrame,
+    worker_counts: tuple = (1, 2, 4, 8),
+    chunk_size: int = config.chunk_size,
+):
+    """
+    Processes RECC data with different numbers of worker processes, checks that
+    they give the same result as processing it in one process, and reports the
+    throughput for each.
+
+    Args:
+        data: raw RECC data
+        worker_counts: numbers of worker processes to try
+        chunk_size: number of rows in each block processed by a worker
+    """
+    print(
+        "Processing {} rows on a machine with {} cores:".format(
+            len(data), os.cpu_count()
+        )
+    )
+
+    # the first run also fills the word caches, which forked workers inherit
+    reference = process_recc_dataframe(data.copy()).sort_index(axis=1)
+
+    for n_workers in worker_counts:
+        processed, duration = time_call(
+            process_recc_dataframe, data.copy(), n_workers, chunk_size
+        )
+        pd.testing.assert_frame_equal(processed.sort_index(axis=1), reference)
+
+        print("{} workers: {:.0f} rows/s".format(n_workers, len(data) / duration))
+
+    print("Same output with all numbers of workers.\n")
+
+
+def create_dummy_variables_row_by_row(
+    data: pd.DataFrame, variable: str, prefix: str
+) -> pd.DataFrame:
+    """
+    Creates dummy variables with a substring scan over all rows for each value,
+    as processing_recc_data.py used to.
+
+    Args:
+        data: dataframe with RECC data
+        variable: variable to split into dummy variables
+        prefix: prefix to add to each dummy variable
+    Returns:
+        The processed dataframe.
+    """
+    unique_values = list(set("".join(data[variable].unique()).split("; ")[:-1]))
+
+    dummy_variable_names = [prefix + ":" + c for c in unique_values]
+
+    for i in range(len(unique_values)):
+        data[dummy_variable_names[i]] = data[variable].apply(
+            lambda x: 1 if unique_values[i] in x else 0
+        )
+
+    if prefix + ":Not specified" in dummy_variable_names:
+        dummy_variable_names.remove(prefix + ":Not specified")
+
+    data["number_of_" + variable] = data[dummy_variable_names].sum(axis=1)
+
+    return data
+
+
+def benchmark_dummy_variables(data: pd.DataFrame):
+    """
+    Compares create_dummy_variables_and_total() with the row by row version on
+    the technologies and categories of RECC data, checks that they give the same
+    values, and reports the time and the memory of the dummy variables.
+
+    Args:
+        data: raw RECC data, where no technology or category is part of another
+    """
+    data = data.copy()
+    snake_case_columns(data)
+    data = changes_to_categories(data)
+
+    for variable, prefix in [("technologies", "tech"), ("short_categories", "category")]:
+        reference, reference_duration = time_call(
+            create_dummy_variables_row_by_row, data.copy(), variable, prefix
+        )
+        dummies, duration = time_call(
+            create_dummy_variables_and_total, data.copy(), variable, prefix
+        )
+
+        columns = [c for c in reference.columns if c.startswith(prefix + ":")]
+        pd.testing.assert_frame_equal(
+            dummies[sorted(columns) + ["number_of_" + variable]],
+            reference[sorted(columns) + ["number_of_" + variable]],
+            check_dtype=False,
+        )
+
+        print(
+            "{} dummy variables for {} rows: {:.3f}s and {:.2f}MB row by row, {:.3f}s and {:.2f}MB in one pass, same values.".format(
+                len(columns),
+                len(data),
+                reference_duration,
+                reference[columns].memory_usage(index=False).sum() / 1e6,
+                duration,
+                dummies[columns].memory_usage(index=False).sum() / 1e6,
+            )
+        )
+    print()
+
+
+def write_synthetic_workbook(
+    path: str, n_sheets: int, n_rows_per_sheet: int, seed: int = 0
+):
+    """
+    Writes a workbook like the raw RECC data, with synthetic data in several sheets.
+
+    Args:
+        path: path to the workbook to write
+        n_sheets: number of sheets
+        n_rows_per_sheet: number of rows in each sheet
+        seed: random seed
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+
+    for i in range(n_sheets):
+        data = synthetic_raw_data(n_rows_per_sheet, seed + i)
+        data["Date Received"] = pd.to_datetime(data["Date Received"])
+        data.insert(0, "Reference", np.arange(len(data)) + i * n_rows_per_sheet)
+
+        sheet = workbook.create_sheet("Sheet {}".format(i))
+        sheet.append(data.columns.tolist())
+        for row in data.itertuples(index=False):
+            sheet.append([None if pd.isna(value) else value for value in row])
+
+    workbook.save(path)
+
+
+def raw_recc_data_to_csv_sheet_by_sheet(xlsx_path: str, csv_path: str) -> pd.DataFrame:
+    """
+    Adds all sheets of raw RECC data to one sheet, concatenating them one by one,
+    and reads it back from a csv, as getters.py used to.
+
+    Args:
+        xlsx_path: path to the raw RECC data workbook
+        csv_path: path to the csv file to write
+    Returns:
+        Raw RECC data.
+    """
+    sheets_names = pd.ExcelFile(xlsx_path).sheet_names
+
+    raw_recc_data = pd.DataFrame()
+
+    for sheet in sheets_names:
+        aux = pd.read_excel(xlsx_path, sheet_name=sheet)
+        raw_recc_data = pd.concat([raw_recc_data, aux])
+
+    raw_recc_data.to_csv(csv_path)
+
+    return pd.read_csv(csv_path, index_col=0)
+
+
+def benchmark_excel_ingestion(n_sheets: int = 10, n_rows_per_sheet: int = 20000):
+    """
+    Compares getters.raw_recc_data_to_one_sheet() and getters.get_raw_recc_data()
+    with reading a synthetic multi-sheet workbook through a csv, checks that they
+    give the same data, and reports the time of each and the size of the files.
+
+    Args:
+        n_sheets: number of sheets in the workbook
+        n_rows_per_sheet: number of rows in each sheet
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        xlsx_path = os.path.join(folder, "raw_recc_data.xlsx")
+        csv_path = os.path.join(folder, "raw_recc_data.csv")
+        parquet_path = os.path.join(folder, "raw_recc_data.parquet")
+
+        write_synthetic_workbook(xlsx_path, n_sheets, n_rows_per_sheet)
+
+        reference, reference_duration = time_call(
+            raw_recc_data_to_csv_sheet_by_sheet, xlsx_path, csv_path
+        )
+        _, duration = time_call(
+            getters.raw_recc_data_to_one_sheet, xlsx_path, parquet_path
+        )
+        data, read_duration = time_call(getters.get_raw_recc_data, parquet_path)
+
+        pd.testing.assert_frame_equal(data, reference)
+
+        print(
+            "Workbook with {} sheets of {} rows: {:.1f}s through a csv and back, {:.1f}s streamed to parquet and back, same data.".format(
+                n_sheets, n_rows_per_sheet, reference_duration, duration + read_duration
+            )
+        )
+        print(
+            "Reading back: {:.3f}s from parquet ({:.1f}MB, csv {:.1f}MB).\n".format(
+                read_duration,
+                os.path.getsize(parquet_path) / 1e6,
+                os.path.getsize(csv_path) / 1e6,
+            )
+        )
+
+
+if __name__ == "__main__":
+    benchmark_excel_ingestion()
+    complaints = get_complaints()
+    check_expression_normaliser()
+    benchmark_expression_normaliser(complaints)
+    benchmark_token_pipeline(complaints)
+    benchmark_dummy_variables(synthetic_raw_data(200000))
+    benchmark_parallel_processing(synthetic_raw_data(200000), chunk_size=25000)
@@ -9,7 +9,7 @@ inputs_local_path = "./inputs/"
 raw_recc_data_filename_xlsx = (
     "RECC_Consumer_Complaints_Data_Air_Source_Heat_Pumps_2019-2021.xlsx"
 )
-raw_recc_data_filename_csv = "recc_consumer_ashp_complaints_2019_2021.csv"
+raw_recc_data_filename_parquet = "recc_consumer_ashp_complaints_2019_2021.parquet"
 outputs_local_path_data = "./outputs/data/"
 processed_recc_data_filename = "recc_processed_data_2019_2021.csv"
 outputs_local_path_figures_descriptive_analysis = (
@@ -94,6 +94,26 @@ variants_same_expression = {
 
 domain_acronyms_list = ["ashp", "ofgem", "mcs", "ghg", "rhi", "bus", "dno", "recc"]
 
+# Types of the raw RECC data columns processed, by snake case column name:
+# "date" columns are stored as "%Y-%m-%d" strings and "text" columns as strings.
+# Other columns keep their type, unless it is mixed, in which case they become text.
+raw_recc_data_schema = {
+    "date_received": "date",
+    "complaint_summary": "text",
+    "technologies": "text",
+    "categories": "text",
+}
+
+# Text processing: complaints tokenised at once, and distinct words/tokens
+# whose tokens, stems and lemmas are kept in memory
+token_batch_size = 100000
+token_cache_size = 200000
+
+# Parallel processing: number of processes (1 to process all data in one process)
+# and number of rows processed by a process at once
+n_workers = 1
+chunk_size = 50000
+
 # Keywords and expressions organised in groups
 keywords_expressions = {
     "Issues": [
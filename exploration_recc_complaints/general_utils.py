@@ -4,10 +4,16 @@ Script with general utility functions.
 
 
 import pandas as pd
+from functools import lru_cache
+from nltk import word_tokenize
 from nltk.stem import PorterStemmer
 from nltk.stem import WordNetLemmatizer
 import config
 
+# One stemmer and lemmatiser for all calls
+porter = PorterStemmer()
+lemmatizer = WordNetLemmatizer()
+
 
 def complaints_by(
     df: pd.DataFrame,
@@ -46,6 +52,51 @@ def complaints_by(
     return gb
 
 
+@lru_cache(maxsize=config.token_cache_size)
+def tokenise_word(word: str) -> tuple[str]:
+    """
+    Tokenises a word without punctuation, e.g. "cannot" into ("can", "not").
+    Such a word gives the same tokens on its own as within a text,
+    so tokens are cached per word.
+
+    Args:
+        word: word made of letters and digits
+    Returns:
+        The tokens of the word.
+    """
+    return tuple(word_tokenize(word, preserve_line=True))
+
+
+@lru_cache(maxsize=config.token_cache_size)
+def stem_token(token: str) -> str:
+    """
+    Applies porter stemming to a token, unless it is in the acronyms list.
+
+    Args:
+        token: word/token
+    Returns:
+        The stemmed token.
+    """
+    return porter.stem(token) if token not in config.domain_acronyms_list else token
+
+
+@lru_cache(maxsize=config.token_cache_size)
+def lemmatise_token(token: str) -> str:
+    """
+    Applies lemmatisation to a token, unless it is in the acronyms list.
+
+    Args:
+        token: word/token
+    Returns:
+        The lemmatised token.
+    """
+    return (
+        lemmatizer.lemmatize(token)
+        if token not in config.domain_acronyms_list
+        else token
+    )
+
+
 def stemming(tokens: list[str]) -> str:
     """
     Applies porter stemming to tokens for tokens not in acronyms list.
@@ -56,13 +107,7 @@ def stemming(tokens: list[str]) -> str:
     Returns:
         A string with stemmed tokens in order.
     """
-    porter = PorterStemmer()
-    return " ".join(
-        [
-            porter.stem(word) if word not in config.domain_acronyms_list else word
-            for word in tokens
-        ]
-    )
+    return " ".join([stem_token(word) for word in tokens])
 
 
 def lemmatising(tokens: list[str]) -> str:
@@ -75,12 +120,4 @@ def lemmatising(tokens: list[str]) -> str:
     Returns:
         A string with lemmatised tokens in order.
     """
-    lemmatizer = WordNetLemmatizer()
-    return " ".join(
-        [
-            lemmatizer.lemmatize(word)
-            if word not in config.domain_acronyms_list
-            else word
-            for word in tokens
-        ]
-    )
+    return " ".join([lemmatise_token(word) for word in tokens])
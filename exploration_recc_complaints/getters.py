@@ -5,6 +5,7 @@ Functions to download and get RECC complaints data.
 # package imports
 import boto3
 import os
+import openpyxl
 import pandas as pd
 import config
 
@@ -13,7 +14,8 @@ inputs_local_path = config.inputs_local_path
 s3_bucket = config.s3_bucket
 s3_path = config.s3_path
 raw_recc_data_filename_xlsx = config.raw_recc_data_filename_xlsx
-raw_recc_data_filename_csv = config.raw_recc_data_filename_csv
+raw_recc_data_filename_parquet = config.raw_recc_data_filename_parquet
+raw_recc_data_schema = config.raw_recc_data_schema
 outputs_local_path_data = config.outputs_local_path_data
 processed_recc_data_filename = config.processed_recc_data_filename
 
@@ -48,35 +50,109 @@ def download_recc_data_from_s3():
         )
 
 
-def raw_recc_data_to_one_sheet():
+def read_sheet(sheet) -> pd.DataFrame:
     """
-    Raw RECC data comes in multiple sheets. This function adds all data to one sheet.
-    The resulting data frame is stored in the inputs folder as a csv. 
+    Reads the rows of a worksheet one by one, with the first row as header.
+    Columns without a header and rows without values are dropped.
+
+    Args:
+        sheet: worksheet of a workbook opened in read-only mode
+    Returns:
+        A dataframe with the sheet data.
     """
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, ())
 
-    sheets_names = pd.ExcelFile(
-        inputs_local_path + raw_recc_data_filename_xlsx
-    ).sheet_names
+    data = pd.DataFrame.from_records(rows, columns=range(len(header)))
+    data = data[[i for i, name in enumerate(header) if name is not None]]
+    data.columns = [name for name in header if name is not None]
 
-    raw_recc_data = pd.DataFrame()
+    return data.dropna(how="all").reset_index(drop=True)
+
+
+def enforce_schema(
+    data: pd.DataFrame, schema: dict = raw_recc_data_schema, sheet_name: str = ""
+) -> pd.DataFrame:
+    """
+    Gives the columns of raw RECC data the types in the schema.
 
-    for sheet in sheets_names:
-        aux = pd.read_excel(
-            inputs_local_path + raw_recc_data_filename_xlsx, sheet_name=sheet
+    Args:
+        data: raw RECC data
+        schema: "date" or "text" for each column, by snake case column name
+        sheet_name: name of the sheet, for error messages
+    Returns:
+        The dataframe with the types of the schema.
+    """
+    columns = {str(name).lower().replace(" ", "_"): name for name in data.columns}
+
+    missing_columns = [name for name in schema if name not in columns]
+    if len(missing_columns) > 0:
+        raise ValueError(
+            "Sheet <{}> is missing the columns {}.".format(sheet_name, missing_columns)
         )
-        raw_recc_data = pd.concat([raw_recc_data, aux])
 
-    raw_recc_data.to_csv(inputs_local_path + raw_recc_data_filename_csv)
+    data = data.infer_objects()
+    text_columns = [columns[name] for name in schema if schema[name] == "text"]
+    # other columns with values of different types can't be stored in parquet
+    text_columns += [
+        name
+        for name in data.columns
+        if data[name].dtype == object and name not in text_columns
+    ]
+
+    for name in schema:
+        if schema[name] == "date":
+            data[columns[name]] = pd.to_datetime(data[columns[name]]).dt.strftime(
+                "%Y-%m-%d"
+            )
+
+    for name in text_columns:
+        data[name] = data[name].map(str, na_action="ignore").astype(object)
+
+    return data
+
+
+def raw_recc_data_to_one_sheet(
+    xlsx_path: str = inputs_local_path + raw_recc_data_filename_xlsx,
+    parquet_path: str = inputs_local_path + raw_recc_data_filename_parquet,
+):
+    """
+    Raw RECC data comes in multiple sheets. This function adds all data to one sheet.
+    Sheets are read row by row from the workbook in read-only mode and put together once.
+    The resulting data frame is stored in the inputs folder as a parquet file.
+
+    Args:
+        xlsx_path: path to the raw RECC data workbook
+        parquet_path: path to the parquet file to write
+    """
+    workbook = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+
+    sheets = []
+    try:
+        for sheet in workbook.worksheets:
+            data = read_sheet(sheet)
+            if len(data.columns) > 0:
+                sheets.append(enforce_schema(data, sheet_name=sheet.title))
+    finally:
+        workbook.close()
+
+    raw_recc_data = pd.concat(sheets)
+
+    raw_recc_data.to_parquet(parquet_path)
 
 
-def get_raw_recc_data() -> pd.DataFrame:
+def get_raw_recc_data(
+    parquet_path: str = inputs_local_path + raw_recc_data_filename_parquet,
+) -> pd.DataFrame:
     """
     Reads raw RECC complaints data.
 
+    Args:
+        parquet_path: path to the parquet file written by raw_recc_data_to_one_sheet()
     Returns:
-        A csv file with raw RECC complaints data.
+        A dataframe with raw RECC complaints data.
     """
-    return pd.read_csv(inputs_local_path + raw_recc_data_filename_csv, index_col=0)
+    return pd.read_parquet(parquet_path)
 
 
 def get_processed_recc_data() -> pd.DataFrame:
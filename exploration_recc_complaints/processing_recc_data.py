@@ -5,12 +5,14 @@ Script to process RECC complaints data.
 # package imports
 import config
 import getters
+import numpy as np
 import pandas as pd
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from nltk import word_tokenize
-from general_utils import stemming, lemmatising
+from itertools import chain
+from general_utils import tokenise_word, stem_token, lemmatise_token
 
 
 # paths and file names
@@ -18,6 +20,9 @@ processed_recc_data_filename = config.processed_recc_data_filename
 outputs_local_path_data = config.outputs_local_path_data
 variants_same_expression = config.variants_same_expression
 categories_short_names = config.categories_short_names
+token_batch_size = config.token_batch_size
+n_workers = config.n_workers
+chunk_size = config.chunk_size
 
 
 def snake_case_columns(df: pd.DataFrame):
@@ -43,18 +48,207 @@ def merges_expression_variations(text: str) -> str:
     """
     Merges together different variations of the same expression.
     E.g.: Replaces "air source heat pump" by "ashp" in text.
+    Row by row version of normalise_expressions(), kept as a reference.
     """
     for expression in variants_same_expression.keys():
         text = text.replace(expression, variants_same_expression[expression])
     return text
 
 
+def expressions_trie_pattern(trie: dict) -> str:
+    """
+    Turns a trie of expressions into a regular expression, where expressions
+    sharing a prefix share the same branch. At each position in a text, the regex
+    then only follows the branch of the next character, instead of trying every
+    expression in turn.
+
+    Args:
+        trie: nested dictionaries of characters, with "" marking the end of an expression
+    Returns:
+        The regular expression.
+    """
+    branches = [
+        re.escape(char) + expressions_trie_pattern(subtrie)
+        for char, subtrie in sorted(trie.items())
+        if char != ""
+    ]
+
+    if len(branches) == 0:
+        return ""
+
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    # an expression ends here, but longer ones are tried first
+    if "" in trie:
+        pattern = "(?:" + pattern + ")?"
+
+    return pattern
+
+
+def compile_expressions_pattern(variants: dict) -> re.Pattern:
+    """
+    Compiles all variants of the same expression into one regular expression,
+    used as a filter to find the texts that contain any of them in one pass.
+    It doesn't replace anything: normalise_expressions() replaces the variants
+    one after the other, in the order of the dictionary.
+
+    Args:
+        variants: dictionary with variants of expressions as keys
+    Returns:
+        The compiled regular expression.
+    """
+    trie = {}
+    for variant in variants.keys():
+        node = trie
+        for char in variant:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    return re.compile(expressions_trie_pattern(trie))
+
+
+def normalise_expressions(
+    texts: pd.Series, variants: dict = variants_same_expression
+) -> pd.Series:
+    """
+    Replaces "FiT" by "feed in tariff", lower cases texts and merges together
+    different variations of the same expression.
+    Gives the same result as deal_with_fit(), str.lower() and merges_expression_variations().
+
+    Variants are replaced one after the other, in the order of the dictionary, as
+    a replacement can complete a later variant (e.g. "feed-in tariff (fit)" becomes
+    "feed in tariff (fit)" and then "feed in tariff"). Texts without any variant are
+    found with one regex pass and left out, and the others are joined into one
+    string, so that each variant is replaced in all of them with one str.replace().
+
+    Args:
+        texts: complaint texts
+        variants: dictionary with lower case variants of expressions as keys
+            and what to replace them by as values
+    Returns:
+        The processed texts.
+    """
+    pattern = compile_expressions_pattern(variants)
+
+    lowered = texts.str.replace("FiT", "feed in tariff", regex=False).str.lower()
+    normalised = lowered.copy()
+
+    has_variant = lowered.str.contains(pattern, regex=True).fillna(False).to_numpy(
+        dtype=bool
+    )
+    to_merge = lowered[has_variant].tolist()
+
+    # texts are joined with a character that no text or variant contains,
+    # so that a variant can't match across two texts
+    separator = "\x00"
+    if any(separator in text for text in to_merge) or any(
+        separator in variant + replacement for variant, replacement in variants.items()
+    ):
+        for variant, replacement in variants.items():
+            to_merge = [text.replace(variant, replacement) for text in to_merge]
+    else:
+        joined = separator.join(to_merge)
+        for variant, replacement in variants.items():
+            joined = joined.replace(variant, replacement)
+        to_merge = joined.split(separator) if len(to_merge) > 0 else []
+
+    normalised[has_variant] = np.array(to_merge, dtype=object)
+
+    return normalised
+
+
+def process_tokens_batch(texts: pd.Series) -> pd.DataFrame:
+    """
+    Tokenises texts and stems and lemmatises their tokens. Each distinct word
+    is only tokenised, stemmed and lemmatised once, and the results for each text
+    are put together by looking up the vocabulary ids of its words.
+
+    Args:
+        texts: processed complaint texts
+    Returns:
+        A dataframe with the tokens, stems and lemmas of each text.
+    """
+    words = texts.str.replace("[^A-Za-z0-9]+", " ", regex=True).str.split().tolist()
+    lengths = np.array([len(text_words) for text_words in words], dtype=np.int64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # vocabulary ids of all words of all texts, one after the other
+    ids, vocabulary = pd.factorize(
+        pd.Series(list(chain.from_iterable(words)), dtype=object)
+    )
+
+    vocabulary_tokens = [tokenise_word(word) for word in vocabulary]
+    vocabulary_stems = np.array(
+        [" ".join([stem_token(t) for t in tokens]) for tokens in vocabulary_tokens],
+        dtype=object,
+    )
+    vocabulary_lemmas = np.array(
+        [" ".join([lemmatise_token(t) for t in tokens]) for tokens in vocabulary_tokens],
+        dtype=object,
+    )
+
+    stems = vocabulary_stems[ids].tolist()
+    lemmas = vocabulary_lemmas[ids].tolist()
+
+    # most words are a token on their own, so only texts with words that
+    # are split into several tokens (e.g. "cannot") need new token lists
+    is_split = np.array(
+        [tokens != (word,) for word, tokens in zip(vocabulary, vocabulary_tokens)],
+        dtype=bool,
+    )
+    split_texts = np.flatnonzero(
+        np.bincount(
+            np.repeat(np.arange(len(words)), lengths),
+            weights=is_split[ids],
+            minlength=len(words),
+        )
+    )
+    for i in split_texts:
+        words[i] = list(
+            chain.from_iterable(vocabulary_tokens[j] for j in ids[starts[i] : ends[i]])
+        )
+
+    return pd.DataFrame(
+        {
+            "tokens": words,
+            "stems": [" ".join(stems[s:e]) for s, e in zip(starts, ends)],
+            "lemmas": [" ".join(lemmas[s:e]) for s, e in zip(starts, ends)],
+        },
+        index=texts.index,
+    )
+
+
+def process_tokens(
+    texts: pd.Series, batch_size: int = token_batch_size
+) -> pd.DataFrame:
+    """
+    Tokenises texts and stems and lemmatises their tokens, in batches of texts.
+    Gives the same result as removing non alphanumeric characters, word_tokenize(),
+    general_utils.stemming() and general_utils.lemmatising() text by text.
+
+    Args:
+        texts: processed complaint texts
+        batch_size: number of texts processed at once
+    Returns:
+        A dataframe with the tokens, stems and lemmas of each text.
+    """
+    batches = [
+        process_tokens_batch(texts.iloc[start : start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    ]
+
+    if len(batches) == 0:
+        return pd.DataFrame(columns=["tokens", "stems", "lemmas"], index=texts.index)
+
+    return pd.concat(batches)
+
+
 def process_complaint_summary(data: pd.DataFrame) -> pd.DataFrame:
     """
     Processes complaint summary variable by:
-    - Dealing with "FiT" expression;
-    - Creating new variable with lower case complaint text;
-    - Merging together variations of the same expression;
+    - Creating new variable with lower case complaint text, where "FiT" and
+    variations of the same expression are merged together;
     - Creating a new variable with number of characters in complaint;
     - Creating a variable with the complaint summary tokens.
 
@@ -64,32 +258,51 @@ def process_complaint_summary(data: pd.DataFrame) -> pd.DataFrame:
         The processed dataframe.
     """
 
-    data["processed_complaint_summary"] = data["complaint_summary"].apply(deal_with_fit)
-
-    data["processed_complaint_summary"] = data[
-        "processed_complaint_summary"
-    ].str.lower()
-
-    data["processed_complaint_summary"] = data["processed_complaint_summary"].apply(
-        merges_expression_variations
+    data["processed_complaint_summary"] = normalise_expressions(
+        data["complaint_summary"]
     )
 
     data["complaint_length"] = data["processed_complaint_summary"].str.len()
 
-    # there are other ways we could do this
-    data["tokens"] = data["processed_complaint_summary"].apply(
-        lambda x: re.sub("[^A-Za-z0-9]+", " ", x)
-    )
+    tokens = process_tokens(data["processed_complaint_summary"])
 
-    data["tokens"] = data["tokens"].apply(lambda x: word_tokenize(x))
+    data["tokens"] = tokens["tokens"].to_numpy()
 
-    data["stems"] = data["tokens"].apply(stemming)
+    data["stems"] = tokens["stems"].to_numpy()
 
-    data["lemmas"] = data["tokens"].apply(lemmatising)
+    data["lemmas"] = tokens["lemmas"].to_numpy()
 
     return data
 
 
+def multi_label_indicators(values: pd.Series, sep: str = "; ") -> pd.DataFrame:
+    """
+    Splits each instance of a variable with several labels once and marks which
+    labels it has, in a single pass over all instances.
+    'value1; value2; ' -> value1: 1, value2: 1, value3: 0
+
+    Args:
+        values: instances with labels separated by sep
+        sep: separator between labels
+    Returns:
+        A dataframe with a uint8 column per label, in alphabetical order.
+    """
+    split_values = values.str.split(sep).tolist()
+    lengths = np.array([len(labels) for labels in split_values], dtype=int)
+
+    rows = np.repeat(np.arange(len(split_values)), lengths)
+    labels = np.array(list(chain.from_iterable(split_values)), dtype=object)
+
+    # drop the empty labels after the last separator
+    not_empty = labels != ""
+    codes, unique_labels = pd.factorize(labels[not_empty], sort=True)
+
+    indicators = np.zeros((len(split_values), len(unique_labels)), dtype=np.uint8)
+    indicators[rows[not_empty], codes] = 1
+
+    return pd.DataFrame(indicators, index=values.index, columns=unique_labels)
+
+
 def create_dummy_variables_and_total(
     data: pd.DataFrame, variable: str, prefix: str
 ) -> pd.DataFrame:
@@ -105,23 +318,17 @@ def create_dummy_variables_and_total(
         The processed dataframe.
 
     """
-
-    # get all possible unique values in variable
-    # 'value1; value2; value1; ' -> ['value1', 'value2', 'value1', ''] -> ['value1', 'value2']
-    unique_values = list(set(data[variable].unique().sum().split("; ")[:-1]))
-
-    dummy_variable_names = [prefix + ":" + c for c in unique_values]
-
-    for i in range(len(unique_values)):
-        data[dummy_variable_names[i]] = data[variable].apply(
-            lambda x: 1 if unique_values[i] in x else 0
-        )
+    dummies = multi_label_indicators(data[variable])
+    dummies.columns = [prefix + ":" + c for c in dummies.columns]
 
     # so that we don't count "Not specified" as one category
-    if prefix + ":Not specified" in dummy_variable_names:
-        dummy_variable_names.remove(prefix + ":Not specified")
+    total = dummies.drop(columns=prefix + ":Not specified", errors="ignore").sum(
+        axis=1
+    )
 
-    data["number_of_" + variable] = data[dummy_variable_names].sum(axis=1)
+    data = pd.concat([data, dummies], axis=1)
+
+    data["number_of_" + variable] = total.to_numpy(dtype=int)
 
     return data
 
@@ -156,7 +363,7 @@ def changes_to_categories(data: pd.DataFrame) -> pd.DataFrame:
     Returns:
         Processed dataframe.
     """
-    data["categories"].fillna("Not specified; ", inplace=True)
+    data["categories"] = data["categories"].fillna("Not specified; ")
     data["categories"] = data["categories"].apply(
         lambda x: x + "; " if not x.endswith("; ") else x
     )
@@ -168,27 +375,94 @@ def changes_to_categories(data: pd.DataFrame) -> pd.DataFrame:
     return data
 
 
-def process_recc_data(data: pd.DataFrame):
+def process_rows(data: pd.DataFrame) -> pd.DataFrame:
     """
-    Processes raw RECC data and saves it to a csv in the ouputs folder.
+    Processes the variables of RECC data that only depend on each row itself:
+    the date, the complaint summary and the categories.
+
     Args:
-        data: dataframe with RECC data
+        data: dataframe with RECC data, with snake case column names
+    Returns:
+        The processed dataframe.
     """
+    data = extract_info_from_date(data)
 
-    print("We're processing RECC data for you...\n")
+    data = process_complaint_summary(data)
 
-    snake_case_columns(data)
+    data = changes_to_categories(data)
 
-    data = extract_info_from_date(data)
+    return data
 
-    data = process_complaint_summary(data)
 
-    data = create_dummy_variables_and_total(data, "technologies", "tech")
+def process_rows_in_chunks(
+    data: pd.DataFrame, n_workers: int = n_workers, chunk_size: int = chunk_size
+) -> pd.DataFrame:
+    """
+    Splits RECC data into blocks of rows, processes them with process_rows()
+    in parallel processes and puts the results back together in the original order.
 
-    data = changes_to_categories(data)
+    Args:
+        data: dataframe with RECC data, with snake case column names
+        n_workers: number of processes
+        chunk_size: number of rows in each block
+    Returns:
+        The processed dataframe.
+    """
+    chunks = [
+        data.iloc[start : start + chunk_size]
+        for start in range(0, len(data), chunk_size)
+    ]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        processed_chunks = list(pool.map(process_rows, chunks))
+
+    return pd.concat(processed_chunks)
+
+
+def process_recc_dataframe(
+    data: pd.DataFrame, n_workers: int = n_workers, chunk_size: int = chunk_size
+) -> pd.DataFrame:
+    """
+    Processes raw RECC data. With more than one worker, rows are processed in
+    blocks in parallel processes, which gives the same result.
+
+    Args:
+        data: dataframe with RECC data
+        n_workers: number of processes, or 1 to process all data in this process
+        chunk_size: number of rows in each block processed by a worker
+    Returns:
+        The processed dataframe.
+    """
+    snake_case_columns(data)
+
+    if n_workers > 1 and len(data) > chunk_size:
+        data = process_rows_in_chunks(data, n_workers, chunk_size)
+    else:
+        data = process_rows(data)
+
+    # dummy variables need the values of all rows
+    data = create_dummy_variables_and_total(data, "technologies", "tech")
 
     data = create_dummy_variables_and_total(data, "short_categories", "category")
 
+    return data
+
+
+def process_recc_data(
+    data: pd.DataFrame, n_workers: int = n_workers, chunk_size: int = chunk_size
+):
+    """
+    Processes raw RECC data and saves it to a csv in the ouputs folder.
+    Args:
+        data: dataframe with RECC data
+        n_workers: number of processes, or 1 to process all data in this process
+        chunk_size: number of rows in each block processed by a worker
+    """
+
+    print("We're processing RECC data for you...\n")
+
+    data = process_recc_dataframe(data, n_workers, chunk_size)
+
     if not os.path.exists(outputs_local_path_data):
         os.makedirs(outputs_local_path_data)
 